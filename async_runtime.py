@@ -0,0 +1,414 @@
+"""***************************************************************************
+Title:          Asyncio Runtime
+File:           async_runtime.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the asyncio runtime of the
+                Autonomous_HVAC_System. Simulation playback, controller
+                commands and weather ingest run as coroutines on one event
+                loop, which runs inside the Qt event loop so the
+                application needs no extra threads. The GUI refreshes on the
+                state changes of the controller.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import asyncio
+import math
+import selectors
+from simulation import Playback, simulate
+from weather_stream import POLL_INTERVAL, parse_record
+from logger import get_logger
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+
+
+"""*********************Functions******************************************"""
+async def play_run(model, trajectory):
+    """
+    Coroutine version of the playback of FurnaceModel.heating and
+    AirConditionerModel.cooling: the run is played back on the `clock` of
+    the model, by default the one of its `speedup`. Cancel the task to stop
+    it, in which case `finished` is not emitted. Returns whether the
+    setpoint was reached.
+
+    model: Furnace or air conditioner running (FurnaceModel or
+           AirConditionerModel)
+    trajectory: Run computed by the model (Trajectory)
+    """
+    playback = Playback(trajectory, model.speedup, clock=model.clock)
+    try:
+        async for elapsed, temperature, capacity in playback:
+            model.record_step(temperature, capacity)
+    finally:
+        model.stop_polling = True
+    model.finish(trajectory.reached)
+    return trajectory.reached
+
+
+async def heating(furnace, outdoor_temp, set_temp):
+    """
+    Coroutine version of FurnaceModel.heating. Cancel the task to stop it.
+
+    furnace: Furnace to run (FurnaceModel)
+    outdoor_temp: Current outdoor temperature (float)
+    set_temp: Temperature setpoint (float)
+    """
+    return await play_run(furnace,
+                          furnace.simulate_heating(outdoor_temp, set_temp))
+
+
+async def cooling(aircon, outdoor_temp, set_temp):
+    """
+    Coroutine version of AirConditionerModel.cooling. Cancel the task to
+    stop it.
+
+    aircon: Air conditioner to run (AirConditionerModel)
+    outdoor_temp: Current outdoor temperature (float)
+    set_temp: Temperature setpoint (float)
+    """
+    return await play_run(aircon,
+                          aircon.simulate_cooling(outdoor_temp, set_temp))
+
+
+async def run_zone(start_temp, set_temp, speedup=1.0, on_step=None,
+                   **parameters):
+    """
+    Simulate and play back one zone. Returns its final temperature.
+
+    start_temp: Starting indoor temperature (float)
+    set_temp: Temperature setpoint (float)
+    speedup: Speed-up factor, a SPEEDUPS key or None for max (float)
+    on_step: Called with (temperature, capacity) at every step (function)
+    parameters: U, C, thresholds and capacities passed to `simulate`
+    """
+    trajectory = simulate(start_temp, set_temp, **parameters)
+    temperature = start_temp
+    async for elapsed, temperature, capacity in Playback(trajectory,
+                                                         speedup):
+        if on_step is not None:
+            on_step(temperature, capacity)
+    return temperature
+
+
+async def run_zones(start_temps, set_temps, speedup=1.0, **parameters):
+    """
+    Play back many zones at once, one task per zone. Returns the final
+    temperatures in the order of the zones.
+
+    start_temps: Starting indoor temperature of every zone (list of float)
+    set_temps: Setpoint of every zone, or one for all (list of float)
+    speedup: Speed-up factor, a SPEEDUPS key or None for max (float)
+    parameters: U, C, thresholds and capacities passed to `simulate`
+    """
+    if not hasattr(set_temps, "__len__"):
+        set_temps = [set_temps] * len(start_temps)
+    return await asyncio.gather(*(
+        run_zone(float(start), float(setpoint), speedup, **parameters)
+        for start, setpoint in zip(start_temps, set_temps)))
+
+
+async def ingest_socket(buffer, host="127.0.0.1", port=0):
+    """
+    Push the records of a local weather feed into a ring buffer until the
+    feed closes. Returns the number of records read.
+
+    buffer: Ring buffer to fill (RingBuffer)
+    host: Address of the feed (string)
+    port: Port of the feed (int)
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    count = 0
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return count
+            record = parse_record(line.decode("utf-8", "replace"))
+            if record is not None:
+                buffer.push(*record)
+                count += 1
+    finally:
+        writer.close()
+
+
+async def ingest_csv(buffer, path, poll_interval=POLL_INTERVAL):
+    """
+    Push the records appended to a growing CSV file into a ring buffer
+    until the task is cancelled.
+
+    buffer: Ring buffer to fill (RingBuffer)
+    path: Path to the CSV file (string)
+    poll_interval: Seconds between checks for new lines (float)
+    """
+    with open(path, "r") as file:
+        pending = ""
+        while True:
+            chunk = file.readline()
+            if not chunk:
+                await asyncio.sleep(poll_interval)
+                continue
+            pending += chunk
+            if pending.endswith("\n"):  # Wait for a complete line
+                record = parse_record(pending)
+                if record is not None:
+                    buffer.push(*record)
+                pending = ""
+
+
+"""*********************Classes********************************************"""
+class AsyncControl:
+    """
+    Asyncio replacement of the control worker of ThermostatController.
+    Commands go to a queue; a new command cancels the heating or cooling
+    task in progress, and commands queued together lead to a single run.
+    """
+    def __init__(self, controller):
+        """
+        Attach to a controller, which then sends its commands here.
+
+        controller: Controller to run (ThermostatController)
+        """
+        self.controller = controller
+        self.commands = asyncio.Queue()
+        self.task = None  # Heating or cooling in progress
+        controller.runtime = self
+
+    def submit(self, command, value=None):
+        """
+        Queue a command and cancel the run in progress. Must be called from
+        the thread of the event loop (the GUI thread with the Qt bridge).
+
+        command: "setpoint", "datetime" or "stop" (string), None to end
+        value: Value of the command
+        """
+        self.commands.put_nowait(None if command is None
+                                 else (command, value))
+        self.cancel()
+
+    def cancel(self):
+        """
+        Cancel the heating or cooling task in progress, if any. The command
+        loop restarts it with the next commands.
+        """
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        """
+        Command loop, the asyncio counterpart of ThermostatController's
+        run_worker.
+        """
+        resume = False
+        while True:
+            commands = [] if resume else [await self.commands.get()]
+            while not self.commands.empty():
+                commands.append(self.commands.get_nowait())
+
+            run = resume
+            for command in commands:
+                if command is None:
+                    self.controller.runtime = None
+                    return
+                run = self.controller.apply_command(*command)
+            resume = False
+            if run:
+                self.task = asyncio.ensure_future(self.control_temperature())
+                await asyncio.wait([self.task])
+                resume = self.task.cancelled()
+                self.task = None
+
+    async def control_temperature(self):
+        """
+        Heat or cool towards the setpoint of the controller, as its
+        control_temperature does.
+        """
+        controller = self.controller
+        controller.furnace.stop_polling = False
+        controller.aircon.stop_polling = False
+        if controller.setpoint > controller.current_temp:
+            log.info("Furnace started heating.", temp=controller.current_temp,
+                     setpoint=controller.setpoint)
+            controller.furnace_status = "On"
+            controller.publish()
+            await heating(controller.furnace, controller.current_temp,
+                          controller.setpoint)
+        elif controller.setpoint < controller.current_temp:
+            log.info("Air Conditioner started cooling.",
+                     temp=controller.current_temp,
+                     setpoint=controller.setpoint)
+            controller.aircon_status = "On"
+            controller.publish()
+            await cooling(controller.aircon, controller.current_temp,
+                          controller.setpoint)
+        else:
+            log.info("Temperature is already optimal. No action needed.",
+                     temp=controller.current_temp)
+
+
+class _QtSelector(selectors.DefaultSelector):
+    """
+    Selector of QtEventLoop. Qt socket notifiers watch the registered
+    files, and `select` never blocks: it ends the pass of the asyncio loop
+    and hands the timeout the loop asked for to the Qt event loop.
+    """
+    def __init__(self, bridge):
+        super().__init__()
+        self.bridge = bridge
+
+    def register(self, fileobj, events, data=None):
+        key = super().register(fileobj, events, data)
+        self.bridge.watch(key.fd, key.events)
+        return key
+
+    def unregister(self, fileobj):
+        key = super().unregister(fileobj)
+        self.bridge.unwatch(key.fd)
+        return key
+
+    def modify(self, fileobj, events, data=None):
+        key = super().modify(fileobj, events, data)
+        self.bridge.watch(key.fd, key.events)
+        return key
+
+    def select(self, timeout=None):
+        self.bridge.pass_done(timeout)
+        return super().select(0)
+
+
+class _QtLoop(asyncio.SelectorEventLoop):
+    """
+    Asyncio loop of QtEventLoop. Callbacks and timers added between two
+    passes, e.g. from Qt slots, schedule the pass that runs them.
+    """
+    def __init__(self, bridge):
+        self.bridge = bridge
+        super().__init__(_QtSelector(bridge))
+
+    def call_soon(self, callback, *args, context=None):
+        self.bridge.wake_in(0)
+        return super().call_soon(callback, *args, context=context)
+
+    def call_at(self, when, callback, *args, context=None):
+        self.bridge.wake_in(when - self.time())
+        return super().call_at(when, callback, *args, context=context)
+
+
+class QtEventLoop:
+    """
+    Runs an asyncio event loop inside the Qt event loop. Each pass of the
+    asyncio loop is one run_forever that its selector stops at the select;
+    a single-shot QTimer starts the next pass when the timeout the loop
+    asked for runs out, and Qt socket notifiers when one of its files is
+    ready, so the GUI thread only wakes up when there is work.
+    """
+    def __init__(self, app=None):
+        """
+        Create the loop of the application; `run` replaces app.exec_().
+
+        app: Application to run, the current one by default (QApplication)
+        """
+        # Headless users never load Qt
+        from PyQt5.QtCore import QSocketNotifier, QTimer, Qt
+        from PyQt5.QtWidgets import QApplication
+
+        self.app = app if app is not None else QApplication.instance()
+        self._notifier_kinds = ((selectors.EVENT_READ, QSocketNotifier.Read),
+                                (selectors.EVENT_WRITE,
+                                 QSocketNotifier.Write))
+        self._notifier = QSocketNotifier
+        self._notifiers = {}  # File descriptor -> Qt socket notifiers
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._run_pass)
+        self.loop = _QtLoop(self)
+
+    def run(self):
+        """
+        Run the Qt event loop with the asyncio loop until the application
+        quits or `stop` is called. Returns the exit code of the application.
+        """
+        asyncio.set_event_loop(self.loop)
+        self.wake_in(0)
+        return self.app.exec_()
+
+    def stop(self):
+        """
+        Quit the Qt event loop, which ends `run`.
+        """
+        self.app.exit(0)
+
+    def close(self):
+        """
+        Release the loop once it stopped running.
+        """
+        self._timer.stop()
+        self.loop.close()
+        for fd in list(self._notifiers):
+            self.unwatch(fd)
+
+    def create_task(self, coroutine):
+        """
+        Schedule a coroutine on the asyncio loop and return its task.
+        """
+        return self.loop.create_task(coroutine)
+
+    def wake_in(self, delay):
+        """
+        Make the next pass of the asyncio loop start within a delay.
+
+        delay: Seconds until the pass at the latest (float)
+        """
+        msec = max(math.ceil(delay * 1000), 0)
+        remaining = self._timer.remainingTime()  # -1 when not waiting
+        if remaining < 0 or remaining > msec:
+            self._timer.start(msec)
+
+    def pass_done(self, timeout):
+        """
+        End the current pass of the asyncio loop and wait for the next one
+        in the Qt event loop.
+
+        timeout: Seconds until the asyncio loop has work, None if it only
+                 waits for its files (float)
+        """
+        self.loop.stop()  # run_forever returns after this pass
+        if timeout is None:
+            self._timer.stop()
+        else:
+            self._timer.start(max(math.ceil(timeout * 1000), 0))
+
+    def watch(self, fd, events):
+        """
+        Watch a file of the asyncio loop with Qt socket notifiers.
+
+        fd: File descriptor (int)
+        events: selectors.EVENT_READ and/or EVENT_WRITE (int)
+        """
+        self.unwatch(fd)
+        notifiers = []
+        for event, kind in self._notifier_kinds:
+            if events & event:
+                notifier = self._notifier(fd, kind)
+                notifier.activated.connect(lambda *args: self.wake_in(0))
+                notifiers.append(notifier)
+        self._notifiers[fd] = notifiers
+
+    def unwatch(self, fd):
+        """
+        Stop watching a file of the asyncio loop.
+
+        fd: File descriptor (int)
+        """
+        for notifier in self._notifiers.pop(fd, ()):
+            notifier.setEnabled(False)
+
+    def _run_pass(self):
+        """
+        Run one pass of the asyncio loop: the ready I/O, the due timers and
+        the ready callbacks.
+        """
+        if not self.loop.is_running():  # Not from a nested Qt event loop
+            self.loop.run_forever()
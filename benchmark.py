@@ -0,0 +1,102 @@
+"""***************************************************************************
+Title:          Benchmark
+File:           benchmark.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the timing checks of the
+                Autonomous_HVAC_System. They depend on the machine, so they
+                are kept out of the unit tests and run by hand:
+
+                    python benchmark.py
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from control import MPCControl
+from telemetry import TelemetryRecorder
+from thermal_network import grid_network
+from zones import HOUSE_ZONES
+
+
+"""*********************Functions******************************************"""
+def time_per_call(function, repeat):
+    """
+    Return the mean seconds of a call of a function.
+
+    function: Function taking no arguments
+    repeat: Number of calls (int)
+    """
+    function()  # Warm up caches before timing
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def mpc_decision(repeat=10000):
+    """
+    Return the seconds of one MPC decision.
+
+    repeat: Number of decisions timed (int)
+    """
+    mpc = MPCControl()
+    difference = np.array([3.0])
+    runs = np.array([0])
+    return time_per_call(lambda: mpc.decide(difference, runs), repeat)
+
+
+def telemetry_append(samples=50000):
+    """
+    Return the seconds of one telemetry sample appended, batch writes
+    included.
+
+    samples: Number of samples appended (int)
+    """
+    temperatures = np.full(len(HOUSE_ZONES), 21.5, dtype=np.float32)
+    with tempfile.TemporaryDirectory() as root:
+        recorder = TelemetryRecorder(root)
+        started = time.perf_counter()
+        for i in range(samples):
+            recorder.append(i * 1e-5, version=i, temperature=temperatures,
+                            damper=100, furnace_status=1, mode=1)
+        recorder.close()
+        return (time.perf_counter() - started) / samples
+
+
+def network_step(repeat=1000):
+    """
+    Return the seconds per zone of one step of a 1,000-zone building with
+    its factorization cached.
+
+    repeat: Number of steps timed (int)
+    """
+    network = grid_network(10, 10, 10)
+    temperature = np.full(len(network), 20.0)
+    seconds = time_per_call(lambda: network.step(temperature, 22, 100),
+                            repeat)
+    return seconds / len(network)
+
+
+# Benchmarks by name: (function, limit in seconds, unit of the result)
+BENCHMARKS = {
+    "mpc_decision": (mpc_decision, 1e-3, "s per decision"),
+    "telemetry_append": (telemetry_append, 1e-5, "s per sample"),
+    "network_step": (network_step, 5e-6, "s per zone"),
+}
+
+
+"""*********************Main Routine***************************************"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the timing checks.")
+    parser.add_argument("names", nargs="*", default=list(BENCHMARKS),
+                        help="Benchmarks to run, all by default")
+    args = parser.parse_args()
+
+    for name in args.names:
+        function, limit, unit = BENCHMARKS[name]
+        result = function()
+        status = "ok" if result < limit else "SLOW"
+        print(f"{name:<16} {result:.3g} {unit} (limit {limit:g})  {status}")
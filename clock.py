@@ -0,0 +1,183 @@
+"""***************************************************************************
+Title:          Clock
+File:           clock.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the simulation clocks of the
+                Autonomous_HVAC_System. The models and control loops wait on
+                a clock instead of calling time.sleep, so simulated time is
+                not tied to wall time:
+
+                    RealTimeClock   one simulated second per second (GUI)
+                    ScaledClock     `scale` simulated seconds per second
+                    DiscreteClock   virtual time that jumps to the next
+                                    deadline or timer at once, so whole
+                                    simulations and tests run at CPU speed
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+
+"""*********************Functions******************************************"""
+def clock_for(speedup):
+    """
+    Return the clock of a playback speed-up.
+
+    speedup: Speed-up factor, None for max (float)
+    """
+    if speedup is None:
+        return DiscreteClock()
+    if speedup == 1:
+        return RealTimeClock()
+    return ScaledClock(speedup)
+
+
+"""*********************Classes********************************************"""
+class RealTimeClock:
+    """
+    Clock running at wall time. Waits are cut short by their event.
+    """
+    scale = 1.0
+
+    def __init__(self):
+        self._origin = time.monotonic()
+
+    def now(self):
+        """
+        Return the simulated seconds since the clock was created.
+        """
+        return (time.monotonic() - self._origin) * self.scale
+
+    def sleep(self, seconds):
+        """
+        Wait for a number of simulated seconds.
+
+        seconds: Simulated seconds to wait (float)
+        """
+        self.wait_until(self.now() + seconds)
+
+    def wait_until(self, deadline, event=None):
+        """
+        Wait until the simulated time reaches a deadline or the event is
+        set. Returns True when the event was set, like Event.wait.
+
+        deadline: Simulated time to wait for, as returned by `now` (float)
+        event: Event ending the wait early (threading.Event)
+        """
+        delay = (deadline - self.now()) / self.scale
+        if event is None:
+            if delay > 0:
+                time.sleep(delay)
+            return False
+        if delay > 0:
+            return event.wait(delay)
+        return event.is_set()
+
+    async def wait_until_async(self, deadline):
+        """
+        Coroutine form of `wait_until` for asyncio tasks: other tasks run
+        during the wait. Cancel the task to end it early.
+
+        deadline: Simulated time to wait for, as returned by `now` (float)
+        """
+        await asyncio.sleep(max((deadline - self.now()) / self.scale, 0))
+
+
+class ScaledClock(RealTimeClock):
+    """
+    Clock running `scale` times faster than wall time, e.g. 60 for a
+    simulated minute per second.
+    """
+    def __init__(self, scale):
+        """
+        scale: Simulated seconds per wall-clock second (float)
+        """
+        if not scale > 0:
+            raise ValueError("The scale of a clock must be positive.")
+        super().__init__()
+        self.scale = float(scale)
+
+
+class DiscreteClock:
+    """
+    Discrete-event clock. Time only moves when someone waits: a wait jumps
+    straight to its deadline, first running the timers due before it in
+    time order. A timer setting the event of a wait ends that wait at the
+    time of the timer, e.g. to cancel a run at an exact step.
+    """
+    def __init__(self, start=0.0):
+        """
+        start: Simulated time to start at (float)
+        """
+        self.time = float(start)
+        self._timers = []  # Heap of (time, sequence, callback)
+        self._sequence = itertools.count()  # Keeps equal times in order
+        self._lock = threading.Lock()
+
+    def now(self):
+        """
+        Return the current simulated time.
+        """
+        return self.time
+
+    def call_at(self, when, callback):
+        """
+        Call a function once the simulated time reaches `when`.
+
+        when: Simulated time of the call (float)
+        callback: Function taking no arguments
+        """
+        with self._lock:
+            heapq.heappush(self._timers,
+                           (float(when), next(self._sequence), callback))
+
+    def call_later(self, delay, callback):
+        """
+        Call a function after a number of simulated seconds.
+
+        delay: Simulated seconds from now (float)
+        callback: Function taking no arguments
+        """
+        self.call_at(self.time + delay, callback)
+
+    def sleep(self, seconds):
+        """
+        Advance the simulated time, running the timers due on the way.
+
+        seconds: Simulated seconds to advance (float)
+        """
+        self.wait_until(self.time + seconds)
+
+    def wait_until(self, deadline, event=None):
+        """
+        Advance the simulated time to a deadline, running the timers due on
+        the way, or only up to the timer that sets the event. Returns True
+        when the event was set, like Event.wait.
+
+        deadline: Simulated time to advance to (float)
+        event: Event ending the wait early (threading.Event)
+        """
+        while event is None or not event.is_set():
+            with self._lock:
+                if not self._timers or self._timers[0][0] > deadline:
+                    self.time = max(self.time, deadline)
+                    break
+                when, _, callback = heapq.heappop(self._timers)
+                self.time = max(self.time, when)
+            callback()
+        return event is not None and event.is_set()
+
+    async def wait_until_async(self, deadline):
+        """
+        Coroutine form of `wait_until` for asyncio tasks: advances the
+        simulated time at once, then lets the other tasks run.
+
+        deadline: Simulated time to advance to (float)
+        """
+        self.wait_until(deadline)
+        await asyncio.sleep(0)
@@ -0,0 +1,357 @@
+"""***************************************************************************
+Title:          Control
+File:           control.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the control strategies of the
+                Autonomous_HVAC_System. Next to the staged (bang-bang)
+                output of the furnace and air conditioner, a PID controller
+                and a short-horizon model-predictive controller (MPC) drive a
+                modulating output between 0 and the largest stage. All of
+                them run on the U/C model of `simulation`, vectorized over
+                many runs, and can be compared over the annual dataset:
+
+                    python control.py 22
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+from simulation import simulate, simulate_batch, simulate_year, select_mode
+from simulation import BatchResult, Trajectory, HEATING, IDLE
+from simulation import HEAT_LOSS_COEFFICIENT, THERMAL_CAPACITY, TIME_STEP
+from simulation import STAGE_THRESHOLDS, STAGE_CAPACITIES, MAX_STEPS
+from weather import shared_dataset
+
+
+"""*********************Global*********************************************"""
+TOLERANCE = 0.1  # °C from the setpoint at which a modulated run is done
+PID_GAINS = (100.0, 1.0, 50.0)  # Kp (BTU/°C), Ki (BTU/°C s), Kd (BTU s/°C)
+MPC_HORIZON = 30  # Steps predicted by the MPC (one minute)
+MPC_WEIGHT = 1e-4  # Cost of a BTU² of output against a °C² of error
+
+
+"""*********************Functions******************************************"""
+def make_control(name):
+    """
+    Return a control strategy with its default settings.
+
+    name: "staged", "pid" or "mpc" (string)
+    """
+    try:
+        return CONTROLS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown control mode: {name}") from None
+
+
+def compare(set_temp, weather=None, year=None, names=None):
+    """
+    Run the annual simulation of every control strategy. Returns a list of
+    (name, AnnualResult, seconds) in the order of `names`.
+
+    set_temp: Temperature setpoint (float)
+    weather: Hourly weather data, the shared dataset by default (WeatherData)
+    year: Only simulate the hours of this year (int)
+    names: Control modes to compare, all by default (list of string)
+    """
+    # Loaded before the clock starts, so the first strategy is not charged
+    weather = weather if weather is not None else shared_dataset().get()
+    results = []
+    for name in names or list(CONTROLS):
+        control = make_control(name)
+        started = time.perf_counter()
+        result = simulate_year(set_temp, weather, year, control=control)
+        results.append((name, result, time.perf_counter() - started))
+    return results
+
+
+"""*********************Classes********************************************"""
+class StagedControl:
+    """
+    The staged output of `calculate_q_furnace`/`calculate_q_aircon`: full
+    stages by temperature difference until the setpoint is crossed.
+    """
+    name = "staged"
+
+    def run_batch(self, start_temps, set_temps, directions=None,
+                  **parameters):
+        """
+        Simulate many runs at once, see `simulation.simulate_batch`.
+        """
+        return simulate_batch(start_temps, set_temps, directions,
+                              **parameters)
+
+    def run(self, start_temp, set_temp, direction=None, dt=TIME_STEP,
+            **parameters):
+        """
+        Simulate a single run, see `simulation.simulate`.
+        """
+        return simulate(start_temp, set_temp, direction, dt, **parameters)
+
+
+class FeedbackControl(ABC):
+    """
+    Base of the modulating controllers. At every step `decide` gives the
+    output of each active run from its temperature difference to the
+    setpoint (positive until reached); the output is held between 0 and the
+    largest stage and a run is done once within TOLERANCE of the setpoint.
+    """
+    name = "feedback"
+
+    def __init__(self, tolerance=TOLERANCE, dt=TIME_STEP):
+        """
+        tolerance: °C from the setpoint at which a run is done (float)
+        dt: Time step in seconds (float)
+        """
+        self.tolerance = tolerance
+        self.dt = dt
+
+    def reset(self, count):
+        """
+        Clear the state of `count` runs before they start.
+
+        count: Number of runs (int)
+        """
+
+    @abstractmethod
+    def decide(self, difference, runs):
+        """
+        Return the output (BTU) of the runs for their current differences.
+
+        difference: Temperature difference to the setpoint (array)
+        runs: Indices of the runs in the batch (array of int)
+        """
+
+    def run_batch(self, start_temps, set_temps, directions=None,
+                  U=HEAT_LOSS_COEFFICIENT, C=THERMAL_CAPACITY,
+                  thresholds=STAGE_THRESHOLDS, capacities=STAGE_CAPACITIES,
+                  max_steps=MAX_STEPS, record=False):
+        """
+        Simulate many runs at once with the same U/C step and the same
+        result as `simulation.simulate_batch`, the output coming from
+        `decide` instead of the stages.
+
+        start_temps: Indoor temperature at the start of each run (array)
+        set_temps: Setpoint of each run (array)
+        directions: HEATING/COOLING of each run, from the setpoint by default
+        U: Heat loss coefficient (float)
+        C: Thermal capacity (float)
+        thresholds: Unused, for the signature of simulate_batch (tuple)
+        capacities: Stages of the output, the largest one is the limit
+        max_steps: Maximum number of steps of a run (int)
+        record: Keep the temperature and capacity of every step (bool)
+        """
+        start_temps, set_temps = np.broadcast_arrays(
+            np.asarray(start_temps, dtype=np.float64),
+            np.asarray(set_temps, dtype=np.float64))
+        start_temps = start_temps.ravel()
+        set_temps = set_temps.ravel()
+        if directions is None:
+            directions = select_mode(set_temps, start_temps)
+        directions = np.broadcast_to(np.asarray(directions, dtype=np.int8),
+                                     start_temps.shape)
+        limit = float(max(capacities))
+
+        heating = directions == HEATING
+        current = start_temps.copy()
+        steps = np.zeros(current.shape, dtype=np.int64)
+        energy = np.zeros(current.shape, dtype=np.float64)
+        stalled = np.zeros(current.shape, dtype=bool)
+        difference = np.where(heating, set_temps - current,
+                              current - set_temps)
+        active = np.flatnonzero((directions != IDLE) &
+                                (difference > self.tolerance))
+        temperature_steps = [current.copy()] if record else None
+        capacity_steps = [] if record else None
+        self.reset(current.size)
+
+        for _ in range(max_steps):
+            if not active.size:
+                break
+            q = np.clip(self.decide(difference[active], active), 0, limit)
+            dT = (q - U * difference[active]) / C
+
+            # Runs whose losses outweigh the output would never finish
+            stuck = dT <= 0
+            if stuck.any():
+                stalled[active[stuck]] = True
+                moving = ~stuck
+                active, q, dT = active[moving], q[moving], dT[moving]
+
+            current[active] += np.where(heating[active], dT, -dT)
+            difference[active] -= dT
+            steps[active] += 1
+            energy[active] += q
+            if record:
+                step_q = np.zeros(current.shape)
+                step_q[active] = q
+                temperature_steps.append(current.copy())
+                capacity_steps.append(step_q)
+            active = active[difference[active] > self.tolerance]
+
+        reached = ~stalled
+        reached[active] = False  # Still running when max_steps ran out
+        result = BatchResult(current, steps, energy, reached)
+        if record:
+            result.temperatures = np.array(temperature_steps)
+            result.capacities = np.array(capacity_steps).reshape(
+                len(capacity_steps), current.size)
+        return result
+
+    def run(self, start_temp, set_temp, direction=None, dt=TIME_STEP,
+            **parameters):
+        """
+        Simulate a single run and return its trajectory.
+
+        start_temp: Indoor temperature at the start of the run (float)
+        set_temp: Temperature setpoint (float)
+        direction: HEATING or COOLING, from the setpoint by default
+        dt: Time step in seconds (float)
+        parameters: U, C, capacities or max_steps overrides
+        """
+        batch = self.run_batch([start_temp], [set_temp], direction,
+                               record=True, **parameters)
+        steps = int(batch.steps[0])
+        return Trajectory(batch.temperatures[:steps + 1, 0],
+                          batch.capacities[:steps, 0],
+                          bool(batch.reached[0]), dt)
+
+
+class PIDControl(FeedbackControl):
+    """
+    PID controller of the output. The integral only grows while the output
+    is not at a limit, so it does not wind up during the long full-output
+    start of a run.
+    """
+    name = "pid"
+
+    def __init__(self, gains=PID_GAINS, tolerance=TOLERANCE, dt=TIME_STEP,
+                 limit=max(STAGE_CAPACITIES)):
+        """
+        gains: Proportional, integral and derivative gains (tuple of float)
+        tolerance: °C from the setpoint at which a run is done (float)
+        dt: Time step in seconds (float)
+        limit: Largest output (BTU), where the integral stops growing
+        """
+        super().__init__(tolerance, dt)
+        self.kp, self.ki, self.kd = gains
+        self.limit = limit
+        self.integral = np.zeros(0)
+        self.previous = np.zeros(0)
+
+    def reset(self, count):
+        self.integral = np.zeros(count)
+        self.previous = np.full(count, np.nan)  # No derivative at the start
+
+    def decide(self, difference, runs):
+        previous = self.previous[runs]
+        derivative = np.where(np.isnan(previous), 0,
+                              (difference - previous) / self.dt)
+        integral = self.integral[runs] + difference * self.dt
+        q = self.kp * difference + self.ki * integral + self.kd * derivative
+        unsaturated = (q > 0) & (q < self.limit)
+        self.integral[runs] = np.where(unsaturated, integral,
+                                       self.integral[runs])
+        self.previous[runs] = difference
+        return q
+
+
+class MPCControl(FeedbackControl):
+    """
+    Short-horizon model-predictive controller. Over the next `horizon` steps
+    the U/C model gives the differences e[k+1] = a e[k] - q[k]/C with
+    a = 1 + U/C, i.e. e = Φ e0 - Γ q. The outputs minimizing
+    |e|² + weight |q|² are q = F e0 with F = (ΓᵀΓ + weight I)⁻¹ Γᵀ Φ,
+    solved once per U/C model: a decision is the first entry of F times the
+    difference, held between 0 and the largest stage.
+    """
+    name = "mpc"
+
+    def __init__(self, horizon=MPC_HORIZON, weight=MPC_WEIGHT,
+                 U=HEAT_LOSS_COEFFICIENT, C=THERMAL_CAPACITY,
+                 tolerance=TOLERANCE, dt=TIME_STEP):
+        """
+        horizon: Steps predicted (int)
+        weight: Cost of a BTU² of output against a °C² of error (float)
+        U: Heat loss coefficient of the model, until a run gives its own
+           (float)
+        C: Thermal capacity of the model, until a run gives its own (float)
+        tolerance: °C from the setpoint at which a run is done (float)
+        dt: Time step in seconds (float)
+        """
+        super().__init__(tolerance, dt)
+        self.horizon = horizon
+        self.weight = weight
+        self._gains = {}  # (U, C) -> F
+        self.use_model(U, C)
+
+    def model_gains(self, U, C):
+        """
+        Return the gains F of a U/C model, solved once per model.
+
+        U: Heat loss coefficient (float)
+        C: Thermal capacity (float)
+        """
+        key = (float(U), float(C))
+        gains = self._gains.get(key)
+        if gains is None:
+            U, C = key
+            a = 1 + U / C
+            powers = a ** np.arange(self.horizon + 1)
+            steps = np.arange(self.horizon)
+            # Γ[i, j] = a^(i-j) / C for j <= i: effect of output j on
+            # error i+1
+            lag = steps[:, None] - steps[None, :]
+            gamma = np.where(lag >= 0, powers[np.maximum(lag, 0)] / C, 0)
+            phi = powers[1:]
+            hessian = gamma.T @ gamma + self.weight * np.eye(self.horizon)
+            gains = self._gains[key] = np.linalg.solve(hessian,
+                                                       gamma.T @ phi)
+        return gains
+
+    def use_model(self, U, C):
+        """
+        Decide with the gains of a U/C model from now on.
+
+        U: Heat loss coefficient (float)
+        C: Thermal capacity (float)
+        """
+        self.gains = self.model_gains(U, C)
+        self.gain = float(self.gains[0])
+
+    def run_batch(self, start_temps, set_temps, directions=None,
+                  U=HEAT_LOSS_COEFFICIENT, C=THERMAL_CAPACITY, **parameters):
+        """
+        Simulate many runs at once with the gains of their U/C model, see
+        `FeedbackControl.run_batch`.
+        """
+        self.use_model(U, C)
+        return super().run_batch(start_temps, set_temps, directions, U=U,
+                                 C=C, **parameters)
+
+    def decide(self, difference, runs):
+        return self.gain * difference
+
+
+# Control strategies by mode name
+CONTROLS = {control.name: control
+            for control in (StagedControl, PIDControl, MPCControl)}
+
+
+"""*********************Main Routine***************************************"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the control strategies over the weather file.")
+    parser.add_argument("setpoint", type=float, help="Setpoint (°C)")
+    parser.add_argument("--year", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"Setpoint {args.setpoint}°C")
+    for name, result, elapsed in compare(args.setpoint, year=args.year):
+        active = result.modes != IDLE
+        print(f"  {name:<7} {result.total_energy:>14,.0f} BTU  "
+              f"{result.steps[active].mean() * TIME_STEP:>7.1f} s per run  "
+              f"reached {result.reached[active].mean():6.1%}  "
+              f"({elapsed * 1000:.1f} ms)")
@@ -3,16 +3,38 @@ Title:          Controller
 File:           controller.py
 Release Notes:  N/A
 Author:         Zhaolin Wei
-Description:    Controls method for the automated HVAC controls
+Description:    Controls method for the automated HVAC controls. The
+                controller has no GUI dependency so it also runs headless.
 ***************************************************************************"""
 
 """*********************Libraries ******************************************"""
 from model import Model, ThermostatModel, FanModel
 from model import FurnaceModel, AirConditionerModel
-import gui
-from PyQt5.QtCore import QTime, QDate
+from predictor import predict
+from events import Event
+from zones import ZoneState, HOUSE_ZONES, HOUSE_FLOORS, zone_property
+from datetime import datetime
+import queue
 import threading
-import time
+from logger import get_logger
+from metrics import counter, gauge, histogram
+from time import perf_counter
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+TEMPERATURE_LOG_RATE = 1  # Temperature records per second
+COMMAND_SECONDS = histogram("hvac_command_seconds",
+                            "Time to apply a command of the control worker")
+COMMANDS = counter("hvac_commands_total", "Commands applied")
+PUBLISH_SECONDS = histogram("hvac_publish_seconds",
+                            "Time to publish a snapshot to the subscribers")
+STATE_VERSION = gauge("hvac_state_version", "Version of the published state")
+
+# Zone IDs of the rooms in the order of the system overview
+OVERVIEW_ZONES = [HOUSE_ZONES.index(name) for name in (
+    "bdrm_1", "bdrm_2", "bdrm_3", "bath_1", "bath_2",
+    "living", "kitchen", "mech_rm", "rec_rm")]
 
 
 """*********************Classes********************************************"""
@@ -27,11 +49,29 @@ class ThermostatController:
             self.date = "2024-01-01"
             self.time = "12:00"
             self.setpoint = 22
+            self.speedup = 1.0  # Playback speed-up of the simulation
+            self.clock = None  # Simulation clock, from the speed-up if None
+            self.control = None  # Control strategy, the stages if None
+
+            # Emitted with the controller whenever its state changes
+            self.state_changed = Event("state_changed")
+
+            # Emitted with (kind, value) for every input before it is
+            # applied: "start", the commands and "weather" lookups
+            self.input_applied = Event("input_applied")
+            self.weather = None  # Weather feed replacing the CSV data
+
+            # One control worker runs the commands, see `submit`
+            self._commands = queue.Queue()
+            self._cancel = threading.Event()
+            self._worker = None
+            self._worker_lock = threading.Lock()
+            self.runtime = None  # Asyncio control replacing the worker
 
             # Initializing room variables to updated in controller
-            self.aircon_status = "Off" # 0: Off and 1: On
+            self.aircon_status = "Off" # "Off" or "On"
             self.aircon_energy = 0
-            self.furnace_status = 0 # 0: Off and 1: On
+            self.furnace_status = "Off" # "Off" or "On"
             self.furnace_energy = 0
             self.fan_status = "Off"
             self.fan_speed = "Low"
@@ -46,189 +86,341 @@ class ThermostatController:
             # Outdoor temperature taken from simulation
             self.temp_out = 27
 
-            # Ground Floor
-            self.bdrm_1_temp = 22
-            self.bdrm_1_damper = 100
-            self.bdrm_2_temp = 22
-            self.bdrm_2_damper = 100
-            self.bath_1_temp = 22
-            self.bath_1_damper = 100
-            self.living_temp = 22
-            self.living_damper = 100
-            self.kitchen_temp = 22
-            self.kitchen_damper = 100
-            
-            # Basement
-            self.bdrm_3_temp = 22
-            self.bdrm_3_damper = 100
-            self.bath_2_temp = 22
-            self.bath_2_damper = 100
-            self.mech_rm_temp = 22
-            self.mech_rm_damper = 100
-            self.rec_rm_temp = 22
-            self.rec_rm_damper = 100
+            # Rooms of the ground floor and the basement, one array per
+            # property indexed by zone ID (see zones.HOUSE_ZONES)
+            self.zones = ZoneState(HOUSE_ZONES, HOUSE_FLOORS)
+            # Thermal network coupling the rooms, all rooms at the indoor
+            # temperature if None (see thermal_network.house_network)
+            self.network = None
+
+            # State published for the GUI, replaced as a whole on changes
+            self._publish_lock = threading.Lock()
+            self.snapshot = StateSnapshot(0, self)
             
         except Exception as e:
-            print(f"Error initializing components: {e}")
+            log.error(f"Error initializing components: {e}")
             raise
 
     def system_overview(self):
         """
         Returns the mechanical room GUI properties.
         """
-        try:
-            return [self.bdrm_1_temp, self.bdrm_2_temp, self.bdrm_3_temp, 
-                self.bath_1_temp, self.bath_2_temp, 
-                self.living_temp, self.kitchen_temp, 
-                self.mech_rm_temp, self.rec_rm_temp, 
-                self.temp_out, self.date, self.time, self.mode, 
-                self.furnace_status, self.furnace_energy, 
-                self.aircon_status, self.aircon_energy, 
-                self.fan_status, 
-                self.damp_sup_pos, self.damp_ret_pos, self.damp_out_pos]
-        except AttributeError as e:
-            print(f"Missing attributes in system_overview: {e}")
-            raise
+        return list(self.snapshot.system_overview())
 
     def mechanical_room(self):
         """
         Returns the mechanical room GUI properties.
         """
-        try:
-            return [self.furnace_status, self.furnace_energy, 
-                self.aircon_status, self.aircon_energy, 
-                self.fan_status, self.fan_speed, self.airflow, 
-                self.damp_sup_pos, self.damp_ret_pos, self.damp_out_pos, 
-                self.temp_out]
-        except AttributeError as e:
-            print(f"Missing attributes in mechanical_room: {e}")
-            raise
+        return list(self.snapshot.mechanical_room())
 
     def ground_floor(self):
         """
         Returns the ground floor GUI properties.
         """
-        try:
-            return [self.bdrm_1_temp, self.bdrm_1_damper, 
-                self.bdrm_2_temp, self.bdrm_2_damper, 
-                self.bath_1_temp, self.bath_1_damper, 
-                self.living_temp, self.living_damper, 
-                self.kitchen_temp, self.kitchen_damper, 
-                self.setpoint, self.temp_out]
-        except AttributeError as e:
-            print(f"Missing attributes in ground_floor: {e}")
-            raise
+        return list(self.snapshot.ground_floor())
     
     def basement(self):
         """
         Returns the basement GUI properties.
         """
-        try:
-            return [self.bdrm_3_temp, self.bdrm_3_damper, 
-                self.bath_2_temp, self.bath_2_damper, 
-                self.mech_rm_temp, self.mech_rm_damper,
-                self.rec_rm_temp, self.rec_rm_damper, 
-                self.setpoint, self.temp_out]
-        except AttributeError as e:
-            print(f"Missing attributes in basement: {e}")
-            raise
+        return list(self.snapshot.basement())
             
     def settings(self):
         """
         Returns the ground floor GUI properties.
         """
-        try:
-            return [self.date, self.time, self.mode]
-        except AttributeError as e:
-            print(f"Missing attributes in ground_floor: {e}")
-            raise
+        return list(self.snapshot.settings())
 
-    def set_current_temperature_aircon(self):
+    def publish(self):
         """
-        Continuously  updates the value of all the features while cooling.
+        Publish a snapshot of the current state with the next version and
+        emit `state_changed`. Called by the writer once a change is complete,
+        so readers of `snapshot` never see a half-updated state.
+        """
+        started = perf_counter()
+        with self._publish_lock:
+            self.snapshot = StateSnapshot(self.snapshot.version + 1, self)
+        self.state_changed.emit(self)
+        PUBLISH_SECONDS.observe(perf_counter() - started)
+        STATE_VERSION.set(self.snapshot.version)
+
+    def set_current_temperature_aircon(self, current_temp, q_aircon):
+        """
+        Update the value of all the features at every cooling step. Called
+        by the `stepped` event of the air conditioner.
+
+        current_temp: Indoor temperature after the step (float)
+        q_aircon: Output of the air conditioner during the step (int)
         """
         try:
-            while not self.aircon.stop_polling:
-                self.current_temp = self.aircon.read_current_temp()
-                print(f"current_temp: {self.current_temp}")
-                self.aircon_energy = self.aircon.read_q_aircon()
-
-                # Update temperatures for all rooms
-                self.bdrm_1_temp = self.current_temp
-                self.bdrm_2_temp = self.current_temp
-                self.bath_1_temp = self.current_temp
-                self.living_temp = self.current_temp
-                self.kitchen_temp = self.current_temp
-                self.bdrm_3_temp = self.current_temp
-                self.bath_2_temp = self.current_temp
-                self.mech_rm_temp = self.current_temp
-                self.rec_rm_temp = self.current_temp
-                time.sleep(0.1)
-            self.aircon_status = 0 
-            self.fan_speed = "low"
+            self.aircon_energy = q_aircon
+            self.step_network(-q_aircon)
+            self.update_room_temperatures(current_temp, q_aircon)
         except Exception as e:
-            print(f"Error in set_current_temperature_aircon: {e}")
-        
-    def set_current_temperature_furnace(self):
+            log.error(f"Error in set_current_temperature_aircon: {e}")
+
+    def set_current_temperature_furnace(self, current_temp, q_furnace):
         """
-        Continuously  updates the value of all the features while heating.
+        Update the value of all the features at every heating step. Called
+        by the `stepped` event of the furnace.
+
+        current_temp: Indoor temperature after the step (float)
+        q_furnace: Output of the furnace during the step (int)
         """
         try:
-            while not self.furnace.stop_polling:
-                self.current_temp = self.furnace.read_current_temp()
-                print(f"current_temp: {self.current_temp}")
-                self.aircon_energy = self.aircon.read_q_aircon()
-
-                # Update temperatures for all rooms
-                self.bdrm_1_temp = self.current_temp
-                self.bdrm_2_temp = self.current_temp
-                self.bath_1_temp = self.current_temp
-                self.living_temp = self.current_temp
-                self.kitchen_temp = self.current_temp
-                self.bdrm_3_temp = self.current_temp
-                self.bath_2_temp = self.current_temp
-                self.mech_rm_temp = self.current_temp
-                self.rec_rm_temp = self.current_temp
-                time.sleep(0.1)
-            self.furnace_status = "Off"
-            self.fan_speed = "low"
+            self.furnace_energy = q_furnace
+            self.step_network(q_furnace)
+            self.update_room_temperatures(current_temp, q_furnace)
         except Exception as e:
-            print(f"Error in set_current_temperature_furnace: {e}")
+            log.error(f"Error in set_current_temperature_furnace: {e}")
+
+    def aircon_finished(self, reached):
+        """
+        Turn the air conditioner off once cooling ends.
 
-    def control_temperature(self):
+        reached: Whether the setpoint was reached (bool)
         """
-        Control the indoor temperature by heating or cooling as needed.
+        self.aircon_status = "Off"
+        self.fan_speed = "low"
+        self.publish()
+
+    def furnace_finished(self, reached):
+        """
+        Turn the furnace off once heating ends.
+
+        reached: Whether the setpoint was reached (bool)
+        """
+        self.furnace_status = "Off"
+        self.fan_speed = "low"
+        self.publish()
+
+    def update_room_temperatures(self, current_temp, capacity=0):
+        """
+        Set the indoor temperature of every room and notify subscribers.
+
+        current_temp: Indoor temperature (float)
+        capacity: Output of the furnace or air conditioner (int)
+        """
+        self.current_temp = current_temp
+        log.info("Temperature updated.", zone="house", temp=current_temp,
+                 capacity=capacity, per_second=TEMPERATURE_LOG_RATE)
+
+        # Update temperatures for all rooms, unless the network steps them
+        if self.network is None:
+            self.zones.set_temperatures(self.current_temp)
+        self.publish()
+
+    def step_network(self, supply):
+        """
+        Advance the room temperatures through the thermal network by one
+        step, the supply shared between the rooms by damper position and
+        the losses measured against the setpoint like the furnace and air
+        conditioner runs, so the mean room temperature follows the indoor
+        temperature. Does nothing without a network.
+
+        supply: Output of the furnace (+) or air conditioner (-) (int)
+        """
+        if self.network is None:
+            return
+        self.network.step(self.zones.temperature, self.setpoint, supply,
+                          self.zones.damper)
+
+    def control_temperature(self, cancel=None):
+        """
+        Control the indoor temperature by heating or cooling as needed. The
+        run is played back on the calling thread; returns False when it was
+        cancelled before the end.
+
+        cancel: Event that stops the run at the next step (threading.Event)
         """
         try:
             self.furnace.stop_polling = False
             self.aircon.stop_polling = False
             
             if self.setpoint > self.current_temp:
-                print("Furnace started heating.")
+                log.info("Furnace started heating.", temp=self.current_temp,
+                         setpoint=self.setpoint)
                 # Heating mode: Activate the furnace
-                self.furnace_status = 1
-                t1 = threading.Thread(target=self.furnace.heating, 
-                                      args=(self.current_temp,self.setpoint,))
-                t2 = threading.Thread(
-                    target=self.set_current_temperature_furnace)
-                t1.start()
-                t2.start()
+                self.furnace_status = "On"
+                self.publish()
+                return self.furnace.heating(self.current_temp, self.setpoint,
+                                            cancel)
             elif self.setpoint < self.current_temp:
-                print("Air Conditioner started cooling.")
+                log.info("Air Conditioner started cooling.",
+                         temp=self.current_temp, setpoint=self.setpoint)
                 # Cooling mode: Activate the AC
-                self.aircon_status=1
-                t1 = threading.Thread(target=self.aircon.cooling, args=(
-                    self.current_temp, self.setpoint,))
-                t2 = threading.Thread(
-                    target=self.set_current_temperature_aircon)
-                t1.start()
-                t2.start()
+                self.aircon_status = "On"
+                self.publish()
+                return self.aircon.cooling(self.current_temp, self.setpoint,
+                                           cancel)
             else:
                 # Optimal temperature, no action needed
-                print("Temperature is already optimal. No action needed.")
+                log.info("Temperature is already optimal. No action needed.",
+                         temp=self.current_temp)
         except Exception as e:
-            print(f"Error in temperature control: {e}")
-            
+            log.error(f"Error in temperature control: {e}")
+        return True
+
+    def set_setpoint(self, set_point):
+        """
+        Ask the control worker to move to a new setpoint.
+
+        set_point: Temperature setpoint (float)
+        """
+        self.submit("setpoint", set_point)
+
+    def set_date_time(self, date_input, time_input):
+        """
+        Ask the control worker to move to a new date and time.
+
+        date_input: Date input as yyyy-mm-dd (string)
+        time_input: Time input h:mm (string)
+        """
+        self.submit("datetime", (date_input, time_input))
+
+    def stop(self):
+        """
+        Ask the control worker to stop heating or cooling.
+        """
+        self.submit("stop")
+
+    def submit(self, command, value=None):
+        """
+        Queue a command for the control worker and cancel the run in
+        progress, which then stops within one simulation step. When an
+        asyncio runtime is attached the command goes to it instead.
+
+        command: "setpoint", "datetime" or "stop" (string)
+        value: Value of the command
+        """
+        if self.runtime is not None:
+            self.runtime.submit(command, value)
+            return
+        self.start_worker()
+        self._commands.put((command, value))
+        self._cancel.set()
+
+    def start_worker(self):
+        """
+        Start the control worker thread if it is not running.
+        """
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self.run_worker,
+                                                daemon=True)
+                self._worker.start()
+
+    def shutdown(self, timeout=None):
+        """
+        Cancel the run in progress and end the control worker.
+
+        timeout: Seconds to wait for the worker to end (float)
+        """
+        with self._worker_lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            self._commands.put(None)
+            self._cancel.set()
+            worker.join(timeout)
+
+    def run_worker(self):
+        """
+        Control worker loop. Takes every command waiting in the queue at
+        once, so bursts of commands lead to a single run, and restarts a
+        cancelled run from the current temperature.
+        """
+        resume = False
+        while True:
+            commands = [] if resume else [self._commands.get()]
+            self._cancel.clear()
+            while not self._commands.empty():
+                commands.append(self._commands.get_nowait())
+
+            run = resume
+            for command in commands:
+                if command is None:  # Shutdown, after the earlier commands
+                    return
+                run = self.apply_command(*command)
+            resume = run and not self.control_temperature(self._cancel)
+
+    def apply_command(self, command, value):
+        """
+        Apply one command to the controller state. Returns whether heating
+        or cooling should run afterwards. Errors are logged and the command
+        dropped, so the control worker keeps taking commands.
+
+        command: "setpoint", "datetime" or "stop" (string)
+        value: Value of the command
+        """
+        started = perf_counter()
+        try:
+            self.input_applied.emit(command, value)
+            if command == "setpoint":
+                self.setpoint = value
+                self.zones.setpoint[:] = value
+                self.thermostat.set_temperature_value(self.setpoint)
+            elif command == "datetime":
+                self.date, self.time = value
+                self.thermostat.set_date_time(self.date, self.time)
+                self.temp_out = self.outdoor_temperature()
+            elif command == "stop":
+                self.furnace_status = "Off"
+                self.aircon_status = "Off"
+                self.publish()
+                return False
+            else:
+                raise ValueError(f"Unknown command: {command}")
+            self.update_mode()
+            self.publish()
+            return True
+        except ValueError as ve:
+            log.error(f"Value error: {ve}")
+            return False
+        except Exception as e:
+            log.error(f"Error applying the {command} command: {e}")
+            return False
+        finally:
+            COMMAND_SECONDS.observe(perf_counter() - started)
+            COMMANDS.inc()
+
+    def outdoor_temperature(self):
+        """
+        Look up the outdoor temperature at the date and time of the
+        thermostat, emitting it as a "weather" input.
+        """
+        temp_out = self.thermostat.get_outdoor_temperature()
+        self.input_applied.emit("weather", temp_out)
+        if temp_out is None:
+            raise ValueError("Unable to retrieve outdoor temperature.")
+        return float(temp_out)
+
+    def predict_run(self):
+        """
+        Predict the heating or cooling run from the current temperature to
+        the setpoint without simulating it, e.g. to show an ETA. Returns the
+        Prediction of the run: seconds, output (BTU) and stage schedule.
+        """
+        model = self.furnace if self.setpoint > self.current_temp \
+            else self.aircon
+        return predict(self.current_temp, self.setpoint, U=model.U,
+                       C=model.C, dt=model.dt,
+                       thresholds=model.stage_thresholds,
+                       capacities=model.stage_capacities)
+
+    def update_mode(self):
+        """
+        Determine the mode (e.g., heating or cooling) and the fan speed.
+        """
+        self.mode = self.thermostat.set_mode()
+        try:
+            self.fan_status="On"
+            # Set the fan speed based on the mode
+            self.fan_speed = self.fan.set_fan_speed_value(self.mode)
+        
+        except:
+            self.fan_status="Off"
+
     def start_hvac_simulation_thread(self):
         """
         在一个单独的线程中启动HVAC的初始操作，以避免阻塞GUI。
@@ -250,64 +442,170 @@ class ThermostatController:
         time_input: Time input h:dd (string)
         """
         try:
-            self.setpoint = set_point
-            self.date = date_input
-            self.time = time_input
-            
-            # Initializing Models
-            self.model = Model()
-            self.model.load_data_from_csv()
-            self.thermostat = ThermostatModel(self.model.temperature_data)
-            self.fan = FanModel(self.model)
-            self.furnace = FurnaceModel(self.model)
-            self.aircon = AirConditionerModel(self.model)
-            
-            # Set the date and time on the thermostat
-            self.thermostat.set_date_time(self.date, self.time)
-
-            # Get outdoor temperature
-            self.temp_out = float(self.thermostat.get_outdoor_temperature())
-            if self.temp_out is None:
-                raise ValueError("Unable to retrieve outdoor temperature.")
-
-            # Set the thermostat to the desired target temperature
-            set_temp = self.thermostat.set_temperature_value(self.setpoint)
-
-            # Determine the mode (e.g., heating or cooling)
-            self.mode = self.thermostat.set_mode()
-            try:
-                self.fan_status="On"
-                # Set the fan speed based on the mode
-                self.fan_speed = self.fan.set_fan_speed_value(self.mode)
-            
-            except:
-                self.fan_status="Off"
+            # A restart replaces the models the worker or the asyncio task
+            # is using, so the run in progress ends first
+            self.shutdown()
+            if self.runtime is not None:
+                self.runtime.cancel()
+            self.input_applied.emit("start",
+                                    (set_point, date_input, time_input))
+            self.initialize(set_point, date_input, time_input)
 
-            # in the begining the current temp == outdoor temp
-            self.current_temp = self.temp_out
-            self.control_temperature()
+            # Heating or cooling runs on the control worker
+            self.submit("setpoint", self.setpoint)
         except ValueError as ve:
-            print(f"Value error: {ve}")
+            log.error(f"Value error: {ve}")
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            log.error(f"An unexpected error occurred: {e}")
+
+    def initialize(self, set_point, date_input, time_input):
+        """
+        Create the models and set the initial state of the controller.
+
+        set_point: Temperature setpoint to initiate heating/cooling (float)
+        date_input: Date input as yyyy-mm-dd (string)
+        time_input: Time input h:dd (string)
+        """
+        self.setpoint = set_point
+        self.zones.setpoint[:] = set_point
+        self.date = date_input
+        self.time = time_input
+        
+        # Initializing Models, all of them share one weather dataset
+        # that is only read from disk once per process
+        self.model = Model()
+        self.thermostat = ThermostatModel()
+        if self.weather is None:
+            self.model.load_data_from_csv()
+        else:
+            self.thermostat.load_data_from_stream(self.weather)
+        self.fan = FanModel()
+        self.furnace = FurnaceModel()
+        self.aircon = AirConditionerModel()
+        self.furnace.speedup = self.speedup
+        self.aircon.speedup = self.speedup
+        self.furnace.clock = self.clock
+        self.aircon.clock = self.clock
+        self.furnace.control = self.control
+        self.aircon.control = self.control
+        self.furnace.stepped.subscribe(
+            self.set_current_temperature_furnace)
+        self.furnace.finished.subscribe(self.furnace_finished)
+        self.aircon.stepped.subscribe(self.set_current_temperature_aircon)
+        self.aircon.finished.subscribe(self.aircon_finished)
+        
+        # Set the date and time on the thermostat
+        self.thermostat.set_date_time(self.date, self.time)
+
+        # Get outdoor temperature
+        self.temp_out = self.outdoor_temperature()
+
+        # Set the thermostat to the desired target temperature
+        set_temp = self.thermostat.set_temperature_value(self.setpoint)
+
+        # Determine the mode (e.g., heating or cooling)
+        self.update_mode()
+
+        # in the begining the current temp == outdoor temp
+        self.current_temp = self.temp_out
+        if self.network is not None:
+            self.zones.set_temperatures(self.temp_out)
+        self.publish()
 
     def update_time(self):
         """
         Update the time every second.
         """
-        self.time = QTime.currentTime().toString('HH:mm:ss')
-        self.date = QDate.currentDate().toString('yyyy-MM-dd')
+        now = datetime.now()
+        self.time = now.strftime('%H:%M:%S')
+        self.date = now.strftime('%Y-%m-%d')
 
     def update_temperature(self):
         """
         Update the current temperature and system status.
         """
-        print(f"Updating temperature...")
         self.current_temp = self.thermostat.read_current_temp()
         self.fan_status = self.fan.read_status()
         self.fan_speed = self.fan.read_speed()
-        print(f"Current Temperature: {self.current_temp}")
-        print(f"Fan Status: {self.fan_status}")
-        print(f"Fan Speed: {self.fan_speed}")
+        log.info("Temperature updated.", zone="house", temp=self.current_temp,
+                 fan_status=self.fan_status, fan_speed=self.fan_speed)
 
-        
+
+class StateSnapshot:
+    """
+    Read-only copy of the controller state at one version. The controller
+    replaces its snapshot as a whole, so a reader holding one always sees a
+    consistent state, and can skip all work while the version is unchanged.
+    """
+    __slots__ = ("version", "_overview", "_mechanical", "_ground",
+                 "_basement", "_settings")
+
+    def __init__(self, version, controller):
+        """
+        Copy the state of the controller.
+
+        version: Version of the state, increasing with every change (int)
+        controller: Controller to copy (ThermostatController)
+        """
+        c = controller
+        values = (
+            version,
+            tuple(c.zones.temperature[OVERVIEW_ZONES].tolist()) + (
+                c.temp_out, c.date, c.time, c.mode,
+                c.furnace_status, c.furnace_energy,
+                c.aircon_status, c.aircon_energy,
+                c.fan_status,
+                c.damp_sup_pos, c.damp_ret_pos, c.damp_out_pos),
+            (c.furnace_status, c.furnace_energy,
+             c.aircon_status, c.aircon_energy,
+             c.fan_status, c.fan_speed, c.airflow,
+             c.damp_sup_pos, c.damp_ret_pos, c.damp_out_pos,
+             c.temp_out),
+            tuple(c.zones.floor("ground").tolist()) + (c.setpoint, c.temp_out),
+            tuple(c.zones.floor("basement").tolist()) + (
+                c.setpoint, c.temp_out),
+            (c.date, c.time, c.mode))
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StateSnapshot is read-only")
+
+    def system_overview(self):
+        """
+        Returns the system overview GUI properties.
+        """
+        return self._overview
+
+    def mechanical_room(self):
+        """
+        Returns the mechanical room GUI properties.
+        """
+        return self._mechanical
+
+    def ground_floor(self):
+        """
+        Returns the ground floor GUI properties.
+        """
+        return self._ground
+
+    def basement(self):
+        """
+        Returns the basement GUI properties.
+        """
+        return self._basement
+
+    def settings(self):
+        """
+        Returns the settings GUI properties.
+        """
+        return self._settings
+
+
+# Per-room attributes (bdrm_1_temp, bdrm_1_damper, ...) read and write the
+# zone arrays
+for _index, _name in enumerate(HOUSE_ZONES):
+    setattr(ThermostatController, f"{_name}_temp",
+            zone_property(_index, "temperature"))
+    setattr(ThermostatController, f"{_name}_damper",
+            zone_property(_index, "damper"))
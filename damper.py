@@ -12,12 +12,17 @@ Description:    This file is used to initiate the graphic for the damper as
 """*********************Libraries******************************************"""
 import sys
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget
-from PyQt5.QtGui import QPixmap, QPainter
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPainter
 import math
+from symbols import scaled_pixmap
+from logger import get_logger
+from metrics import histogram, timed
 
 
 """*********************Global*********************************************"""
+log = get_logger(__name__)
+PAINT_SECONDS = histogram("hvac_paint_seconds", "Time to paint a widget",
+                          widget="damper")
 damper_images = {
     -1 : "Damper/damper_fault.png", # fault case
     0 : "Damper/damper_0.png",
@@ -87,11 +92,12 @@ class Damper(QWidget):
             self.update()
             
         except KeyError as e: 
-            print(f"Error loading damper image: {e}") 
+            log.error(f"Error loading damper image: {e}")
             self.__status = -1
             self.graphic = damper_images[-1] # fault graphic
             self.update()
     
+    @timed(PAINT_SECONDS)
     def paintEvent(self, event):
         """
         This method is called to update the graphic.
@@ -108,9 +114,8 @@ class Damper(QWidget):
             painter.translate(-self.width() / 2, -self.height() / 2)
             
             # Scale the image
-            pixmap = QPixmap(self.graphic).scaled(int(208 * self.__scale), 
-                                                    int(76 * self.__scale), 
-                                                    Qt.KeepAspectRatio)
+            pixmap = scaled_pixmap(self.graphic, int(208 * self.__scale), 
+                                                    int(76 * self.__scale))
             
             # Set the widget's size to match the image size
             rotated_width = int(pixmap.width() * 
@@ -135,7 +140,7 @@ class Damper(QWidget):
             painter.end()
             
         except Exception as e:
-            print(f"Error in Damper paintEvent: {e}")
+            log.error(f"Error in Damper paintEvent: {e}", per_second=1)
             
     def update_status(self, status):
         """
@@ -0,0 +1,71 @@
+"""***************************************************************************
+Title:          Events
+File:           events.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the publish/subscribe events used to pass
+                state changes between the models, the controller and the GUI
+                of the Autonomous_HVAC_System.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import threading
+from logger import get_logger
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+
+
+"""*********************Classes********************************************"""
+class Event:
+    """
+    A named event that calls its subscribers, in the order they subscribed,
+    every time it is emitted. Subscribers run on the emitting thread and
+    emitting never takes a lock.
+    """
+    def __init__(self, name="event"):
+        """
+        Create an event without subscribers.
+
+        name: Name of the event, used in error messages (string)
+        """
+        self.name = name
+        self._subscribers = ()  # Replaced, never mutated, when changed
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """
+        Call `callback` with the arguments of every emit from now on.
+
+        callback: Function taking the event arguments
+        """
+        with self._lock:
+            self._subscribers = self._subscribers + (callback,)
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling `callback` for this event.
+
+        callback: A function passed to `subscribe` before
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+            if callback in subscribers:
+                subscribers.remove(callback)
+            self._subscribers = tuple(subscribers)
+
+    def emit(self, *args):
+        """
+        Call every subscriber with the given arguments. An error in one
+        subscriber does not keep the others from being called.
+        """
+        for callback in self._subscribers:
+            try:
+                callback(*args)
+            except Exception as e:
+                log.error(f"Error in {self.name} subscriber: {e}")
+
+    def __len__(self):
+        return len(self._subscribers)
@@ -10,10 +10,15 @@ Description:    This file is used to initiate the graphic for Fan
 
 import sys
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QPainter, QColor, QFont
+from PyQt5.QtCore import QTimer
+from symbols import scaled_pixmap
+from metrics import histogram, timed
 
 """*********************Global*********************************************"""
+PAINT_SECONDS = histogram("hvac_paint_seconds", "Time to paint a widget",
+                          widget="fan")
+
 fan_images = {
     "fault": "Fan/fan_fault.png",
     "off": "Fan/fan_off.png",
@@ -56,6 +61,7 @@ class Fan(QLabel):
         self.update_fan_state()
 
 
+    @timed(PAINT_SECONDS)
     def paintEvent(self, event):
         """
         This method is called to update the graphic
@@ -73,9 +79,8 @@ class Fan(QLabel):
             image = self.graphics["off"]
 
         # Scale the image
-        pixmap = QPixmap(image).scaled(int(300 * self.__scale), 
-                                       int(350 * self.__scale), 
-                                       Qt.KeepAspectRatio)
+        pixmap = scaled_pixmap(image, int(300 * self.__scale), 
+                                       int(350 * self.__scale))
         
         # Set widget size to match image size
         self.setFixedSize(pixmap.size())
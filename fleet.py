@@ -0,0 +1,228 @@
+"""***************************************************************************
+Title:          Fleet
+File:           fleet.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file simulates a fleet of homes of the
+                Autonomous_HVAC_System in one process, e.g. a whole housing
+                development. The state of all homes is held as one array per
+                property and every tick steps all homes with one vectorized
+                update. All homes share one weather dataset.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import time
+import numpy as np
+from simulation import HEAT_LOSS_COEFFICIENT, THERMAL_CAPACITY, TIME_STEP
+from simulation import STAGE_THRESHOLDS, STAGE_CAPACITIES, select_mode
+from weather import shared_dataset, to_epoch_minute
+from predictor import predict
+
+
+"""*********************Classes********************************************"""
+class Fleet:
+    """
+    N homes held as struct-of-arrays state: indoor temperature, setpoint,
+    U, C, run direction, last output, cumulative output and steps. A home
+    runs like one ThermostatController: it starts at the outdoor
+    temperature, heats or cools to its setpoint with the same explicit Euler
+    step as `simulate`, and stops once the setpoint is reached. `step` uses
+    preallocated buffers, so ticking does not allocate.
+    """
+    def __init__(self, homes, setpoints=22, U=HEAT_LOSS_COEFFICIENT,
+                 C=THERMAL_CAPACITY, thresholds=STAGE_THRESHOLDS,
+                 capacities=STAGE_CAPACITIES, dt=TIME_STEP, weather=None):
+        """
+        Create the homes, idle until `start`.
+
+        homes: Number of homes (int)
+        setpoints: Setpoint of every home, or one for all (float or array)
+        U: Heat loss coefficient of every home, or one for all
+        C: Thermal capacity of every home, or one for all
+        thresholds: Lower temperature difference bound of each stage (tuple)
+        capacities: Output of each stage (tuple)
+        dt: Time step of a tick in seconds (float)
+        weather: Minute series of outdoor temperatures, the shared dataset by
+                 default (MinuteSeries)
+        """
+        self.homes = homes
+        self.thresholds = tuple(thresholds)
+        self.capacities = tuple(capacities)
+        self.dt = dt
+        self.weather = weather if weather is not None \
+            else shared_dataset().get().minutes()
+
+        shape = (homes,)
+        self.setpoint = np.empty(shape)
+        self.setpoint[:] = setpoints
+        self.U = np.empty(shape)
+        self.U[:] = U
+        self.C = np.empty(shape)
+        self.C[:] = C
+        self.temperature = np.zeros(shape)
+        self.direction = np.zeros(shape)  # HEATING 1, COOLING -1, IDLE 0
+        self.q = np.zeros(shape)  # Output during the last tick (BTU)
+        self.energy = np.zeros(shape)  # Output since `start` (BTU)
+        self.steps = np.zeros(shape, dtype=np.int64)
+        self.running = np.zeros(shape, dtype=bool)
+        self.stalled = np.zeros(shape, dtype=bool)
+        self.minute = 0.0  # Simulated time as an epoch minute
+        self.outdoor = float("nan")
+        self.ticks = 0
+
+        # Work buffers of `step`
+        self._difference = np.zeros(shape)
+        self._change = np.zeros(shape)
+        self._moving = np.zeros(shape, dtype=bool)
+        self._mask = np.zeros(shape, dtype=bool)
+
+    def __len__(self):
+        return self.homes
+
+    def start(self, date, hour, minute=0):
+        """
+        Start every home at the outdoor temperature of a date and time,
+        heating or cooling towards its setpoint.
+
+        date: Date as yyyy-mm-dd (string)
+        hour: Hour of the day 0-23 (int)
+        minute: Minute of the hour 0-59 (int)
+        """
+        self.minute = float(to_epoch_minute(date, hour, minute))
+        self.outdoor = self.outdoor_temperature()
+        if self.outdoor is None:
+            raise ValueError(f"No outdoor temperature for {date} {hour}:00")
+        self.temperature[:] = self.outdoor
+        self.direction[:] = select_mode(self.setpoint, self.temperature)
+        self.q[:] = 0
+        self.energy[:] = 0
+        self.steps[:] = 0
+        self.stalled[:] = False
+        np.not_equal(self.direction, 0, out=self.running)
+        self.ticks = 0
+
+    def outdoor_temperature(self):
+        """
+        Return the outdoor temperature at the simulated time, or None.
+        """
+        offset = int(self.minute) - self.weather.start
+        if not 0 <= offset < len(self.weather):
+            return None
+        temperature = self.weather.temperatures[offset]
+        return None if np.isnan(temperature) else float(temperature)
+
+    def step(self):
+        """
+        Advance every running home by one time step.
+        """
+        difference = self._difference
+        change = self._change
+        moving = self._moving
+        mask = self._mask
+        q = self.q
+
+        # Staged output from the distance to the setpoint
+        np.subtract(self.setpoint, self.temperature, out=difference)
+        np.multiply(difference, self.direction, out=difference)
+        q.fill(0)
+        for limit, capacity in zip(self.thresholds[::-1],
+                                   self.capacities[::-1]):
+            np.greater(difference, limit, out=mask)
+            np.copyto(q, capacity, where=mask)
+
+        # dT = (q - U * difference) / C for the homes still moving
+        np.multiply(self.U, difference, out=change)
+        np.subtract(q, change, out=change)
+        np.divide(change, self.C, out=change)
+        np.greater(change, 0, out=moving)
+        np.logical_and(moving, self.running, out=moving)
+
+        # Losses outweigh the output: the run would never finish
+        np.less_equal(change, 0, out=mask)
+        np.logical_and(mask, self.running, out=mask)
+        np.logical_or(self.stalled, mask, out=self.stalled)
+
+        np.multiply(q, moving, out=q)
+        np.multiply(change, moving, out=change)
+        np.multiply(change, self.direction, out=change)
+        np.add(self.temperature, change, out=self.temperature)
+        np.add(self.energy, q, out=self.energy)
+        np.add(self.steps, moving, out=self.steps)
+
+        # Homes that reached their setpoint stop
+        np.subtract(self.setpoint, self.temperature, out=difference)
+        np.multiply(difference, self.direction, out=difference)
+        np.greater(difference, 0, out=mask)
+        np.logical_and(moving, mask, out=self.running)
+
+        self.ticks += 1
+        self.minute += self.dt / 60
+        if int(self.minute) != int(self.minute - self.dt / 60):
+            outdoor = self.outdoor_temperature()
+            self.outdoor = outdoor if outdoor is not None else float("nan")
+
+    def run(self, ticks):
+        """
+        Step the fleet a number of times. Returns the throughput in
+        home-steps per second of wall time.
+
+        ticks: Number of steps (int)
+        """
+        started = time.perf_counter()
+        for _ in range(ticks):
+            self.step()
+        elapsed = time.perf_counter() - started
+        return self.homes * ticks / elapsed if elapsed else float("inf")
+
+    def predict(self):
+        """
+        Predict the rest of the run of every home in closed form, without
+        stepping: seconds and output (BTU) left, per home. Homes that are
+        not running get an empty prediction.
+        """
+        start = np.where(self.running, self.temperature, self.setpoint)
+        return predict(start, self.setpoint, U=self.U, C=self.C, dt=self.dt,
+                       thresholds=self.thresholds,
+                       capacities=self.capacities)
+
+    @property
+    def reached(self):
+        """
+        Homes whose run reached the setpoint (bool array).
+        """
+        return ~self.running & ~self.stalled & (self.direction != 0)
+
+    @property
+    def total_energy(self):
+        """
+        Total output of the fleet since `start` in BTU.
+        """
+        return float(self.energy.sum())
+
+
+"""*********************Main Routine***************************************"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simulate a fleet of homes in one process.")
+    parser.add_argument("--homes", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--date", default="2024-01-01")
+    parser.add_argument("--hour", type=int, default=0)
+    parser.add_argument("--setpoint-min", type=float, default=19)
+    parser.add_argument("--setpoint-max", type=float, default=25)
+    args = parser.parse_args()
+
+    setpoints = np.linspace(args.setpoint_min, args.setpoint_max, args.homes)
+    fleet = Fleet(args.homes, setpoints)
+    fleet.start(args.date, args.hour)
+    rate = fleet.run(args.ticks)
+
+    print(f"{fleet.homes} homes, {args.ticks} ticks at "
+          f"{fleet.homes * args.ticks / rate:.3f} s: "
+          f"{rate:,.0f} home-steps/s "
+          f"({rate / fleet.homes:,.0f} ticks/s)")
+    print(f"reached {int(fleet.reached.sum())}, "
+          f"running {int(fleet.running.sum())}, "
+          f"stalled {int(fleet.stalled.sum())}, "
+          f"total output {fleet.total_energy:,.0f} BTU")
@@ -14,12 +14,24 @@ from PyQt5.QtWidgets import QMainWindow, QApplication, QPushButton, QWidget
 from PyQt5.QtWidgets import QAction, QTabWidget, QVBoxLayout, QGridLayout 
 from PyQt5.QtWidgets import QLabel, QDoubleSpinBox, QTimeEdit, QDateEdit
 from PyQt5.QtGui import QIcon, QFont, QPixmap
-from PyQt5.QtCore import Qt, pyqtSlot, QDate, QTime, QTimer
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QDate, QTime
 import symbols
 import damper
 import heating_cooling
 import fan
-import controller
+from logger import get_logger
+from metrics import counter, histogram
+from time import perf_counter
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+TAB_NAMES = ("overview", "mechanical", "ground", "basement", "settings")
+TAB_REFRESH_SECONDS = {
+    name: histogram("hvac_tab_refresh_seconds", "Time to refresh a GUI tab",
+                    tab=name) for name in TAB_NAMES}
+SKIPPED_REFRESHES = counter("hvac_tab_refresh_skipped_total",
+                            "Tab refreshes skipped as the state is unchanged")
 
 
 """*********************Classes********************************************"""
@@ -28,6 +40,10 @@ class MainWindow(QMainWindow):
     """
     Main application window with tabs.
     """
+    # Carries controller state changes from the simulation threads into the
+    # GUI thread, where Qt delivers it as a queued call
+    controller_changed = pyqtSignal()
+
     def __init__(self, controller):
         """
         Initialize the main window with tabs.
@@ -60,36 +76,55 @@ class MainWindow(QMainWindow):
         self.settings_tab = SettingsWindow(self)
         self.tab_widget.addTab(self.settings_tab, "Settings")
 
-        # Connect the signal to update_tab method
-        self.tab_widget.currentChanged.connect(self.update_tab)
+        # Connect the signal to show_tab method
+        self.tab_widget.currentChanged.connect(self.show_tab)
         
         # Initiate operations
         #self.controller.start_operation_heating_cooling(
         #    22.0, "2024-01-01", "0:00")
-        # 添加一个定时器来定期刷新GUI
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_all_tabs)
-        self.timer.start(1000) # 每1000毫秒（1秒）刷新一次
+        # Refresh the GUI when the controller state changes instead of
+        # polling it on a timer
+        self.version = -1  # Version of the controller state on display
+        self.controller_changed.connect(self.update_tab)
+        self.controller.state_changed.subscribe(
+            lambda controller: self.controller_changed.emit())
+        
+    def show_tab(self, index):
+        """
+        Updates a newly selected tab even if the state did not change.
         
-    def update_all_tabs(self):
-        self.update_tab
+        index: Index of the selected tab (int)
+        """
+        self.update_tab(force=True)
         
-    def update_tab(self):
+    def update_tab(self, force=False):
         """
-        Updates the tab properties based on the selected tab.
+        Updates the tab properties based on the selected tab. Nothing is
+        done when the published controller state did not change.
+        
+        force: Update even if the state version is on display (bool)
         """
+        snapshot = self.controller.snapshot
+        if snapshot.version == self.version and not force:
+            SKIPPED_REFRESHES.inc()
+            return
+        started = perf_counter()
+        self.version = snapshot.version
         current_index = self.tab_widget.currentIndex()
         
         if current_index == 0:  # Overview tab
-            self.overview_tab.update_tab(self.controller)
+            self.overview_tab.update_tab(snapshot)
         elif current_index == 1:  # Mechanical tab
-            self.mechanical_tab.update_tab(self.controller)
+            self.mechanical_tab.update_tab(snapshot)
         elif current_index == 2:  # Ground tab
-            self.ground_tab.update_tab(self.controller)
+            self.ground_tab.update_tab(snapshot)
         elif current_index == 3:  # Basement tab
-            self.basement_tab.update_tab(self.controller)
+            self.basement_tab.update_tab(snapshot)
         elif current_index == 4:  # Settings tab
-            self.settings_tab.update_tab(self.controller)
+            self.settings_tab.update_tab(snapshot)
+        if 0 <= current_index < len(TAB_NAMES):
+            TAB_REFRESH_SECONDS[TAB_NAMES[current_index]].observe(
+                perf_counter() - started)
             
         self.repaint
 
@@ -256,14 +291,14 @@ class OverviewWindow(QWidget):
         symbols.Symbols("state value", scale=0.8, instance=self,
                         value=self.alert, pos_x=675, pos_y=380) 
         
-    def update_tab(self, controller):
+    def update_tab(self, snapshot):
         """
         Updates the tab properties.
         
-        controller: Instance of controller running software (class)
+        snapshot: Published state of the controller (StateSnapshot)
         """
         # Get system overview as a list
-        system_data = controller.system_overview()
+        system_data = snapshot.system_overview()
         
         tab_data = [self.bdrm_1_temp, self.bdrm_2_temp, self.bdrm_3_temp,
                     self.bath_1_temp, self.bath_2_temp,
@@ -402,14 +437,14 @@ class MechanicalWindow(QWidget):
         fan.Fan(status=self.fan_status, speed=self.fan_speed, scale=0.60, 
                 pos_x=290, pos_y=430, instance=self)
         
-    def update_tab(self, controller):
+    def update_tab(self, snapshot):
         """
         Updates the tab properties.
         
-        controller: Instance of controller running software (class)
+        snapshot: Published state of the controller (StateSnapshot)
         """
         # Get system overview as a tuple
-        system_data = controller.mechanical_room()
+        system_data = snapshot.mechanical_room()
         
         tab_data = [self.furnace_status, self.furnace_energy,
                     self.aircon_status, self.aircon_energy,
@@ -504,6 +539,9 @@ class GroundWindow(QWidget):
                                                          self.temp_setpoint, 
                                                          "°C", 0.5, 
                                                          80, 40, 850, 90)
+        # Send setpoint changes to the controller's control worker
+        self.setpoint_spinbox.valueChanged.connect(
+            parent.controller.set_setpoint)
  
         # Bedroom 1
         # Room Title
@@ -588,18 +626,14 @@ class GroundWindow(QWidget):
         symbols.Symbols("damper value", value=self.kitchen_damper, scale=0.5, 
                         pos_x=640, pos_y=470, instance=self)  
         
-    def update_tab(self, controller):
+    def update_tab(self, snapshot):
         """
         Updates the tab properties.
         
-        controller: Instance of controller running software (class)
+        snapshot: Published state of the controller (StateSnapshot)
         """      
-        # Connect changed values to the controller using one method
-        self.setpoint_spinbox.valueChanged.connect(
-            lambda value: controller.control_temperature(value, self.temp_out)
-        )
         # Get system overview as a list
-        system_data = controller.ground_floor()
+        system_data = snapshot.ground_floor()
         
         tab_data = [self.bdrm_1_temp, self.bdrm_1_damper,
                     self.bdrm_2_temp, self.bdrm_2_damper,
@@ -687,6 +721,9 @@ class BasementWindow(QWidget):
                                                          self.temp_setpoint, 
                                                          "°C", 0.5, 
                                                          80, 40, 850, 90)
+        # Send setpoint changes to the controller's control worker
+        self.setpoint_spinbox.valueChanged.connect(
+            parent.controller.set_setpoint)
         
         # Bedroom 3
         # Room title
@@ -752,18 +789,15 @@ class BasementWindow(QWidget):
         symbols.Symbols("damper value", value=self.rec_rm_damper, scale=0.5, 
                         pos_x=515, pos_y=386, instance=self)  
         
-    def update_tab(self, controller):
+    def update_tab(self, snapshot):
         """
         Updates the tab properties.
                 
-        controller: Instance of controller running software (class)
+        snapshot: Published state of the controller (StateSnapshot)
         """        
-        # Connect changed values to the controller using one method
-        self.setpoint_spinbox.valueChanged.connect(
-            lambda value: controller.control_temperature(value,self.temp_out))
         
         # Get system overview as a tuple
-        system_data = controller.basement()
+        system_data = snapshot.basement()
         
         tab_data = [self.bdrm_3_temp, self.bdrm_3_damper,
                     self.bath_2_temp, self.bath_2_damper,
@@ -800,6 +834,7 @@ class SettingsWindow(QWidget):
         central_widget.setLayout(grid_layout)
         
         # Initialize variables
+        self.main_window = parent
         self.date = date
         self.time = time
         self.mode = mode
@@ -831,7 +866,7 @@ class SettingsWindow(QWidget):
         qdate: The newly adjusted date (yyyy-mm-dd)
         """
         self.date = qdate.toString("yyyy-MM-dd") 
-        controller.update_date(self.date) 
+        self.main_window.controller.set_date_time(self.date, self.time)
             
     def update_time(self, qtime): 
         """
@@ -840,17 +875,17 @@ class SettingsWindow(QWidget):
         qtime: The newly adjusted time (hh:mm)
         """
         self.time = qtime.toString("h:mm ap") 
-        controller.update_time(self.time)
+        self.main_window.controller.set_date_time(self.date, self.time)
     
-    def update_tab(self, controller):
+    def update_tab(self, snapshot):
         """
         Updates the tab properties.
         
-        controller: Instance of controller running software (class)
+        snapshot: Published state of the controller (StateSnapshot)
         """
         # Get system overview as a tuple
-        system_data = controller.settings()
-        print(system_data)
+        system_data = snapshot.settings()
+        log.debug("Settings refreshed.", data=system_data, per_second=1)
         tab_data = [self.date, self.time, self.mode]
                 
         # Unpack the list into the corresponding attributes
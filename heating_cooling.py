@@ -12,11 +12,17 @@ Description:    This file is used to initiate the graphic for any heating or
 """*********************Libraries******************************************"""
 import sys
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QPainter, QColor, QFont
+from PyQt5.QtCore import QTimer
+from symbols import scaled_pixmap
+from logger import get_logger
+from metrics import histogram, timed
 
 
 """*********************Global*********************************************"""
+log = get_logger(__name__)
+PAINT_SECONDS = histogram("hvac_paint_seconds", "Time to paint a widget",
+                          widget="appliance")
 furnace_images = {
     "Fault" : "Furnace/furnace_fault.png",
     "Off" : "Furnace/furnace_off.png",
@@ -70,7 +76,7 @@ class Appliance(QLabel):
             else:
                 self.graphics = aircon_images
         except Exception as e: 
-            print(e) 
+            log.error(f"Error loading appliance images: {e}")
             self.__status = "Fault" 
             self.graphics = {"An error has occurred generating the image."}
             
@@ -84,6 +90,7 @@ class Appliance(QLabel):
         else:
             self.appliance_inactive()
         
+    @timed(PAINT_SECONDS)
     def paintEvent(self, event):
         """
         This method is called to update the graphic.
@@ -101,9 +108,8 @@ class Appliance(QLabel):
                 image = self.graphics[self.__status]
             
             # Scale the image
-            pixmap = QPixmap(image).scaled(int(300 * self.__scale), 
-                                           int(350 * self.__scale), 
-                                           Qt.KeepAspectRatio)
+            pixmap = scaled_pixmap(image, int(300 * self.__scale), 
+                                           int(350 * self.__scale))
             
             # Set the widget's size to match the image size (this is critical)
             self.setFixedSize(pixmap.size())
@@ -141,7 +147,8 @@ class Appliance(QLabel):
             painter.end()
             
         except Exception as e:
-            print(f"Error has occured in HeatingCooling paintEvent: {e}")
+            log.error(f"Error has occured in HeatingCooling paintEvent: {e}",
+                      per_second=1)
                 
     def appliance_inactive(self):
         """
@@ -163,9 +170,8 @@ class Appliance(QLabel):
         try:
             # Initialize images
             image = self.graphics["On"][self.__frame]
-            pixmap = QPixmap(image).scaled(int(300 * self.__scale), 
-                                           int(350 * self.__scale), 
-                                           Qt.KeepAspectRatio)
+            pixmap = scaled_pixmap(image, int(300 * self.__scale), 
+                                           int(350 * self.__scale))
             self.setPixmap(pixmap)
             self.setFixedSize(pixmap.size())
             self.move(self.__pos_x, self.__pos_y)
@@ -174,7 +180,7 @@ class Appliance(QLabel):
             self.__frame = (self.__frame + 1) % len(self.graphics["On"])   
             
         except Exception as e:
-            print(f"Error in updating the appliance: {e}")            
+            log.error(f"Error in updating the appliance: {e}", per_second=1)
     
     def update_temperature(self, energy):
         """
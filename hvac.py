@@ -0,0 +1,179 @@
+"""***************************************************************************
+Title:          Headless HVAC
+File:           hvac.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    Headless entry point of the Autonomous_HVAC_System. Runs the
+                controller without the GUI or Qt and writes its state as JSON
+                lines to stdout or a file:
+
+                    python -m hvac run --setpoint 22 --date 2024-01-01
+                    python -m hvac replay session.rec
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import json
+import sys
+import logger
+import metrics
+from telemetry import TelemetryRecorder, add_arguments
+from controller import ThermostatController
+from replay import replay
+from control import CONTROLS, make_control
+from simulation import SPEEDUPS
+
+
+"""*********************Global*********************************************"""
+log = logger.get_logger(__name__)
+
+
+"""*********************Functions******************************************"""
+def state_record(controller):
+    """
+    Return the state of the controller as a dictionary for JSON output.
+
+    controller: Controller to describe (ThermostatController)
+    """
+    return {
+        "version": controller.snapshot.version,
+        "date": controller.date,
+        "time": controller.time,
+        "mode": controller.mode,
+        "setpoint": controller.setpoint,
+        "temp_out": controller.temp_out,
+        "current_temp": controller.current_temp,
+        "furnace_status": controller.furnace_status,
+        "furnace_energy": controller.furnace_energy,
+        "aircon_status": controller.aircon_status,
+        "aircon_energy": controller.aircon_energy,
+        "fan_status": controller.fan_status,
+        "fan_speed": controller.fan_speed,
+    }
+
+
+def write_states(controller, output):
+    """
+    Write one JSON line per state change of a controller from now on.
+
+    controller: Controller to follow (ThermostatController)
+    output: Text file the state is written to (file)
+    """
+    controller.state_changed.subscribe(
+        lambda state: output.write(json.dumps(state_record(state)) + "\n"))
+
+
+def run_replay(path, output=sys.stdout, multiplier=None):
+    """
+    Replay a recorded session, writing one JSON line per state change.
+    Returns the controller.
+
+    path: Session log written with --record (string)
+    output: Text file the state is written to (file)
+    multiplier: Times the recorded speed, None to replay at max (float)
+    """
+    controller = ThermostatController()
+    write_states(controller, output)
+    return replay(path, multiplier, controller)
+
+
+def run(set_point, date_input, time_input, output=sys.stdout, speedup=None,
+        telemetry=None, control="staged"):
+    """
+    Run the controller from a setpoint, date and time until heating or
+    cooling ends, writing one JSON line per state change. Returns the
+    controller.
+
+    set_point: Temperature setpoint (float)
+    date_input: Date as yyyy-mm-dd (string)
+    time_input: Time as h:mm (string)
+    output: Text file the state is written to (file)
+    speedup: Playback speed-up, None to run at max speed (float)
+    telemetry: Directory the state history is appended to (string)
+    control: Control mode, "staged", "pid" or "mpc" (string)
+    """
+    controller = ThermostatController()
+    controller.speedup = speedup
+    controller.control = make_control(control)
+    write_states(controller, output)
+    recorder = None
+    if telemetry is not None:
+        recorder = TelemetryRecorder(telemetry, zones=controller.zones.names)
+        recorder.attach(controller)
+    try:
+        controller.initialize(set_point, date_input, time_input)
+        controller.control_temperature()  # On this thread, no worker needed
+    finally:
+        if recorder is not None:
+            recorder.close()
+    return controller
+
+
+def main(argv=None):
+    """
+    Parse the command line and run the requested command. Returns the exit
+    status, 1 when the run cannot start (e.g. a date outside the weather
+    data).
+
+    argv: Command line arguments, sys.argv by default (list of string)
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m hvac",
+        description="Run the HVAC controller without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser(
+        "run", help="Heat or cool to a setpoint and print the state.")
+    run_parser.add_argument("--setpoint", type=float, default=22.0)
+    run_parser.add_argument("--date", default="2024-01-01",
+                            help="Date as yyyy-mm-dd")
+    run_parser.add_argument("--time", default="0:00", help="Time as h:mm")
+    run_parser.add_argument("--speedup", choices=list(SPEEDUPS),
+                            default="max")
+    run_parser.add_argument("--output", default=None,
+                            help="File to write the state to (stdout)")
+    run_parser.add_argument("--control", choices=list(CONTROLS),
+                            default="staged", help="Control mode")
+    run_parser.add_argument("--log-json", action="store_true",
+                            help="Write the log to stderr as JSON lines")
+    metrics.add_arguments(run_parser)
+    add_arguments(run_parser)
+    replay_parser = commands.add_parser(
+        "replay", help="Replay a session recorded with --record.")
+    replay_parser.add_argument("session", help="Session log to replay")
+    replay_parser.add_argument("--multiplier", type=float, default=None,
+                               help="Times the recorded speed (max)")
+    replay_parser.add_argument("--output", default=None,
+                               help="File to write the state to (stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        logger.setup(json_lines=args.log_json)
+        services = metrics.start(args.metrics_port, args.metrics_file)
+        speedup = SPEEDUPS[args.speedup]
+        try:
+            if args.output is None:
+                # The log goes to stderr, stdout only gets the state
+                run(args.setpoint, args.date, args.time, sys.stdout, speedup,
+                    args.telemetry, args.control)
+            else:
+                with open(args.output, "w") as output:
+                    run(args.setpoint, args.date, args.time, output,
+                        speedup, args.telemetry, args.control)
+        except ValueError as ve:
+            log.error(f"Value error: {ve}")
+            return 1
+        finally:
+            for service in services:
+                service.shutdown()  # The file dump writes the final metrics
+    elif args.command == "replay":
+        logger.setup()
+        if args.output is None:
+            run_replay(args.session, sys.stdout, args.multiplier)
+        else:
+            with open(args.output, "w") as output:
+                run_replay(args.session, output, args.multiplier)
+
+
+"""*********************Main Routine***************************************"""
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""***************************************************************************
+Title:          Logger
+File:           logger.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the logging of the Autonomous_HVAC_System.
+                Callers only put records on a queue; a background thread
+                formats and writes them, so a slow terminal or pipe never
+                holds up the control loop. Messages from hot loops can be
+                rate limited or sampled per call site, and carry structured
+                fields (zone, temp, capacity, ...) written as key=value pairs
+                or as JSON lines.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import atexit
+import copy
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+
+"""*********************Global*********************************************"""
+ROOT = "hvac"  # Parent logger of every module
+QUEUE_SIZE = 10000  # Records waiting for the writer before new ones drop
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Keyword arguments of the logging calls, every other one is a field
+LOGGING_KEYWORDS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+_writer = None  # Queue handler of the ROOT logger, started by `setup`
+_setup_lock = threading.Lock()
+
+
+"""*********************Functions******************************************"""
+def setup(stream=None, level=logging.INFO, json_lines=False):
+    """
+    Send the records of every HVAC logger through a queue to a background
+    writer. Called again, it replaces the writer, e.g. to switch stream or
+    format.
+
+    stream: Text file to write to, stderr by default (file)
+    level: Lowest level written (int)
+    json_lines: Write one JSON object per record instead of text (bool)
+    """
+    with _setup_lock:
+        _start(stream, level, json_lines)
+
+
+def shutdown():
+    """
+    Write the records still queued and stop the background writer.
+    """
+    global _writer
+    if _writer is not None:
+        logging.getLogger(ROOT).removeHandler(_writer)
+        _writer.close()  # Returns once the queue is written
+        _writer = None
+
+
+def flush():
+    """
+    Wait until the records logged so far are written.
+    """
+    if _writer is not None:
+        _writer.flush()
+
+
+def get_logger(name):
+    """
+    Return the logger of a module, starting the background writer with the
+    defaults the first time.
+
+    name: Name of the module (string)
+    """
+    with _setup_lock:
+        if _writer is None:
+            _start()
+    return FieldLogger(logging.getLogger(f"{ROOT}.{name}"), {})
+
+
+def _start(stream=None, level=logging.INFO, json_lines=False):
+    """
+    Replace the background writer; see `setup`. The caller holds the setup
+    lock.
+    """
+    global _writer
+    shutdown()
+    output = logging.StreamHandler(stream if stream is not None
+                                   else sys.stderr)
+    output.setFormatter(JsonFormatter() if json_lines
+                        else FieldFormatter(TEXT_FORMAT))
+
+    _writer = QueueWriter(output)
+    _writer.addFilter(RateLimitFilter())
+    root = logging.getLogger(ROOT)
+    root.addHandler(_writer)
+    root.setLevel(level)
+    root.propagate = False
+    atexit.unregister(shutdown)
+    atexit.register(shutdown)  # Write the queued records before exiting
+
+
+def _after_fork():
+    """
+    In a forked process the writer thread of the parent does not exist:
+    drop the records copied from the parent and start a new thread with the
+    first record.
+    """
+    if _writer is not None:
+        _writer.queue = queue.Queue(_writer.queue.maxsize)
+        _writer._thread = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+"""*********************Classes********************************************"""
+class FieldLogger(logging.LoggerAdapter):
+    """
+    Logger taking structured fields as keyword arguments:
+
+        log.info("Temperature updated", zone="house", temp=21.5, capacity=300)
+
+    Two more keywords limit a call site of a hot loop:
+    `per_second` writes at most that many of its records per second and
+    `every` writes one of every that many records.
+    """
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs)
+                  if key not in LOGGING_KEYWORDS}
+        extra = dict(kwargs.get("extra") or {})
+        extra["per_second"] = fields.pop("per_second", None)
+        extra["every"] = fields.pop("every", None)
+        extra["fields"] = fields
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drops the records of a call site beyond its `per_second` rate or
+    outside its `every` sample. The next record written from the site gets
+    a `suppressed` field counting the records dropped since the last one.
+    """
+    def __init__(self):
+        super().__init__()
+        self._sites = {}  # (file, line) -> [since, written, seen, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        per_second = getattr(record, "per_second", None)
+        every = getattr(record, "every", None)
+        if per_second is None and every is None:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.setdefault((record.pathname, record.lineno),
+                                          [now, 0, 0, 0])
+            if now - site[0] >= 1:
+                site[0], site[1] = now, 0
+            site[2] += 1
+            keep = (every is None or (site[2] - 1) % every == 0) and \
+                (per_second is None or site[1] < per_second)
+            if not keep:
+                site[3] += 1
+                return False
+            site[1] += 1
+            dropped, site[3] = site[3], 0
+
+        if dropped:
+            record.fields = dict(record.fields, suppressed=dropped)
+        return True
+
+
+class QueueWriter(logging.Handler):
+    """
+    Handler putting records on a queue for a background thread that passes
+    them to the output handler. The caller never waits for the output: when
+    the writer falls behind and the queue is full, records are dropped and
+    counted. The thread starts with the first record.
+    """
+    def __init__(self, output, size=QUEUE_SIZE):
+        """
+        Create the writer of an output handler.
+
+        output: Handler writing the records (logging.Handler)
+        size: Records waiting for the writer before new ones drop (int)
+        """
+        super().__init__()
+        self.output = output
+        self.queue = queue.Queue(size)
+        self.dropped = 0
+        self._thread = None
+
+    def emit(self, record):
+        if self._thread is None:  # The handler lock is held here
+            self._thread = threading.Thread(target=self._write, daemon=True,
+                                            name="hvac-log-writer")
+            self._thread.start()
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        """
+        Return a copy of a record with its message and exception rendered,
+        so the writer does not touch objects the caller keeps changing.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def flush(self):
+        """
+        Wait until the queued records are written.
+        """
+        if self._thread is not None:
+            self.queue.join()
+
+    def close(self):
+        """
+        Write the queued records and stop the writer thread.
+        """
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+        super().close()
+
+    def _write(self):
+        """
+        Background loop passing the queued records to the output handler.
+        """
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    return
+                self.output.handle(record)
+            finally:
+                self.queue.task_done()
+
+
+class FieldFormatter(logging.Formatter):
+    """
+    Text formatter appending the structured fields as key=value pairs.
+    """
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{key}={value}"
+                                   for key, value in fields.items())
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter writing every record as one JSON object per line.
+    """
+    def format(self, record):
+        import json  # Only loaded when JSON lines are written
+
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
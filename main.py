@@ -6,36 +6,125 @@ Release Notes:  N/A
 Author:         Zhaolin Wei
 
 Description:    The main application to call and run the GUI, Model, and the
-                controller.
+                controller. Run with --profile-startup to print the startup
+                timings and exit once the controller has started.
 ***************************************************************************"""
 
 """*********************Libraries******************************************"""
 import sys
-from PyQt5.QtWidgets import QApplication
-import controller
-import gui
+from startup import StartupProfiler, PROFILE_FLAG
+
+PROFILER = StartupProfiler(enabled=PROFILE_FLAG in sys.argv)
+PROFILER.install()
+with PROFILER.phase("import GUI"):
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    import gui
+with PROFILER.phase("import controller"):
+    import controller
+    from logger import get_logger
+    import metrics
+    import telemetry
+    import replay
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+runtime = None  # Asyncio loop running the Qt event loop (QtEventLoop)
+
+
+"""*********************Classes********************************************"""
+class FirstPaint(QObject):
+    """
+    Calls back once, right after a widget is painted for the first time.
+    """
+    def __init__(self, widget, callback):
+        """
+        widget: Widget to watch (QWidget)
+        callback: Function without arguments
+        """
+        super().__init__(widget)
+        self.callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            QTimer.singleShot(0, self.callback)  # Once the paint is done
+        return False
+
+
+"""*********************Functions******************************************"""
+def start_controller(app, hvac_controller, main_window):
+    """
+    Start the controller once the window is on screen, so the CSV load does
+    not delay the first window.
+
+    app: Running application (QApplication)
+    hvac_controller: Controller of the window (ThermostatController)
+    main_window: Main window of the GUI (MainWindow)
+    """
+    PROFILER.mark("first paint")
+    from async_runtime import AsyncControl  # Loaded with the event loop
+
+    # Run the controller and the simulation as coroutines on the asyncio
+    # loop of the Qt event loop; the window refreshes on state changes
+    with PROFILER.phase("CSV load and start"):
+        control = AsyncControl(hvac_controller)
+        runtime.create_task(control.run())
+        hvac_controller.start_operation_heating_cooling(
+            22.0, "2024-01-01", "0:00")
+
+    if PROFILER.enabled:
+        PROFILER.uninstall()
+        PROFILER.report()
+        app.quit()
+
 
 """*********************Main Routine***************************************"""
 if __name__ == "__main__":
     try:
         # 1. 创建 QApplication 实例，这是任何PyQt应用的第一步
-        app = QApplication(sys.argv)
+        with PROFILER.phase("application"):
+            app = QApplication(sys.argv)
+        
+        # Metrics endpoint and file dump from --metrics-port/--metrics-file,
+        # shut down when the application quits (the dump writes last)
+        for service in metrics.start_from_args(sys.argv):
+            app.aboutToQuit.connect(service.shutdown)
         
         # 2. 创建控制器实例
-        # 控制器现在会初始化所有必要的模型和数据
-        hvac_controller = controller.ThermostatController()
+        with PROFILER.phase("controller"):
+            hvac_controller = controller.ThermostatController()
+        
+        # State history from --telemetry, sealed when the application quits
+        recorder = telemetry.start_from_args(sys.argv, hvac_controller)
+        if recorder is not None:
+            app.aboutToQuit.connect(recorder.close)
+        
+        # Session log from --record, replayed with python -m hvac replay
+        session = replay.start_from_args(sys.argv, hvac_controller)
+        if session is not None:
+            app.aboutToQuit.connect(session.close)
         
         # 3. 创建主窗口（GUI），并将控制器实例传递给它
-        main_window = gui.MainWindow(hvac_controller)
+        with PROFILER.phase("window construction"):
+            main_window = gui.MainWindow(hvac_controller)
+        
+        # Asyncio loop of the controller, running the Qt event loop
+        with PROFILER.phase("import runtime"):
+            from async_runtime import QtEventLoop
+            runtime = QtEventLoop(app)
         
         # 4. 显示主窗口
+        FirstPaint(main_window.overview_tab, lambda: start_controller(
+            app, hvac_controller, main_window))
         main_window.show()
         
-        # 5. 启动控制器的后台操作（例如，开始温度模拟）
-        hvac_controller.start_hvac_simulation_thread()
+        # 5. The controller starts after the first paint (start_controller)
         
         # 6. 启动Qt事件循环，并确保在关闭窗口时程序能正确退出
-        sys.exit(app.exec_())
+        sys.exit(runtime.run())
         
     except Exception as e:
-        print(f"Critical error: {e}")
\ No newline at end of file
+        log.critical(f"Critical error: {e}")
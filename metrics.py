@@ -0,0 +1,408 @@
+"""***************************************************************************
+Title:          Metrics
+File:           metrics.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the in-process metrics of the
+                Autonomous_HVAC_System: counters, gauges and fixed-bucket
+                histograms of the control loop and GUI latencies. Recording
+                a value costs well under a microsecond, so the metrics stay
+                on in production. They are read in the Prometheus text
+                format from a local HTTP endpoint or a periodic file dump:
+
+                    python main.py --metrics-port 9108
+                    python -m hvac run --metrics-file metrics.prom
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import functools
+import os
+import threading
+from time import perf_counter
+from bisect import bisect_left
+
+
+"""*********************Global*********************************************"""
+# Upper bounds in seconds of the latency histogram buckets, 10 µs to 1 s
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+DUMP_INTERVAL = 10.0  # Seconds between two file dumps
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+"""*********************Functions******************************************"""
+def counter(name, help_text, **labels):
+    """
+    Return the counter of a name and labels, creating it the first time.
+
+    name: Metric name, e.g. hvac_steps_total (string)
+    help_text: Description of the metric (string)
+    labels: Label names and values of the series (string)
+    """
+    return REGISTRY.get(Counter, name, help_text, labels)
+
+
+def gauge(name, help_text, **labels):
+    """
+    Return the gauge of a name and labels, creating it the first time.
+
+    name: Metric name (string)
+    help_text: Description of the metric (string)
+    labels: Label names and values of the series (string)
+    """
+    return REGISTRY.get(Gauge, name, help_text, labels)
+
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS, **labels):
+    """
+    Return the histogram of a name and labels, creating it the first time.
+
+    name: Metric name, e.g. hvac_step_seconds (string)
+    help_text: Description of the metric (string)
+    buckets: Upper bounds of the buckets, ascending (tuple of float)
+    labels: Label names and values of the series (string)
+    """
+    return REGISTRY.get(Histogram, name, help_text, labels, buckets)
+
+
+def timed(histogram):
+    """
+    Decorator observing the seconds every call of a function takes, e.g.
+    the paintEvent of a widget.
+
+    histogram: Histogram the durations go to (Histogram)
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def serve(port, host="127.0.0.1", registry=None):
+    """
+    Serve the metrics in the Prometheus text format at
+    http://host:port/metrics from a background thread. Returns the server;
+    call its `shutdown` to stop it.
+
+    port: Port to listen on, 0 for any free port (int)
+    host: Address to listen on, local only by default (string)
+    registry: Metrics to serve, all by default (Registry)
+    """
+    # Only loaded when the endpoint is used
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry if registry is not None else REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a log line
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name="hvac-metrics").start()
+    return server
+
+
+def add_arguments(parser):
+    """
+    Add the --metrics-port and --metrics-file options to a parser.
+
+    parser: Command line parser (argparse.ArgumentParser)
+    """
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve the metrics on this local port")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Write the metrics to this file periodically")
+
+
+def start_from_args(argv):
+    """
+    Start the endpoint and file dump requested on a command line, ignoring
+    every other argument. Returns the started services.
+
+    argv: Command line arguments (list of string)
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    add_arguments(parser)
+    args, _ = parser.parse_known_args(argv)
+    return start(args.metrics_port, args.metrics_file)
+
+
+def start(port=None, path=None):
+    """
+    Start the HTTP endpoint and/or the file dump of the metrics. Returns
+    the started services.
+
+    port: Port of the HTTP endpoint, None for no endpoint (int)
+    path: File of the periodic dump, None for no dump (string)
+    """
+    services = []
+    if port is not None:
+        services.append(serve(port))
+    if path is not None:
+        dump = FileDump(path)
+        dump.start()
+        services.append(dump)
+    return services
+
+
+"""*********************Classes********************************************"""
+class Sharded:
+    """
+    Base of the metrics written from many threads. Every thread adds to its
+    own shard, a list only that thread writes, so recording takes no lock;
+    reading sums the shards of all threads.
+    """
+    def __init__(self, size):
+        """
+        size: Number of values in a shard (int)
+        """
+        self._size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # Only taken to add a shard
+
+    def _new_shard(self):
+        """
+        Create the shard of the calling thread.
+        """
+        shard = self._local.shard = [0] * self._size
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    def totals(self):
+        """
+        Return the values of all shards added up.
+        """
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(values) for values in zip(*shards)] or [0] * self._size
+
+
+class Counter(Sharded):
+    """
+    Value that only goes up, e.g. the number of simulation steps.
+    """
+    kind = "counter"
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        """
+        Add to the counter.
+
+        amount: Amount to add (>=0)
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[0] += amount
+
+    @property
+    def value(self):
+        return self.totals()[0]
+
+    def samples(self):
+        return [("", {}, self.value)]
+
+
+class Gauge:
+    """
+    Value that goes up and down, e.g. the published state version.
+    """
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        """
+        Replace the value of the gauge.
+
+        value: New value (float)
+        """
+        self.value = value
+
+    def samples(self):
+        return [("", {}, self.value)]
+
+
+class Histogram(Sharded):
+    """
+    Distribution of observed values, e.g. latencies in seconds, counted in
+    fixed buckets. Observing is a binary search of the bucket plus two
+    additions to the shard of the thread: [bucket counts..., +Inf, sum].
+    """
+    kind = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Create an empty histogram.
+
+        buckets: Upper bounds of the buckets, ascending (tuple of float)
+        """
+        self.bounds = tuple(float(bound) for bound in buckets)
+        super().__init__(len(self.bounds) + 2)
+
+    def observe(self, value):
+        """
+        Count a value in its bucket.
+
+        value: Observed value (float)
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[bisect_left(self.bounds, value)] += 1
+        shard[-1] += value
+
+    @property
+    def count(self):
+        return sum(self.totals()[:-1])
+
+    def samples(self):
+        totals = self.totals()
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), totals):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            samples.append(("_bucket", {"le": le}, cumulative))
+        samples.append(("_sum", {}, totals[-1]))
+        samples.append(("_count", {}, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Every metric of the process, keyed by name and labels.
+    """
+    def __init__(self):
+        self._metrics = {}  # (name, labels) -> metric
+        self._help = {}  # name -> (kind, help text)
+        self._lock = threading.Lock()
+
+    def get(self, kind, name, help_text, labels=None, *args):
+        """
+        Return the metric of a name and labels, creating it the first time.
+
+        kind: Metric class (Counter, Gauge or Histogram)
+        name: Metric name (string)
+        help_text: Description of the metric (string)
+        labels: Label names and values of the series (dict)
+        args: Arguments of the metric class
+        """
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            known = self._help.setdefault(name, (kind.kind, help_text))
+            if known[0] != kind.kind:
+                raise ValueError(f"{name} is already a {known[0]}")
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = kind(*args)
+            return metric
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+            described = dict(self._help)
+        lines = []
+        family = None
+        for (name, labels), metric in metrics:
+            if name != family:
+                family = name
+                kind, help_text = described[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            for suffix, extra, value in metric.samples():
+                pairs = list(labels) + list(extra.items())
+                text = ",".join(f'{key}="{label}"' for key, label in pairs)
+                series = f"{name}{suffix}{{{text}}}" if text \
+                    else f"{name}{suffix}"
+                lines.append(f"{series} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class FileDump:
+    """
+    Writes the metrics to a file every `interval` seconds from a
+    background thread. Every dump replaces the file as a whole, so a reader
+    never sees half of one.
+    """
+    def __init__(self, path, interval=DUMP_INTERVAL, registry=None):
+        """
+        Create the dump; call `start` to begin writing.
+
+        path: File to write (string)
+        interval: Seconds between two dumps (float)
+        registry: Metrics to write, all by default (Registry)
+        """
+        self.path = path
+        self.interval = interval
+        self.registry = registry if registry is not None else REGISTRY
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start writing in the background.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="hvac-metrics-dump")
+        self._thread.start()
+
+    def shutdown(self):
+        """
+        Stop the background thread after a last dump.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self):
+        """
+        Write the current metrics to the file.
+        """
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            file.write(self.registry.render())
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        """
+        Dump until stopped, and once more on the way out.
+        """
+        while not self._stop.wait(self.interval):
+            self.write()
+        self.write()
+
+
+REGISTRY = Registry()  # Metrics of the process
@@ -8,8 +8,32 @@ Description:    This file contains the class and functions for the model of
 ***************************************************************************"""
 
 """*********************Libraries******************************************"""
-import pandas as pd
-import time
+import numpy as np
+from weather import WEATHER_CSV, MinuteSeries, TemperatureIndex, WeatherData
+from weather import parse_hour_stamps, shared_dataset
+from simulation import HEAT_LOSS_COEFFICIENT, THERMAL_CAPACITY, TIME_STEP
+from simulation import STAGE_THRESHOLDS, STAGE_CAPACITIES, HEATING, COOLING
+from simulation import MODE_NAMES, Playback, select_mode, simulate
+from simulation import stage_capacity
+from events import Event
+from logger import get_logger
+from metrics import counter, histogram
+from time import perf_counter
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+SIMULATION_SECONDS = {
+    name: histogram("hvac_simulation_seconds",
+                    "Time to compute a heating or cooling run",
+                    appliance=name) for name in ("furnace", "aircon")}
+STEP_SECONDS = {
+    name: histogram("hvac_step_seconds",
+                    "Time to apply a simulation step and notify subscribers",
+                    appliance=name) for name in ("furnace", "aircon")}
+STEPS = {
+    name: counter("hvac_steps_total", "Simulation steps played back",
+                  appliance=name) for name in ("furnace", "aircon")}
 
 
 """*********************Classes********************************************"""
@@ -19,13 +43,20 @@ class Model:
     core functionalities for connecting to the database and managing system 
     states such as temperature and mode.
     """
-    def __init__(self):
+    def __init__(self, temperature_data=None):
         """
         Initialize the model with default values for the HVAC system.
         This includes the current date, time, temperature settings, HVAC 
         status, and data loading.
-        """
-        self._temperature_data = None  # Use a private attribute
+
+        temperature_data: Data to use instead of the shared dataset (array)
+        """
+        self._dataset = shared_dataset()  # Weather data shared by all models
+        self._temperature_data = temperature_data  # Use a private attribute
+        self._temperature_index = None  # Built from the temperature data
+        self._minute_series = None  # Interpolated from the index
+        self._source = None  # Weather feed or store replacing the CSV data
+        self.interpolation = "linear"  # Sub-hourly interpolation method
         self.current_values = {
             "date": (1, 1),  # Default date: (month, day)
             "time": 0,  # Default time: hour
@@ -40,24 +71,56 @@ class Model:
             "mode": "Normal mode",  # Current mode (Cooling/Heating/Normal)
         }
 
-    def load_data_from_csv(self):
+    def load_data_from_csv(self, csv_path=WEATHER_CSV):
         """
-        Load data from a CSV file into a NumPy array for easy access.
+        Attach the model to the shared dataset of a weather CSV file. The
+        file is loaded through its compiled binary cache once per process
+        and reloaded only when it changes. When the cache cannot be built
+        from the file, the CSV is read into the model directly.
+
+        csv_path: Path to the weather CSV file (string)
         """
         try:
-            # Load the CSV data into a pandas DataFrame
-            df = pd.read_csv("Temperature_Humidity_Data.csv")
-            # Convert the DataFrame to a NumPy array
-            self._temperature_data = df.to_numpy()
-            print("CSV data loaded successfully.")
+            try:
+                dataset = shared_dataset(csv_path)
+                # Load and index the data now so lookups never scan the rows
+                dataset.get().index
+                self._dataset = dataset
+                self._temperature_data = None
+            except OSError:
+                import pandas as pd  # Only needed without the cache
+                self.temperature_data = pd.read_csv(csv_path).to_numpy()
+            log.info("CSV data loaded successfully.", path=csv_path)
         except Exception as e:
-            print(f"Error loading CSV data: {e}")
+            log.error(f"Error loading CSV data: {e}", path=csv_path)
+
+    def load_data_from_stream(self, stream):
+        """
+        Read the outdoor temperature from a live weather stream instead of
+        the CSV data. Pass None to go back to the CSV data.
+
+        stream: Running feed of recent readings (WeatherStream)
+        """
+        self._source = stream
+
+    def load_data_from_store(self, store, site):
+        """
+        Read the outdoor temperature of one site of a multi-site weather
+        store instead of the CSV data.
+
+        store: Store of site-year chunks (WeatherStore)
+        site: Name of the site (string)
+        """
+        self._source = store.site(site)
 
     @property
     def temperature_data(self):
         """
-        Getter for temperature data.
+        Getter for temperature data. Unless data was given to this model,
+        the shared dataset is returned.
         """
+        if self._temperature_data is None:
+            return self._dataset.get()
         return self._temperature_data
 
     @temperature_data.setter
@@ -66,6 +129,36 @@ class Model:
         Setter for temperature data.
         """
         self._temperature_data = value
+        self._temperature_index = None
+        self._minute_series = None
+
+    @property
+    def temperature_index(self):
+        """
+        Getter for the timestamp index of the temperature data. The index is
+        built once per data set and reused by every lookup.
+        """
+        data = self.temperature_data
+        if isinstance(data, WeatherData):
+            return data.index  # Shared along with the data itself
+        if self._temperature_index is None:
+            self._temperature_index = TemperatureIndex.from_rows(data)
+        return self._temperature_index
+
+    @property
+    def minute_series(self):
+        """
+        Getter for the minute-resolution outdoor temperatures, interpolated
+        once per data set with the `interpolation` method of the model.
+        """
+        data = self.temperature_data
+        if isinstance(data, WeatherData):
+            return data.minutes(self.interpolation)
+        series = self._minute_series
+        if series is None or series.method != self.interpolation:
+            series = MinuteSeries(self.temperature_index, self.interpolation)
+            self._minute_series = series
+        return series
 
 
 class ThermostatModel(Model):
@@ -74,22 +167,22 @@ class ThermostatModel(Model):
     the thermostat functionality. It includes methods for setting date and 
     time, adjusting temperature, and fetching outdoor temperature.
     """
-    def __init__(self, temperature_data):
+    def __init__(self, temperature_data=None):
         """
         Initialize the thermostat model, inheriting from the `Model` class.
         Additional attributes for user-selected date and hour are added here.
         """
-        super().__init__()  # Initialize the base class
+        super().__init__(temperature_data)  # Initialize the base class
         self.user_selected_date = "2024-01-01"  # Store user-select date
         self.user_selected_hour = "12:00"  # Store user-select hour
-        self.temperature_data = temperature_data
+        self.user_selected_minute = 0  # Store user-select minute
 
     def set_date_time(self, date_input, time_input):
         """
         Set the date and hour for thermostat operations.
         
         date_input: Date input as yyyy-mm-dd (string)
-        time_input: Time input h:dd (string)
+        time_input: Time input h:mm, h:mm:ss or h:mm am/pm (string)
         """
         try:
             # Remove spaces
@@ -99,8 +192,15 @@ class ThermostatModel(Model):
             # Extract year, month, and day from the date_input string
             year, month, day = map(int, date_input.split('-'))
             
-            # Extract hour from the time_input string
-            hour = int(time_input.split(":")[0])
+            # Extract hour and minute from the time_input string
+            clock, _, suffix = time_input.partition(" ")
+            fields = clock.split(":")
+            hour = int(fields[0])
+            minute = int(fields[1]) if len(fields) > 1 else 0
+            if suffix.strip().lower() == "pm" and hour < 12:
+                hour += 12
+            elif suffix.strip().lower() == "am" and hour == 12:
+                hour = 0
             
             # Update current_values
             self.current_values["date"] = f"{year}-{str(month\
@@ -111,15 +211,14 @@ class ThermostatModel(Model):
             self.user_selected_date = f"{year}-{str(month\
                                         ).zfill(2)}-{str(day).zfill(2)}"
             self.user_selected_hour = hour
+            self.user_selected_minute = minute
     
-            print(f"Date: {self.current_values['date'][1]}/{\
-                self.current_values['date'][2]}/{\
-                self.current_values['date'][0]}, ", 
-                f"Time: {self.current_values['time']}:00") 
+            log.info("Date and time set.", date=self.user_selected_date,
+                     hour=hour, minute=minute)
             return self.current_values["date"], self.current_values["time"]
     
         except Exception as e:
-            print(f"Error setting date and time: {e}")
+            log.error(f"Error setting date and time: {e}")
             return None, None
 
     def set_temperature_value(self, set_temperature):
@@ -136,30 +235,55 @@ class ThermostatModel(Model):
     def get_outdoor_temperature(self):
         """
         Retrieve the outdoor temperature from the loaded CSV data for the 
-        selected date and time.
+        selected date and time, interpolated to the selected minute. Returns
+        the temperature as a float, or None when it is not available.
         """
         if not self.user_selected_date or self.user_selected_hour is None:
-            return "Date and time not set. Please set them first."
+            log.warning("Date and time not set. Please set them first.")
+            return None
     
         date = self.user_selected_date  # "2024-01-01"
         hour = self.user_selected_hour  # 0, 1, ..., 23
-        formatted_date_time = f"{self.user_selected_date} {int(hour):d}:00"  
+        minute = self.user_selected_minute  # 0, 1, ..., 59
+        formatted_date_time = f"{date} {int(hour):d}:{int(minute):02d}"
         
         try:
-            # Ensure the formatted date & time string matches data
-            for row in self.temperature_data:
-                if row[0] == formatted_date_time:
-                    outdoor_temperature = row[1]  # second col in the row=temp
-                    print(f"Outdoor temp for {formatted_date_time}\
-                          is {outdoor_temperature}°C")
-                    self.current_values["outdoor_temp"] = outdoor_temperature
-                    return outdoor_temperature  
-    
-            return "No temperature data found for the specified date & time."
+            if self._source is not None:  # Stream or store lookup
+                outdoor_temperature = self._source.lookup(date, hour, minute)
+            elif minute:
+                outdoor_temperature = self.minute_series.lookup(date, hour,
+                                                                minute)
+            else:  # Whole hours come straight from the hourly readings
+                outdoor_temperature = self.temperature_index.lookup(date,
+                                                                    hour)
+            if outdoor_temperature is None:
+                log.warning("No temperature data found for the specified "
+                            "date & time.", date_time=formatted_date_time)
+                return None
+
+            log.info("Outdoor temperature found.",
+                     date_time=formatted_date_time, temp=outdoor_temperature)
+            self.current_values["outdoor_temp"] = outdoor_temperature
+            return outdoor_temperature
     
         except Exception as e:
-            print(f"Error: {e}")
-            return f"Error retrieving outdoor temperature: {e}"
+            log.error(f"Error retrieving outdoor temperature: {e}")
+            return None
+
+    def get_outdoor_temperatures(self, timestamps):
+        """
+        Retrieve the outdoor temperatures for a batch of timestamps in one
+        vectorized lookup. Timestamps without data come back as NaN.
+
+        timestamps: "yyyy-mm-dd h:mm" strings or datetime64 values (array)
+        """
+        timestamps = np.asarray(timestamps)
+        if np.issubdtype(timestamps.dtype, np.datetime64):
+            hours = timestamps.astype("datetime64[h]").astype(np.int64)
+        else:
+            hours = parse_hour_stamps(timestamps.ravel()).reshape(
+                timestamps.shape)
+        return self.temperature_index.lookup_many(hours)
 
     def set_mode(self):
         """
@@ -168,12 +292,8 @@ class ThermostatModel(Model):
         """
         outdoor_temperature = self.current_values["outdoor_temp"]
         set_temperature = self.current_values["Set_temp"]
-        if set_temperature < outdoor_temperature:
-            self.current_values["mode"] = "Cooling mode"
-        elif set_temperature > outdoor_temperature:
-            self.current_values["mode"] = "Heating mode"
-        else:
-            self.current_values["mode"] = "Normal mode"
+        mode = int(select_mode(set_temperature, outdoor_temperature))
+        self.current_values["mode"] = MODE_NAMES[mode]
         return self.current_values["mode"]
 
 
@@ -182,12 +302,11 @@ class FanModel(Model):
     This subclass of `Model` is responsible for managing the fan's operation,
     including speed adjustments.
     """
-    def __init__(self, temperature_data):
+    def __init__(self, temperature_data=None):
         """
         Initialize the fan model, inheriting from the `Model` class.
         """
-        super().__init__()
-        self.temperature_data = temperature_data
+        super().__init__(temperature_data)
 
     def set_fan_speed_value(self, mode):
         """
@@ -214,52 +333,98 @@ class FurnaceModel(Model):
     This subclass of `Model` is responsible for managing furnace operations,
     including calculating heat output.
     """
-    def __init__(self, temperature_data):
-        super().__init__()
+    def __init__(self, temperature_data=None):
+        super().__init__(temperature_data)
         self.stop_polling = False
         self.q_furnace = 500  # unit BTU
-        self.temperature_data = temperature_data
+        self.U = HEAT_LOSS_COEFFICIENT  # Heat loss coefficient
+        self.C = THERMAL_CAPACITY  # Thermal capacity
+        self.dt = TIME_STEP  # Time step in seconds
+        self.stage_thresholds = STAGE_THRESHOLDS  # °C of each stage
+        self.stage_capacities = STAGE_CAPACITIES  # BTU of each stage
+        self.speedup = 1.0  # Playback speed-up, None to run at max speed
+        self.clock = None  # Clock of the playback, from the speed-up if None
+        self.control = None  # Control strategy, the stages if None
+        self.stepped = Event("stepped")  # (current temperature, output)
+        self.finished = Event("finished")  # (setpoint reached)
 
     def calculate_q_furnace(self, temp_difference):
         """
-        Determine the Q_furnace value based on the temperature difference
-        using the pandas DataFrame.
+        Determine the Q_furnace value based on the temperature difference:
+        500 BTU above 10°C, 300 BTU above 5°C, 100 BTU above 0°C, else 0.
         
         temp_difference: Temperature difference betwn out and inside (float)
         """
-        if temp_difference > 10:
-            return 500  # Maximum heat output
-        elif 5 < temp_difference <= 10:
-            return 300  # Medium heat output
-        elif 0 < temp_difference <= 5:
-            return 100  # Low heat output
-        else:
-            return 0  # Minimal heat for fine adjustments
+        return int(stage_capacity(temp_difference, self.stage_thresholds,
+                                  self.stage_capacities))
+
+    def simulate_heating(self, outdoor_temp, set_temp):
+        """
+        Compute the whole heating run at once without waiting.
+
+        outdoor_temp: Current outdoor temperature (float)
+        set_temp: Temperature setpoint (Float)
+        """
+        started = perf_counter()
+        run = self.control.run if self.control is not None else simulate
+        trajectory = run(outdoor_temp, set_temp, HEATING, dt=self.dt,
+                         U=self.U, C=self.C,
+                         thresholds=self.stage_thresholds,
+                         capacities=self.stage_capacities)
+        SIMULATION_SECONDS["furnace"].observe(perf_counter() - started)
+        return trajectory
 
-    def heating(self, outdoor_temp, set_temp):
+    def heating(self, outdoor_temp, set_temp, cancel=None):
         """
         Simulate the heating process to maintain the desired temperature 
-        using temperature data.
+        using temperature data. The run is computed up front and played back
+        on the `clock` of the model, by default the one of its `speedup`,
+        emitting `stepped` at every step and `finished` at the end. Returns
+        False when cancelled before the end, in which case `finished` is not
+        emitted.
         
         outdoor_temp: Current outdoor temperature (float)
         set_temp: Temperature setpoint (Float)
+        cancel: Event that stops the run at the next step (threading.Event)
         """
-        current_temperature = outdoor_temp
-        iter = 0  # Initialize iteration counter
-        U = 10.0  # Heat loss coefficient (arbitrary units)
-        C = 500.0  # Thermal capacity (arbitrary units)
-        dt = 2.0  # Time step in seconds
-
-        while set_temp > current_temperature:
-            temp_difference = set_temp - current_temperature
-            self.q_furnace = self.calculate_q_furnace(temp_difference)
-            dT = (self.q_furnace - U * (set_temp - current_temperature)) / C
-            current_temperature += dT
-            iter += 1
-            self.current_values["current_temp"] = current_temperature
-            time.sleep(dt)
+        trajectory = self.simulate_heating(outdoor_temp, set_temp)
+        playback = Playback(trajectory, self.speedup, cancel, self.clock)
+        for elapsed, current_temperature, q_furnace in playback:
+            self.record_step(current_temperature, q_furnace)
         self.stop_polling = True
-        print("Desired temperature reached!")
+        if playback.cancelled:
+            return False
+        self.finish(trajectory.reached)
+        return True
+
+    def record_step(self, current_temperature, q_furnace):
+        """
+        Store the outcome of one heating step and emit `stepped`.
+
+        current_temperature: Indoor temperature after the step (float)
+        q_furnace: Output during the step (int)
+        """
+        started = perf_counter()
+        self.q_furnace = q_furnace
+        self.current_values["current_temp"] = current_temperature
+        self.stepped.emit(current_temperature, q_furnace)
+        STEP_SECONDS["furnace"].observe(perf_counter() - started)
+        STEPS["furnace"].inc()
+
+    def finish(self, reached):
+        """
+        End the heating process and emit `finished`.
+
+        reached: Whether the setpoint was reached (bool)
+        """
+        self.stop_polling = True
+        if reached:
+            log.info("Desired temperature reached!",
+                     temp=self.current_values["current_temp"])
+        else:
+            log.warning("Desired temperature cannot be reached.",
+                        temp=self.current_values["current_temp"])
+        self.finished.emit(reached)
 
     def read_current_temp(self):
         """
@@ -279,52 +444,98 @@ class AirConditionerModel(Model):
     This subclass of `Model` manages air conditioner operations,
     including simulating the cooling process and adjusting the temperature.
     """
-    def __init__(self, temperature_data):
-        super().__init__()
+    def __init__(self, temperature_data=None):
+        super().__init__(temperature_data)
         self.stop_polling = False
         self.q_aircon = 500  # BTU
-        self.temperature_data = temperature_data
+        self.U = HEAT_LOSS_COEFFICIENT  # Heat loss coefficient
+        self.C = THERMAL_CAPACITY  # Thermal capacity
+        self.dt = TIME_STEP  # Time step in seconds
+        self.stage_thresholds = STAGE_THRESHOLDS  # °C of each stage
+        self.stage_capacities = STAGE_CAPACITIES  # BTU of each stage
+        self.speedup = 1.0  # Playback speed-up, None to run at max speed
+        self.clock = None  # Clock of the playback, from the speed-up if None
+        self.control = None  # Control strategy, the stages if None
+        self.stepped = Event("stepped")  # (current temperature, output)
+        self.finished = Event("finished")  # (setpoint reached)
 
     def calculate_q_aircon(self, temp_difference):
         """
-        Determine the Q_aircon value based on the temperature difference 
-        using the pandas DataFrame.
+        Determine the Q_aircon value based on the temperature difference:
+        500 BTU above 10°C, 300 BTU above 5°C, 100 BTU above 0°C, else 0.
         
         temp_difference: Difference between outdoor and indoor temp (float)
         """
-        if temp_difference > 10:
-            return 500
-        elif 5 < temp_difference <= 10:
-            return 300
-        elif 0 < temp_difference <= 5:
-            return 100
-        else:
-            return 0
+        return int(stage_capacity(temp_difference, self.stage_thresholds,
+                                  self.stage_capacities))
 
-    def cooling(self, outdoor_temp, set_temp):
+    def simulate_cooling(self, outdoor_temp, set_temp):
+        """
+        Compute the whole cooling run at once without waiting.
+
+        outdoor_temp: Current outdoor temperature (float)
+        set_temp: Temperature setpoint (Float)
+        """
+        started = perf_counter()
+        run = self.control.run if self.control is not None else simulate
+        trajectory = run(outdoor_temp, set_temp, COOLING, dt=self.dt,
+                         U=self.U, C=self.C,
+                         thresholds=self.stage_thresholds,
+                         capacities=self.stage_capacities)
+        SIMULATION_SECONDS["aircon"].observe(perf_counter() - started)
+        return trajectory
+
+    def cooling(self, outdoor_temp, set_temp, cancel=None):
         """
         Simulate the Cooling process to maintain the desired temperature 
-        using temperature data.
+        using temperature data. The run is computed up front and played back
+        on the `clock` of the model, by default the one of its `speedup`,
+        emitting `stepped` at every step and `finished` at the end. Returns
+        False when cancelled before the end, in which case `finished` is not
+        emitted.
         
         outdoor_temp: Current outdoor temperature (float)
         set_temp: Temperature setpoint (Float)
+        cancel: Event that stops the run at the next step (threading.Event)
         """
-        current_temperature = outdoor_temp
-        iter = 0  # Initialize iteration counter
-        U = 10.0  # Heat loss coefficient (arbitrary units)
-        C = 500.0  # Thermal capacity (arbitrary units)
-        dt = 2.0  # Time step in seconds
-
-        while set_temp < current_temperature:
-            temp_difference = current_temperature - set_temp
-            self.q_aircon = self.calculate_q_aircon(temp_difference)
-            dT = ((self.q_aircon) - (U * (temp_difference))) / C
-            current_temperature -= dT
-            iter += 1
-            self.current_values["current_temp"] = current_temperature
-            time.sleep(dt)
+        trajectory = self.simulate_cooling(outdoor_temp, set_temp)
+        playback = Playback(trajectory, self.speedup, cancel, self.clock)
+        for elapsed, current_temperature, q_aircon in playback:
+            self.record_step(current_temperature, q_aircon)
         self.stop_polling = True
-        print("Desired temperature reached!")
+        if playback.cancelled:
+            return False
+        self.finish(trajectory.reached)
+        return True
+
+    def record_step(self, current_temperature, q_aircon):
+        """
+        Store the outcome of one cooling step and emit `stepped`.
+
+        current_temperature: Indoor temperature after the step (float)
+        q_aircon: Output during the step (int)
+        """
+        started = perf_counter()
+        self.q_aircon = q_aircon
+        self.current_values["current_temp"] = current_temperature
+        self.stepped.emit(current_temperature, q_aircon)
+        STEP_SECONDS["aircon"].observe(perf_counter() - started)
+        STEPS["aircon"].inc()
+
+    def finish(self, reached):
+        """
+        End the cooling process and emit `finished`.
+
+        reached: Whether the setpoint was reached (bool)
+        """
+        self.stop_polling = True
+        if reached:
+            log.info("Desired temperature reached!",
+                     temp=self.current_values["current_temp"])
+        else:
+            log.warning("Desired temperature cannot be reached.",
+                        temp=self.current_values["current_temp"])
+        self.finished.emit(reached)
 
     def read_current_temp(self):
         """
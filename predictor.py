@@ -0,0 +1,146 @@
+"""***************************************************************************
+Title:          Predictor
+File:           predictor.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the closed-form predictor of heating and
+                cooling runs of the Autonomous_HVAC_System. Within a stage
+                the output Q is fixed and the step of `simulate`,
+                d[n+1] = d[n] - (Q - U d[n]) / C for the difference d to the
+                setpoint, solves to
+
+                    d[n] = Q/U + (d[0] - Q/U) (1 + U/C)^n
+
+                so the steps, the time and the output (BTU) of a run follow
+                from one logarithm per stage instead of stepping it. Whole
+                arrays of runs are predicted at once.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import numpy as np
+from simulation import HEAT_LOSS_COEFFICIENT, THERMAL_CAPACITY, TIME_STEP
+from simulation import STAGE_THRESHOLDS, STAGE_CAPACITIES, MAX_STEPS
+from simulation import HEATING, IDLE, select_mode
+
+
+"""*********************Functions******************************************"""
+def predict(start_temps, set_temps, outdoor_temps=None,
+            U=HEAT_LOSS_COEFFICIENT, C=THERMAL_CAPACITY, dt=TIME_STEP,
+            thresholds=STAGE_THRESHOLDS, capacities=STAGE_CAPACITIES,
+            max_steps=MAX_STEPS):
+    """
+    Predict heating/cooling runs without stepping them: the same steps,
+    output and final temperature as `simulation.simulate_batch`, in
+    O(number of stages) array operations. Arguments broadcast together.
+
+    start_temps: Indoor temperature at the start of each run (array)
+    set_temps: Setpoint of each run (array)
+    outdoor_temps: Outdoor temperature picking the mode like
+                   `ThermostatModel.set_mode`, the start temperature by
+                   default (array)
+    U: Heat loss coefficient (float or array)
+    C: Thermal capacity (float or array)
+    dt: Time step in seconds (float)
+    thresholds: Lower temperature difference bound of each stage (tuple)
+    capacities: Output of each stage (tuple)
+    max_steps: Maximum number of steps of a run (int)
+    """
+    if outdoor_temps is None:
+        outdoor_temps = start_temps
+    start, set_temp, outdoor, U, C = np.broadcast_arrays(
+        *(np.asarray(value, dtype=np.float64)
+          for value in (start_temps, set_temps, outdoor_temps, U, C)))
+    directions = select_mode(set_temp, outdoor)
+    difference = np.where(directions == HEATING, set_temp - start,
+                          start - set_temp)
+    growth = np.log1p(U / C)  # Growth of d - Q/U per step, log(1 + U/C)
+
+    steps = np.zeros(start.shape, dtype=np.int64)
+    energy = np.zeros(start.shape)
+    stalled = np.zeros(start.shape, dtype=bool)
+    schedule = np.zeros(start.shape + (len(capacities),), dtype=np.int64)
+    running = (directions != IDLE) & (difference > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for stage, (limit, capacity) in enumerate(zip(thresholds,
+                                                      capacities)):
+            # The stage runs while the difference is above its threshold
+            # and max_steps is not used up by the stages before
+            staged = running & (difference > limit) & (steps < max_steps)
+            target = capacity / U  # Difference the stage settles towards
+            stuck = staged & (difference >= target)
+            stalled |= stuck
+            running &= ~stuck
+            staged &= ~stuck
+
+            # First n with d[n] <= limit, corrected for rounding
+            n = np.ceil(np.log((target - limit) / (target - difference))
+                        / growth)
+            n = np.where(staged, np.maximum(n, 1), 0)
+            earlier = settle(difference, target, growth, n - 1) <= limit
+            n = np.where(staged & (n > 1) & earlier, n - 1, n)
+            later = settle(difference, target, growth, n) > limit
+            n = np.where(staged & later, n + 1, n)
+            n = np.minimum(n, max_steps - steps).astype(np.int64)
+
+            difference = np.where(
+                staged, settle(difference, target, growth, n), difference)
+            schedule[..., stage] = n
+            steps += n
+            energy += n * capacity
+
+    # Runs still going after max_steps stop there, like the stepped ones;
+    # the others are below the last threshold, with no output to finish
+    going = running & (difference > 0)
+    capped = going & (steps >= max_steps)
+    stalled |= going & ~capped
+    reached = ~stalled & ~capped & (directions != IDLE)
+    final = np.where(directions == HEATING, set_temp - difference,
+                     set_temp + difference)
+    return Prediction(steps, energy, reached, schedule, final, dt)
+
+
+def settle(difference, target, growth, steps):
+    """
+    Return the difference to the setpoint after a number of steps of one
+    stage: target + (difference - target) (1 + U/C)^steps.
+
+    difference: Difference at the start of the stage (array)
+    target: Difference the stage settles towards, Q/U (array)
+    growth: log(1 + U/C) (array)
+    steps: Steps taken in the stage (array)
+    """
+    return target + (difference - target) * np.exp(growth * steps)
+
+
+"""*********************Classes********************************************"""
+class Prediction:
+    """
+    Outcome of `predict`, one entry per run: steps, output (BTU), whether
+    the setpoint is reached, the final temperature and `schedule`, the
+    steps spent in each stage (one column per stage, in the order of the
+    capacities). Runs stalled by losses above the output, or longer than
+    max_steps, are not reached.
+    """
+    def __init__(self, steps, energy, reached, schedule, final_temps,
+                 dt=TIME_STEP):
+        self.steps = steps
+        self.energy = energy
+        self.reached = reached
+        self.schedule = schedule
+        self.final_temps = final_temps
+        self.dt = dt
+
+    @property
+    def seconds(self):
+        """
+        Simulated time to the setpoint in seconds.
+        """
+        return self.steps * self.dt
+
+    @property
+    def stage_starts(self):
+        """
+        Seconds from the start of the run at which each stage begins.
+        """
+        return (np.cumsum(self.schedule, axis=-1) - self.schedule) * self.dt
@@ -0,0 +1,342 @@
+"""***************************************************************************
+Title:          Replay
+File:           replay.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the session recording and deterministic
+                replay of the Autonomous_HVAC_System. The inputs driving
+                the controller (start, setpoint, date/time, stop and the
+                outdoor temperatures looked up) are appended to a compact
+                binary log, each with the state version it was applied at:
+
+                    python main.py --record session.rec
+                    python -m hvac replay session.rec --multiplier 10
+
+                Replaying applies every input at the same state version on
+                a fresh controller, so the state trajectory comes out
+                identical to the recorded one, as fast as the CPU allows or
+                at a fixed multiple of the recorded speed.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import math
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+from controller import ThermostatController
+from clock import DiscreteClock, ScaledClock
+from logger import get_logger
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+MAGIC = b"HVACREC1"
+HEADER = struct.Struct("<8sd")  # Magic, recorded speed-up (NaN for max)
+RECORD = struct.Struct("<dIB")  # Seconds since start, version, kind
+NUMBER = struct.Struct("<d")
+LENGTH = struct.Struct("<B")
+
+# Input kinds in the order of their codes
+KINDS = ("start", "setpoint", "datetime", "stop", "weather")
+CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# One input of a session: seconds since the first input, state version
+# since the first input, kind and value
+Entry = namedtuple("Entry", "offset version kind value")
+
+
+"""*********************Functions******************************************"""
+def encode(kind, value):
+    """
+    Return the payload of an input in the log.
+
+    kind: Input kind, one of KINDS (string)
+    value: Value of the input
+    """
+    if kind == "start":
+        set_point, date_input, time_input = value
+        return NUMBER.pack(float(set_point)) + \
+            encode_text(date_input) + encode_text(time_input)
+    if kind == "setpoint":
+        return NUMBER.pack(float(value))
+    if kind == "datetime":
+        return encode_text(value[0]) + encode_text(value[1])
+    if kind == "weather":
+        return NUMBER.pack(math.nan if value is None else float(value))
+    return b""
+
+
+def encode_text(text):
+    """
+    Return a short string prefixed with its length.
+
+    text: Date or time, at most 255 bytes (string)
+    """
+    data = str(text).encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+
+def decode(kind, data, offset):
+    """
+    Return the value of an input and the offset after its payload.
+
+    kind: Input kind, one of KINDS (string)
+    data: Contents of the log (bytes)
+    offset: Start of the payload (int)
+    """
+    number = None
+    if kind in ("start", "setpoint", "weather"):
+        (number,) = NUMBER.unpack_from(data, offset)
+        offset += NUMBER.size
+        if kind == "setpoint":
+            return number, offset
+        if kind == "weather":
+            return (None if math.isnan(number) else number), offset
+    texts = []
+    for _ in range(2 if kind in ("start", "datetime") else 0):
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        if offset + length > len(data):
+            raise struct.error("Truncated text")
+        texts.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    if kind == "start":
+        return (number, texts[0], texts[1]), offset
+    if kind == "datetime":
+        return tuple(texts), offset
+    return None, offset
+
+
+def apply_input(controller, kind, value):
+    """
+    Apply a recorded input to a controller the way the control worker did.
+    Returns whether heating or cooling runs afterwards.
+
+    controller: Controller being replayed (ThermostatController)
+    kind: Input kind other than "weather" (string)
+    value: Value of the input
+    """
+    if kind != "start":
+        return controller.apply_command(kind, value)
+    # As start_operation_heating_cooling, the setpoint follows as a command
+    controller.input_applied.emit(kind, value)
+    try:
+        controller.initialize(*value)
+    except Exception as e:
+        log.error(f"Error replaying the start: {e}")
+    return False
+
+
+def replay(path, multiplier=None, controller=None):
+    """
+    Replay a recorded session on a controller, on this thread. Every input
+    is applied at the state version it was recorded at, so the published
+    states are identical to the recorded ones. Returns the controller.
+
+    path: Session log written by SessionRecorder (string)
+    multiplier: Times the recorded speed, None to replay at max (float)
+    controller: Controller to replay on, a new one by default
+    """
+    session = SessionLog(path)
+    if controller is None:
+        controller = ThermostatController()
+    if multiplier is None or session.speedup is None:
+        controller.speedup = None
+    else:
+        controller.speedup = session.speedup * multiplier
+    controller.weather = RecordedWeather(session.weather)
+
+    pending = deque(session.inputs)
+    base = controller.snapshot.version
+    cancel = threading.Event()
+
+    def reached(state):
+        # Stop the run once the next input is due, as the worker did
+        if pending and state.snapshot.version - base >= pending[0].version:
+            cancel.set()
+
+    controller.state_changed.subscribe(reached)
+    # Clock of the recorded pauses between inputs, in recorded seconds
+    clock = DiscreteClock() if multiplier is None else ScaledClock(multiplier)
+    run = False
+    try:
+        while pending:
+            entry = pending[0]
+            if controller.snapshot.version - base < entry.version:
+                if not run:
+                    raise ValueError(f"Replay diverged from {path} at "
+                                     f"version {entry.version}.")
+                cancel.clear()
+                run = False
+                controller.control_temperature(cancel)
+                continue
+            pending.popleft()
+            clock.wait_until(entry.offset)
+            run = apply_input(controller, entry.kind, entry.value)
+        if run:
+            cancel.clear()
+            controller.control_temperature(cancel)
+    finally:
+        controller.state_changed.unsubscribe(reached)
+    return controller
+
+
+def add_arguments(parser):
+    """
+    Add the --record option to a parser.
+
+    parser: Command line parser (argparse.ArgumentParser)
+    """
+    parser.add_argument("--record", default=None,
+                        help="Record the inputs of the session to this file")
+
+
+def start_from_args(argv, controller):
+    """
+    Record the inputs of a controller to the file given by --record on a
+    command line, ignoring every other argument. Returns the recorder, or
+    None without the option.
+
+    argv: Command line arguments (list of string)
+    controller: Controller to record (ThermostatController)
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    add_arguments(parser)
+    args, _ = parser.parse_known_args(argv)
+    if args.record is None:
+        return None
+    recorder = SessionRecorder(args.record, controller.speedup)
+    recorder.attach(controller)
+    return recorder
+
+
+"""*********************Classes********************************************"""
+class SessionRecorder:
+    """
+    Appends the inputs of a controller to a session log. Inputs are rare,
+    so every one is written through at once and a crash loses none.
+    """
+    def __init__(self, path, speedup=1.0):
+        """
+        Create the log, replacing an existing file.
+
+        path: File of the session log (string)
+        speedup: Playback speed-up of the session, None for max (float)
+        """
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(
+            MAGIC, math.nan if speedup is None else float(speedup)))
+        self._file.flush()
+        self._lock = threading.Lock()
+        self._controller = None
+        self._started = None  # Clock and version of the first input
+        self._base = 0
+
+    def attach(self, controller):
+        """
+        Record every input of a controller from now on.
+
+        controller: Controller to record (ThermostatController)
+        """
+        self._controller = controller
+        controller.input_applied.subscribe(self.record)
+
+    def record(self, kind, value):
+        """
+        Append an input of the attached controller at its current version.
+
+        kind: Input kind, one of KINDS (string)
+        value: Value of the input
+        """
+        if kind not in CODES:
+            return  # Unknown commands change nothing
+        version = self._controller.snapshot.version
+        with self._lock:
+            if self._file is None:
+                return
+            now = time.monotonic()
+            if self._started is None:
+                self._started, self._base = now, version
+            self._file.write(RECORD.pack(now - self._started,
+                                         version - self._base, CODES[kind])
+                             + encode(kind, value))
+            self._file.flush()
+
+    def close(self):
+        """
+        Stop recording and close the log.
+        """
+        if self._controller is not None:
+            self._controller.input_applied.unsubscribe(self.record)
+            self._controller = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SessionLog:
+    """
+    Inputs of a recorded session, read from a session log. A record cut
+    off by a crash at the end of the file is left out.
+    """
+    def __init__(self, path):
+        """
+        Read a session log.
+
+        path: File written by SessionRecorder (string)
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a session log.")
+        _, speedup = HEADER.unpack_from(data)
+        self.speedup = None if math.isnan(speedup) else speedup
+        self.inputs = []  # Every input but the weather, in order
+        self.weather = []  # Outdoor temperatures in lookup order
+
+        offset = HEADER.size
+        while offset < len(data):
+            try:
+                elapsed, version, code = RECORD.unpack_from(data, offset)
+                value, end = decode(KINDS[code], data, offset + RECORD.size)
+            except (struct.error, IndexError):
+                log.warning("Session log ends in a partial record.",
+                            path=path, offset=offset)
+                break
+            offset = end
+            if KINDS[code] == "weather":
+                self.weather.append(value)
+            else:
+                self.inputs.append(Entry(elapsed, version, KINDS[code],
+                                         value))
+
+    def __len__(self):
+        return len(self.inputs)
+
+
+class RecordedWeather:
+    """
+    Weather feed returning the recorded outdoor temperatures in the order
+    they were looked up, whatever the date and time asked for.
+    """
+    def __init__(self, temperatures):
+        """
+        temperatures: Outdoor temperatures in lookup order (list of float)
+        """
+        self._temperatures = deque(temperatures)
+
+    def lookup(self, date, hour, minute=0):
+        """
+        Return the next recorded temperature, or None when there is none.
+
+        date: Date as yyyy-mm-dd (string)
+        hour: Hour of the day (int)
+        minute: Minute of the hour (int)
+        """
+        if not self._temperatures:
+            return None
+        return self._temperatures.popleft()
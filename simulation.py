@@ -0,0 +1,412 @@
+"""***************************************************************************
+Title:          Simulation
+File:           simulation.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the thermal simulation engine of the
+                Autonomous_HVAC_System. It computes whole heating and cooling
+                runs with NumPy, replays them at a chosen speed and runs
+                headless simulations over the whole weather file.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import time
+import numpy as np
+from weather import shared_dataset
+from clock import clock_for
+
+
+"""*********************Global*********************************************"""
+HEAT_LOSS_COEFFICIENT = 10.0  # U, heat loss coefficient (arbitrary units)
+THERMAL_CAPACITY = 500.0  # C, thermal capacity (arbitrary units)
+TIME_STEP = 2.0  # Simulation time step in seconds
+STAGE_THRESHOLDS = (10, 5, 0)  # Temperature difference of each stage (°C)
+STAGE_CAPACITIES = (500, 300, 100)  # Output of each stage (BTU)
+MAX_STEPS = 100000  # Safety limit on the length of a single run
+
+HEATING = 1  # Direction of a heating run
+COOLING = -1  # Direction of a cooling run
+IDLE = 0  # No heating or cooling
+MODE_NAMES = {HEATING: "Heating mode", COOLING: "Cooling mode",
+              IDLE: "Normal mode"}
+
+SPEEDUPS = {"1x": 1.0, "60x": 60.0, "max": None}  # Playback presets
+
+
+"""*********************Functions******************************************"""
+def stage_capacity(temp_difference, thresholds=STAGE_THRESHOLDS,
+                   capacities=STAGE_CAPACITIES):
+    """
+    Vectorized form of `calculate_q_furnace`/`calculate_q_aircon`: return
+    the staged output for every temperature difference.
+
+    temp_difference: Difference between setpoint and indoor temp (array)
+    thresholds: Lower temperature difference bound of each stage (tuple)
+    capacities: Output of each stage (tuple)
+    """
+    temp_difference = np.asarray(temp_difference)
+    return np.select([temp_difference > limit for limit in thresholds],
+                     capacities, 0)
+
+
+def select_mode(set_temps, outdoor_temps):
+    """
+    Vectorized form of `ThermostatModel.set_mode`: HEATING where the
+    setpoint is above the outdoor temperature, COOLING where it is below
+    and IDLE where they are equal or the temperature is unknown.
+
+    set_temps: Temperature setpoints (array)
+    outdoor_temps: Outdoor temperatures (array)
+    """
+    difference = np.asarray(set_temps, dtype=np.float64) - \
+        np.asarray(outdoor_temps, dtype=np.float64)
+    # Hours with a missing outdoor temperature (NaN) stay idle
+    return np.sign(np.nan_to_num(difference)).astype(np.int8)
+
+
+def simulate_batch(start_temps, set_temps, directions=None,
+                   U=HEAT_LOSS_COEFFICIENT, C=THERMAL_CAPACITY,
+                   thresholds=STAGE_THRESHOLDS, capacities=STAGE_CAPACITIES,
+                   max_steps=MAX_STEPS, record=False):
+    """
+    Simulate many heating/cooling runs at once. Every run follows the same
+    explicit Euler step as `FurnaceModel.heating`/`AirConditionerModel.
+    cooling`, so the results are identical to the interactive path; runs
+    that finish drop out of the arrays stepped on the next iteration.
+
+    start_temps: Indoor temperature at the start of each run (array)
+    set_temps: Setpoint of each run (array)
+    directions: HEATING/COOLING of each run, from the setpoint by default
+    U: Heat loss coefficient (float)
+    C: Thermal capacity (float)
+    thresholds: Lower temperature difference bound of each stage (tuple)
+    capacities: Output of each stage (tuple)
+    max_steps: Maximum number of steps of a run (int)
+    record: Keep the temperature and capacity of every step (bool)
+    """
+    start_temps, set_temps = np.broadcast_arrays(
+        np.asarray(start_temps, dtype=np.float64),
+        np.asarray(set_temps, dtype=np.float64))
+    start_temps = start_temps.ravel()
+    set_temps = set_temps.ravel()
+    if directions is None:
+        directions = select_mode(set_temps, start_temps)
+    directions = np.broadcast_to(np.asarray(directions, dtype=np.int8),
+                                 start_temps.shape)
+
+    heating = directions == HEATING
+    current = start_temps.copy()
+    steps = np.zeros(current.shape, dtype=np.int64)
+    energy = np.zeros(current.shape, dtype=np.float64)
+    stalled = np.zeros(current.shape, dtype=bool)
+    difference = np.where(heating, set_temps - current, current - set_temps)
+    active = np.flatnonzero((directions != IDLE) & (difference > 0))
+    temperature_steps = [current.copy()] if record else None
+    capacity_steps = [] if record else None
+
+    for _ in range(max_steps):
+        if not active.size:
+            break
+        temps = current[active]
+        heats = heating[active]
+        difference = np.where(heats, set_temps[active] - temps,
+                              temps - set_temps[active])
+        q = stage_capacity(difference, thresholds, capacities)
+        dT = (q - U * difference) / C
+
+        # Runs whose losses outweigh the output would never finish
+        stuck = dT <= 0
+        if stuck.any():
+            stalled[active[stuck]] = True
+            moving = ~stuck
+            active, temps, heats = active[moving], temps[moving], heats[moving]
+            q, dT = q[moving], dT[moving]
+
+        temps = np.where(heats, temps + dT, temps - dT)
+        current[active] = temps
+        steps[active] += 1
+        energy[active] += q
+        if record:
+            step_q = np.zeros(current.shape, dtype=q.dtype)
+            step_q[active] = q
+            temperature_steps.append(current.copy())
+            capacity_steps.append(step_q)
+
+        remaining = np.where(heats, set_temps[active] > temps,
+                             temps > set_temps[active])
+        active = active[remaining]
+
+    reached = ~stalled
+    reached[active] = False  # Still running when max_steps ran out
+    result = BatchResult(current, steps, energy, reached)
+    if record:
+        result.temperatures = np.array(temperature_steps)
+        result.capacities = np.array(capacity_steps).reshape(
+            len(capacity_steps), current.size)
+    return result
+
+
+def simulate(start_temp, set_temp, direction=None, dt=TIME_STEP,
+             **parameters):
+    """
+    Simulate a single heating or cooling run and return its trajectory.
+
+    start_temp: Indoor temperature at the start of the run (float)
+    set_temp: Temperature setpoint (float)
+    direction: HEATING or COOLING, from the setpoint by default
+    dt: Time step in seconds (float)
+    parameters: U, C, thresholds, capacities or max_steps overrides
+    """
+    batch = simulate_batch([start_temp], [set_temp], direction,
+                           record=True, **parameters)
+    steps = int(batch.steps[0])
+    return Trajectory(batch.temperatures[:steps + 1, 0],
+                      batch.capacities[:steps, 0],
+                      bool(batch.reached[0]), dt)
+
+
+def simulate_year(set_temp, weather=None, year=None, control=None,
+                  **parameters):
+    """
+    Run the interactive control path for every hour of the weather data in
+    one vectorized pass. Each hour starts with the indoor temperature at the
+    outdoor temperature, picks its mode like `ThermostatModel.set_mode` and
+    heats or cools to the setpoint like the furnace/air conditioner models.
+
+    set_temp: Temperature setpoint (float)
+    weather: Hourly weather data, the shared dataset by default (WeatherData)
+    year: Only simulate the hours of this year (int)
+    control: Control strategy of the runs, staged by default (control.py)
+    parameters: U, C, thresholds, capacities or max_steps overrides
+    """
+    weather = weather if weather is not None else shared_dataset().get()
+    hours = np.asarray(weather.hours, dtype=np.int64)
+    outdoor = np.asarray(weather.temperature, dtype=np.float64)
+    if year is not None:
+        years = hours.astype("datetime64[h]").astype("datetime64[Y]")
+        keep = years == np.datetime64(str(year), "Y")
+        hours, outdoor = hours[keep], outdoor[keep]
+
+    modes = select_mode(set_temp, outdoor)
+    thresholds = parameters.get("thresholds", STAGE_THRESHOLDS)
+    capacities = parameters.get("capacities", STAGE_CAPACITIES)
+    stages = stage_capacity(np.abs(set_temp - outdoor), thresholds,
+                            capacities)
+
+    # Hours with the same outdoor temperature follow the same run, so each
+    # distinct temperature is only simulated once
+    distinct, inverse = np.unique(outdoor, return_inverse=True)
+    run_batch = control.run_batch if control is not None else simulate_batch
+    runs = run_batch(distinct, set_temp, record=False, **parameters)
+    return AnnualResult(hours, outdoor, modes, stages,
+                        runs.energy[inverse], runs.steps[inverse],
+                        runs.reached[inverse])
+
+
+"""*********************Classes********************************************"""
+class BatchResult:
+    """
+    Outcome of `simulate_batch`: final temperature, number of steps, total
+    output (BTU) and whether the setpoint was reached, one entry per run.
+    With recording on, `temperatures` and `capacities` hold every step
+    (one row per step, one column per run).
+    """
+    def __init__(self, final_temps, steps, energy, reached):
+        self.final_temps = final_temps
+        self.steps = steps
+        self.energy = energy
+        self.reached = reached
+        self.temperatures = None
+        self.capacities = None
+
+
+class Trajectory:
+    """
+    Temperature and capacity at every step of one heating or cooling run.
+    `temperatures` has one more entry than `capacities`: it starts with the
+    temperature before the first step.
+    """
+    def __init__(self, temperatures, capacities, reached, dt=TIME_STEP):
+        self.temperatures = temperatures
+        self.capacities = capacities
+        self.reached = reached
+        self.dt = dt
+
+    def __len__(self):
+        return len(self.capacities)
+
+    @property
+    def duration(self):
+        """
+        Simulated length of the run in seconds.
+        """
+        return len(self) * self.dt
+
+    @property
+    def energy(self):
+        """
+        Total output over the run in BTU.
+        """
+        return float(self.capacities.sum())
+
+
+class Playback:
+    """
+    Replays a trajectory step by step, one simulation time step (2 s) of
+    its clock apart. By default the clock follows the speed-up: with 1 the
+    steps come in real time, with 60 sixty times faster and with None
+    ("max") as fast as the consumer takes them. Iterate it with `for` on a
+    thread, or with `async for` in an asyncio task.
+    """
+    def __init__(self, trajectory, speedup=1.0, cancel=None, clock=None):
+        """
+        Prepare the playback of a trajectory.
+
+        trajectory: Run to replay (Trajectory)
+        speedup: Speed-up factor, a SPEEDUPS key or None for max (float)
+        cancel: Event that ends the playback early when set (threading.Event)
+        clock: Clock to wait on instead of the one of the speed-up (Clock)
+        """
+        self.trajectory = trajectory
+        self.speedup = SPEEDUPS[speedup] if isinstance(speedup, str) \
+            else speedup
+        self.cancel = cancel
+        self.cancelled = False
+        self.clock = clock if clock is not None else clock_for(self.speedup)
+
+    def __iter__(self):
+        """
+        Yield (elapsed simulated seconds, temperature, capacity) per step,
+        waiting one time step of the clock after each of them. Stops before
+        the next step once `cancel` is set, without waiting out the step.
+        """
+        trajectory = self.trajectory
+        temperatures = trajectory.temperatures.tolist()
+        capacities = trajectory.capacities.tolist()
+        dt = trajectory.dt
+        cancel = self.cancel
+        clock = self.clock
+        started = clock.now()
+
+        for step, capacity in enumerate(capacities, start=1):
+            if cancel is not None and cancel.is_set():
+                self.cancelled = True
+                return
+            yield step * dt, temperatures[step], capacity
+            # Wait against the start time so delays do not add up
+            if clock.wait_until(started + step * dt, cancel):
+                self.cancelled = True
+                return
+
+    async def __aiter__(self):
+        """
+        Asynchronous form of the iteration for asyncio tasks: the same
+        steps, waiting on the clock without blocking the event loop.
+        Cancelling the task stops the playback at its current wait.
+        """
+        trajectory = self.trajectory
+        temperatures = trajectory.temperatures.tolist()
+        capacities = trajectory.capacities.tolist()
+        dt = trajectory.dt
+        cancel = self.cancel
+        clock = self.clock
+        started = clock.now()
+
+        for step, capacity in enumerate(capacities, start=1):
+            if cancel is not None and cancel.is_set():
+                self.cancelled = True
+                return
+            yield step * dt, temperatures[step], capacity
+            await clock.wait_until_async(started + step * dt)
+
+
+class AnnualResult:
+    """
+    Per-hour outcome of `simulate_year`: mode (HEATING/COOLING/IDLE), first
+    capacity stage (BTU), output (BTU), steps, whether the setpoint was
+    reached and the cumulative output (BTU) up to each hour.
+    """
+    def __init__(self, hours, outdoor, modes, stages, energy, steps,
+                 reached):
+        self.hours = hours
+        self.outdoor = outdoor
+        self.modes = modes
+        self.stages = stages
+        self.energy = energy
+        self.steps = steps
+        self.reached = reached
+        self.cumulative_energy = np.cumsum(energy)
+
+    def __len__(self):
+        return len(self.hours)
+
+    @property
+    def total_energy(self):
+        """
+        Total output over all hours in BTU.
+        """
+        return float(self.cumulative_energy[-1]) if len(self) else 0.0
+
+    def daily(self):
+        """
+        Roll the hourly results up per day.
+        """
+        return self._rollup(self.hours.astype("datetime64[h]").astype(
+            "datetime64[D]"))
+
+    def monthly(self):
+        """
+        Roll the hourly results up per month.
+        """
+        return self._rollup(self.hours.astype("datetime64[h]").astype(
+            "datetime64[M]"))
+
+    def _rollup(self, periods):
+        """
+        Sum the output and count the heating/cooling hours per period.
+        """
+        labels, group = np.unique(periods, return_inverse=True)
+        count = len(labels)
+        return Rollup(
+            labels,
+            np.bincount(group, weights=self.energy, minlength=count),
+            np.bincount(group, weights=self.modes == HEATING,
+                        minlength=count).astype(np.int64),
+            np.bincount(group, weights=self.modes == COOLING,
+                        minlength=count).astype(np.int64))
+
+
+class Rollup:
+    """
+    Daily or monthly totals of an annual simulation: output (BTU) and the
+    number of heating and cooling hours of each period.
+    """
+    def __init__(self, periods, energy, heating_hours, cooling_hours):
+        self.periods = periods
+        self.energy = energy
+        self.heating_hours = heating_hours
+        self.cooling_hours = cooling_hours
+
+
+"""*********************Main Routine***************************************"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Headless annual simulation over the weather file.")
+    parser.add_argument("setpoints", type=float, nargs="+",
+                        help="Temperature setpoints to compare (°C)")
+    parser.add_argument("--year", type=int, default=None)
+    args = parser.parse_args()
+
+    for set_temp in args.setpoints:
+        started = time.perf_counter()
+        result = simulate_year(set_temp, year=args.year)
+        elapsed = time.perf_counter() - started
+        print(f"Setpoint {set_temp}°C: {result.total_energy:,.0f} BTU over "
+              f"{len(result)} hours ({elapsed * 1000:.1f} ms)")
+        monthly = result.monthly()
+        for period, energy, heating, cooling in zip(
+                monthly.periods, monthly.energy, monthly.heating_hours,
+                monthly.cooling_hours):
+            print(f"  {period}: {energy:>12,.0f} BTU  heating {heating:>4} h"
+                  f"  cooling {cooling:>4} h")
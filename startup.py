@@ -0,0 +1,137 @@
+"""***************************************************************************
+Title:          Startup Profiler
+File:           startup.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file measures the cold start of the Autonomous_HVAC_System:
+                the time of every startup phase (imports, window
+                construction, first paint, CSV load) and of every module
+                imported while profiling. Run `python main.py
+                --profile-startup`, or the built executable with the same flag.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import builtins
+import sys
+import time
+from contextlib import contextmanager
+
+
+"""*********************Global*********************************************"""
+PROFILE_FLAG = "--profile-startup"
+SLOWEST_IMPORTS = 15  # Imports listed in the report
+
+
+"""*********************Classes********************************************"""
+class StartupProfiler:
+    """
+    Records named startup phases and, once installed, the load time of
+    every module imported for the first time. All times are measured from
+    the creation of the profiler. A disabled profiler records nothing and
+    costs nothing.
+    """
+    def __init__(self, enabled=True):
+        """
+        Start the startup clock.
+
+        enabled: Whether to record anything (bool)
+        """
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases = []  # (name, start, end) in seconds since `started`
+        self.marks = {}  # Name -> seconds since `started`
+        self.imports = []  # (module, total seconds, own seconds, depth)
+        self._stack = []  # Time spent in nested imports per open import
+        self._original_import = None
+
+    def install(self):
+        """
+        Start timing the imports of modules that are not loaded yet.
+        """
+        if not self.enabled or self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """
+        Stop timing imports.
+        """
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(),
+                      level=0):
+        """
+        builtins.__import__ replacement that times first-time imports.
+        """
+        original = self._original_import
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.imports.append((name, elapsed, elapsed - nested,
+                                 len(self._stack)))
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the body of a `with` statement as a startup phase.
+
+        name: Name of the phase (string)
+        """
+        if not self.enabled:
+            yield
+            return
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start, self.elapsed()))
+
+    def mark(self, name):
+        """
+        Record the moment a startup milestone is reached, once.
+
+        name: Name of the milestone (string)
+        """
+        if self.enabled and name not in self.marks:
+            self.marks[name] = self.elapsed()
+
+    def elapsed(self):
+        """
+        Return the seconds since the profiler was created.
+        """
+        return time.perf_counter() - self.started
+
+    def report(self, file=None):
+        """
+        Print the phases, milestones and slowest imports.
+
+        file: Text file to print to, stderr by default (file)
+        """
+        if not self.enabled:
+            return
+        file = file if file is not None else sys.stderr
+        print("Startup phases (ms since start):", file=file)
+        for name, start, end in self.phases:
+            print(f"  {name:<24} {(end - start) * 1000:8.1f}  "
+                  f"[{start * 1000:7.1f} - {end * 1000:7.1f}]", file=file)
+        for name, moment in self.marks.items():
+            print(f"  {name:<24} at {moment * 1000:7.1f}", file=file)
+
+        slowest = sorted(self.imports, key=lambda item: item[2],
+                         reverse=True)[:SLOWEST_IMPORTS]
+        if slowest:
+            print("Slowest imports (ms own / total):", file=file)
+            for name, total, own, depth in slowest:
+                print(f"  {name:<32} {own * 1000:7.1f} / {total * 1000:7.1f}",
+                      file=file)
@@ -0,0 +1,193 @@
+"""***************************************************************************
+Title:          Parameter Sweep
+File:           sweep.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file runs annual simulations of the Autonomous_HVAC_System
+                for every combination of setpoint, heat loss coefficient,
+                thermal capacity and staging, spread over a process pool.
+                The weather data is placed once in shared memory.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from simulation import HEAT_LOSS_COEFFICIENT, THERMAL_CAPACITY
+from simulation import STAGE_THRESHOLDS, STAGE_CAPACITIES, HEATING, COOLING
+from simulation import simulate_year
+from weather import WeatherData, shared_dataset
+
+
+"""*********************Global*********************************************"""
+RESULT_DTYPE = np.dtype([
+    ("setpoint", np.float64),
+    ("U", np.float64),
+    ("C", np.float64),
+    ("thresholds", np.float64, (3,)),
+    ("capacities", np.float64, (3,)),
+    ("energy", np.float64),  # Total output over the weather data (BTU)
+    ("heating_hours", np.int64),
+    ("cooling_hours", np.int64),
+    ("unreached_hours", np.int64),  # Hours where the setpoint was not met
+])
+
+_worker_weather = None  # Weather data of a pool worker, in shared memory
+_worker_memory = None  # Keeps the shared memory block of a worker open
+
+
+"""*********************Functions******************************************"""
+def parameter_grid(setpoints, U_values=(HEAT_LOSS_COEFFICIENT,),
+                   C_values=(THERMAL_CAPACITY,),
+                   stagings=((STAGE_THRESHOLDS, STAGE_CAPACITIES),)):
+    """
+    Return every combination of the swept parameters as a list of
+    (setpoint, U, C, thresholds, capacities) tuples.
+
+    setpoints: Temperature setpoints (list of float)
+    U_values: Heat loss coefficients (list of float)
+    C_values: Thermal capacities (list of float)
+    stagings: (thresholds, capacities) pairs of 3 stages each (list)
+    """
+    return [(setpoint, U, C, tuple(thresholds), tuple(capacities))
+            for setpoint, U, C, (thresholds, capacities) in itertools.product(
+                setpoints, U_values, C_values, stagings)]
+
+
+def share_weather(weather):
+    """
+    Copy the hours and temperatures of the weather data into one shared
+    memory block. Returns the block; its creator must unlink it.
+
+    weather: Hourly weather data (WeatherData)
+    """
+    count = len(weather)
+    memory = shared_memory.SharedMemory(create=True, size=max(count, 1) * 16)
+    hours, temperature = _weather_views(memory, count)
+    hours[:] = weather.hours
+    temperature[:] = weather.temperature
+    return memory
+
+
+def run_sweep(grid, weather=None, processes=None, chunksize=4, year=None):
+    """
+    Run an annual simulation for every parameter combination of the grid on
+    a process pool. Results stream back into one table as they complete.
+
+    grid: Parameter combinations from `parameter_grid` (list)
+    weather: Hourly weather data, the shared dataset by default (WeatherData)
+    processes: Number of worker processes, all cores by default (int)
+    chunksize: Runs handed to a worker at a time (int)
+    year: Only simulate the hours of this year (int)
+    """
+    weather = weather if weather is not None else shared_dataset().get()
+    processes = processes or os.cpu_count() or 1
+    table = np.zeros(len(grid), dtype=RESULT_DTYPE)
+    memory = share_weather(weather)
+    started = time.perf_counter()
+
+    try:
+        with multiprocessing.Pool(
+                processes, initializer=_attach_weather,
+                initargs=(memory.name, len(weather))) as pool:
+            jobs = [(i, parameters, year)
+                    for i, parameters in enumerate(grid)]
+            for i, row in pool.imap_unordered(_run_job, jobs, chunksize):
+                table[i] = row
+    finally:
+        memory.close()
+        memory.unlink()
+
+    elapsed = time.perf_counter() - started
+    return SweepResult(table, elapsed, processes)
+
+
+def _weather_views(memory, count):
+    """
+    Return the hours and temperature arrays laid out in a memory block.
+    """
+    hours = np.ndarray((count,), dtype=np.int64, buffer=memory.buf)
+    temperature = np.ndarray((count,), dtype=np.float64, buffer=memory.buf,
+                             offset=count * 8)
+    return hours, temperature
+
+
+def _attach_weather(name, count):
+    """
+    Pool initializer: map the shared weather data into the worker.
+    """
+    global _worker_weather, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    hours, temperature = _weather_views(_worker_memory, count)
+    _worker_weather = WeatherData(hours, temperature, None)
+
+
+def _run_job(job):
+    """
+    Pool task: run one annual simulation and return its table row.
+    """
+    i, (setpoint, U, C, thresholds, capacities), year = job
+    result = simulate_year(setpoint, _worker_weather, year=year, U=U, C=C,
+                           thresholds=thresholds, capacities=capacities)
+    return i, (setpoint, U, C, thresholds, capacities, result.total_energy,
+               int(np.count_nonzero(result.modes == HEATING)),
+               int(np.count_nonzero(result.modes == COOLING)),
+               int(np.count_nonzero(~result.reached)))
+
+
+"""*********************Classes********************************************"""
+class SweepResult:
+    """
+    Consolidated table of a parameter sweep (one RESULT_DTYPE row per run)
+    and its throughput.
+    """
+    def __init__(self, table, elapsed, processes):
+        self.table = table
+        self.elapsed = elapsed
+        self.processes = processes
+
+    @property
+    def runs_per_second(self):
+        """
+        Number of annual simulations completed per second of wall time.
+        """
+        return len(self.table) / self.elapsed if self.elapsed else 0.0
+
+
+"""*********************Main Routine***************************************"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sweep annual simulations over a parameter grid.")
+    parser.add_argument("--setpoints", type=float, nargs="+", default=[22])
+    parser.add_argument("--U", type=float, nargs="+",
+                        default=[HEAT_LOSS_COEFFICIENT])
+    parser.add_argument("--C", type=float, nargs="+",
+                        default=[THERMAL_CAPACITY])
+    parser.add_argument("--thresholds", nargs="+",
+                        default=[",".join(map(str, STAGE_THRESHOLDS))],
+                        help="Stage thresholds as 'high,medium,low' (°C)")
+    parser.add_argument("--capacities", nargs="+",
+                        default=[",".join(map(str, STAGE_CAPACITIES))],
+                        help="Stage outputs as 'high,medium,low' (BTU)")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--year", type=int, default=None)
+    args = parser.parse_args()
+
+    stagings = [(tuple(map(float, thresholds.split(","))),
+                 tuple(map(float, capacities.split(","))))
+                for thresholds in args.thresholds
+                for capacities in args.capacities]
+    grid = parameter_grid(args.setpoints, args.U, args.C, stagings)
+    sweep = run_sweep(grid, processes=args.processes, year=args.year)
+
+    for row in np.sort(sweep.table, order="energy"):
+        print(f"setpoint {row['setpoint']:5.1f}  U {row['U']:6.2f}  "
+              f"C {row['C']:7.1f}  stages {row['thresholds'].tolist()} "
+              f"{row['capacities'].tolist()}  {row['energy']:>14,.0f} BTU  "
+              f"unreached {row['unreached_hours']} h")
+    print(f"{len(sweep.table)} runs on {sweep.processes} processes in "
+          f"{sweep.elapsed:.2f} s ({sweep.runs_per_second:.1f} runs/s)")
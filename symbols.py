@@ -15,12 +15,16 @@ from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton
 from PyQt5.QtWidgets import QDoubleSpinBox
 from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont
 from PyQt5.QtCore import Qt
+from metrics import histogram, timed
 
 # Enable high DPI scaling 
 QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
 QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
 
 """*********************Global*********************************************"""
+PAINT_SECONDS = histogram("hvac_paint_seconds", "Time to paint a widget",
+                          widget="symbol")
+
 # Consists of the image, True if value and False with no value
 symbol_images = {
     "temperature" : ["Symbols/temp_sensor.png", False, None],
@@ -33,8 +37,32 @@ symbol_images = {
     "state value" : ["Symbols/numeric.png", True, ""]
     } 
 
+# Decoded and scaled images, shared by every widget and every repaint
+pixmap_cache = {}
+
 
 """*********************Functions******************************************"""
+'========================================='  
+def scaled_pixmap(file, width=None, height=None):
+    """
+    Returns the image of a file scaled to fit in width x height keeping its
+    aspect ratio, or at its own size without width and height. Each image
+    is only read and scaled once.
+    
+    file: Specify the file name and location as text 'folder/name.png'.
+    width: Largest width of the image (>0).
+    height: Largest height of the image (>0).
+    """
+    key = (file, width, height)
+    pixmap = pixmap_cache.get(key)
+    if pixmap is None:
+        pixmap = QPixmap(file)
+        if width is not None:
+            pixmap = pixmap.scaled(width, height, Qt.KeepAspectRatio)
+        pixmap_cache[key] = pixmap
+    return pixmap
+
+
 '========================================='  
 def add_button(label = "Not available", widget = None,
                size_x = 10, size_y = 10, pos_x = 0, pos_y = 0):
@@ -96,9 +124,7 @@ def add_image(file = None, scale = 1, instance = None,
     pos_y: Position along y axis on the graphic window (>=0).
     """
     image = QLabel(instance)
-    pixmap = QPixmap(file)
-    resized_pixmap = pixmap.scaled(int(size_x*scale), int(size_y*scale), 
-                                   Qt.KeepAspectRatio)
+    resized_pixmap = scaled_pixmap(file, int(size_x*scale), int(size_y*scale))
     image.setPixmap(resized_pixmap)
     image.setFixedSize(resized_pixmap.size())
     image.move(pos_x, pos_y)
@@ -135,6 +161,7 @@ class Symbols(QLabel):
         self.__pos_x = pos_x
         self.__pos_y = pos_y
     
+    @timed(PAINT_SECONDS)
     def paintEvent(self, event):
         """
         This method is called to update the graphic via events.
@@ -146,14 +173,14 @@ class Symbols(QLabel):
         painter.begin(self)
         
         # Scale the image
-        pixmap = QPixmap(self.__graphic)
+        pixmap = scaled_pixmap(self.__graphic)
         if self.__graphic == symbol_images["time value"][0]: 
             length = int(pixmap.height() * self.__scale*1.4) 
             width = int(pixmap.width() * (self.__scale*1.4)) 
         else: 
             length = int(pixmap.height() * self.__scale) 
             width = int(pixmap.width() * self.__scale)
-        pixmap = pixmap.scaled(length, width, Qt.KeepAspectRatio)
+        pixmap = scaled_pixmap(self.__graphic, length, width)
         self.setFixedSize(width, length)
             
         # Draw the furnace image at the position specified by pos_x and pos_y
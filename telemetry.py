@@ -0,0 +1,407 @@
+"""***************************************************************************
+Title:          Telemetry
+File:           telemetry.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the telemetry history of the
+                Autonomous_HVAC_System. Every state change of the controller
+                is appended to memory-mapped columns, one NumPy .npy file per
+                column, in segments that roll over by size:
+
+                    <root>/000000/time.npy, temperature.npy, ..., meta.json
+
+                Samples are gathered in a batch and copied into the mapped
+                files together. A closed segment is a plain .npy file per
+                column (np.load); the rows of the open one are given by its
+                meta.json. Time range queries only map the segments they
+                touch and only read the rows they return.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+from simulation import MODE_NAMES
+from zones import HOUSE_ZONES
+from logger import get_logger
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+BATCH_ROWS = 4096  # Samples gathered before they are copied to the files
+FLUSH_INTERVAL = 1.0  # Seconds of samples gathered before they are copied
+SEGMENT_BYTES = 32 * 1024 * 1024  # Size of a segment before it rolls over
+META_FILE = "meta.json"
+
+# Codes of the text values of the controller
+MODES = {name: code for code, name in MODE_NAMES.items()}
+FAN_SPEEDS = ("None", "low", "high")
+UNKNOWN = -1  # Code of a value missing from the vocabulary
+
+
+"""*********************Functions******************************************"""
+def columns(zone_count):
+    """
+    Return the (name, dtype, shape of a row) of every telemetry column.
+
+    zone_count: Number of zones (int)
+    """
+    return (
+        ("time", np.float64, ()),  # Seconds since the epoch
+        ("version", np.int64, ()),  # Version of the published state
+        ("setpoint", np.float32, ()),
+        ("temp_out", np.float32, ()),
+        ("current_temp", np.float32, ()),
+        ("temperature", np.float32, (zone_count,)),  # Per zone
+        ("damper", np.float32, (zone_count,)),  # Per zone
+        ("furnace_status", np.int8, ()),
+        ("furnace_energy", np.float32, ()),
+        ("aircon_status", np.int8, ()),
+        ("aircon_energy", np.float32, ()),
+        ("fan_speed", np.int8, ()),  # Index in FAN_SPEEDS
+        ("mode", np.int8, ()),  # Key of MODE_NAMES
+    )
+
+
+def status_code(status):
+    """
+    Return 1 for a furnace, air conditioner or fan that is on, else 0.
+
+    status: Status of the controller, such as 1, 0, "On" or "Off"
+    """
+    return 1 if status in (1, True, "On", "on") else 0
+
+
+def seal_column(path, rows):
+    """
+    Shrink a preallocated .npy column to its first rows: the header is
+    rewritten in place with the new shape and the file truncated.
+
+    path: Path to the .npy file (string)
+    rows: Number of rows written (int)
+    """
+    with open(path, "r+b") as file:
+        np.lib.format.read_magic(file)
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(file)
+        offset = file.tell()
+        file.seek(0)
+        # The header keeps its length whatever the number of rows
+        np.lib.format.write_array_header_1_0(file, {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": fortran,
+            "shape": (rows,) + tuple(shape[1:]),
+        })
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+        file.truncate(offset + rows * row_bytes)
+
+
+def add_arguments(parser):
+    """
+    Add the --telemetry option to a parser.
+
+    parser: Command line parser (argparse.ArgumentParser)
+    """
+    parser.add_argument("--telemetry", default=None,
+                        help="Append every state change to this directory")
+
+
+def start_from_args(argv, controller):
+    """
+    Record the state changes of a controller to the directory given by
+    --telemetry on a command line, ignoring every other argument. Returns
+    the recorder, or None without the option.
+
+    argv: Command line arguments (list of string)
+    controller: Controller to record (ThermostatController)
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    add_arguments(parser)
+    args, _ = parser.parse_known_args(argv)
+    if args.telemetry is None:
+        return None
+    recorder = TelemetryRecorder(args.telemetry,
+                                 zones=controller.zones.names)
+    recorder.attach(controller)
+    return recorder
+
+
+"""*********************Classes********************************************"""
+class TelemetryRecorder:
+    """
+    Appends controller state samples to the segments of a telemetry
+    directory. Samples must come in time order. A batch is written once it
+    is full or spans FLUSH_INTERVAL; close the recorder to write the last
+    batch and seal the open segment.
+    """
+    def __init__(self, root, zones=HOUSE_ZONES, batch_rows=BATCH_ROWS,
+                 segment_bytes=SEGMENT_BYTES):
+        """
+        Open a telemetry directory for appending; the history already in
+        it is kept and new samples start a new segment.
+
+        root: Directory of the history (string)
+        zones: Zone names, in zone ID order (list of string)
+        batch_rows: Samples gathered before they are written (int)
+        segment_bytes: Size of a segment before it rolls over (int)
+        """
+        self.root = root
+        self.zones = tuple(zones)
+        self.columns = columns(len(self.zones))
+        row_bytes = sum(np.dtype(dtype).itemsize * int(np.prod(shape))
+                        for name, dtype, shape in self.columns)
+        self.segment_rows = max(segment_bytes // row_bytes, batch_rows)
+        self.batch = {name: np.zeros((batch_rows,) + shape, dtype=dtype)
+                      for name, dtype, shape in self.columns}
+        self.batch_rows = batch_rows
+        self.pending = 0  # Samples in the batch
+        self.rows = 0  # Samples in the open segment
+        self.samples = 0  # Samples appended by this recorder
+        self.last_time = -np.inf
+        self._segment = None  # Directory of the open segment
+        self._files = {}  # Column name -> memory map of the open segment
+        self._start_time = None  # Time span of the open segment
+        self._end_time = None
+        self._lock = threading.Lock()
+        self._controller = None
+        os.makedirs(root, exist_ok=True)
+        existing = TelemetryHistory(root).segments
+        self._next_index = int(os.path.basename(existing[-1])) + 1 \
+            if existing else 0
+
+    def append(self, timestamp, version=0, setpoint=np.nan, temp_out=np.nan,
+               current_temp=np.nan, temperature=np.nan, damper=np.nan,
+               furnace_status=0, furnace_energy=0, aircon_status=0,
+               aircon_energy=0, fan_speed=UNKNOWN, mode=UNKNOWN):
+        """
+        Append one sample. The values are coded as in `columns`.
+
+        timestamp: Seconds since the epoch, not before the last one, or
+                   None for now (float)
+        temperature: Temperature of every zone, or one for all (array)
+        damper: Damper position of every zone, or one for all (array)
+        """
+        with self._lock:
+            if timestamp is None:
+                timestamp = max(time.time(), self.last_time)
+            elif timestamp < self.last_time:
+                raise ValueError("Telemetry samples must be in time order")
+            batch = self.batch
+            i = self.pending
+            batch["time"][i] = timestamp
+            batch["version"][i] = version
+            batch["setpoint"][i] = setpoint
+            batch["temp_out"][i] = temp_out
+            batch["current_temp"][i] = current_temp
+            batch["temperature"][i] = temperature
+            batch["damper"][i] = damper
+            batch["furnace_status"][i] = furnace_status
+            batch["furnace_energy"][i] = furnace_energy
+            batch["aircon_status"][i] = aircon_status
+            batch["aircon_energy"][i] = aircon_energy
+            batch["fan_speed"][i] = fan_speed
+            batch["mode"][i] = mode
+            self.last_time = timestamp
+            self.pending = i + 1
+            if self.pending == self.batch_rows or \
+                    timestamp - batch["time"][0] >= FLUSH_INTERVAL:
+                self._write_batch()
+
+    def record(self, controller):
+        """
+        Append the current state of a controller, stamped with the current
+        time. Used as a `state_changed` subscriber.
+
+        controller: Controller to record (ThermostatController)
+        """
+        snapshot = controller.snapshot
+        speed = controller.fan_speed
+        self.append(None, version=snapshot.version,
+                    setpoint=controller.setpoint,
+                    temp_out=controller.temp_out,
+                    current_temp=controller.current_temp,
+                    temperature=controller.zones.temperature,
+                    damper=controller.zones.damper,
+                    furnace_status=status_code(controller.furnace_status),
+                    furnace_energy=controller.furnace_energy,
+                    aircon_status=status_code(controller.aircon_status),
+                    aircon_energy=controller.aircon_energy,
+                    fan_speed=FAN_SPEEDS.index(speed) if speed in FAN_SPEEDS
+                    else UNKNOWN,
+                    mode=MODES.get(controller.mode, UNKNOWN))
+
+    def attach(self, controller):
+        """
+        Record every state change of a controller from now on.
+
+        controller: Controller to record (ThermostatController)
+        """
+        self._controller = controller
+        controller.state_changed.subscribe(self.record)
+
+    def flush(self):
+        """
+        Write the samples of the batch to the files of the open segment.
+        """
+        with self._lock:
+            self._write_batch()
+
+    def close(self):
+        """
+        Stop recording, write the batch and seal the open segment.
+        """
+        if self._controller is not None:
+            self._controller.state_changed.unsubscribe(self.record)
+            self._controller = None
+        with self._lock:
+            self._write_batch()
+            self._seal()
+
+    def _write_batch(self):
+        """
+        Copy the batch into the open segment, rolling over to new segments
+        as they fill up. The caller holds the lock.
+        """
+        done = 0
+        while done < self.pending:
+            if self._segment is None:
+                self._open_segment()
+            count = min(self.pending - done, self.segment_rows - self.rows)
+            for name, file in self._files.items():
+                file[self.rows:self.rows + count] = \
+                    self.batch[name][done:done + count]
+            if self._start_time is None:
+                self._start_time = float(self.batch["time"][done])
+            self._end_time = float(self.batch["time"][done + count - 1])
+            self.rows += count
+            done += count
+            self.samples += count
+            self._write_meta(False)
+            if self.rows == self.segment_rows:
+                self._seal()
+        self.pending = 0
+
+    def _open_segment(self):
+        """
+        Create the preallocated column files of a new segment.
+        """
+        self._segment = os.path.join(self.root, f"{self._next_index:06d}")
+        self._next_index += 1
+        os.makedirs(self._segment, exist_ok=True)
+        self._files = {
+            name: np.lib.format.open_memmap(
+                os.path.join(self._segment, f"{name}.npy"), mode="w+",
+                dtype=dtype, shape=(self.segment_rows,) + shape)
+            for name, dtype, shape in self.columns}
+        self.rows = 0
+        self._start_time = self._end_time = None
+
+    def _seal(self):
+        """
+        Close the open segment, shrinking its files to the rows written.
+        """
+        if self._segment is None:
+            return
+        for file in self._files.values():
+            file.flush()
+        self._files = {}  # Unmap before the files are truncated
+        for name, dtype, shape in self.columns:
+            seal_column(os.path.join(self._segment, f"{name}.npy"),
+                        self.rows)
+        self._write_meta(True)
+        self._segment = None
+        log.info("Telemetry segment sealed.", rows=self.rows)
+
+    def _write_meta(self, sealed):
+        """
+        Replace the description of the open segment.
+        """
+        meta = {
+            "rows": self.rows,
+            "start": self._start_time,
+            "end": self._end_time,
+            "sealed": sealed,
+            "zones": list(self.zones),
+            "fan_speeds": list(FAN_SPEEDS),
+            "modes": {str(code): name for code, name in MODE_NAMES.items()},
+        }
+        path = os.path.join(self._segment, META_FILE)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(meta, file)
+        os.replace(f"{path}.tmp", path)
+
+
+class TelemetryHistory:
+    """
+    Read access to a telemetry directory, also while it is being written.
+    Columns are memory-mapped, so only the rows used are read from disk.
+    """
+    def __init__(self, root):
+        """
+        Open a telemetry directory.
+
+        root: Directory of the history (string)
+        """
+        self.root = root
+        self.segments = sorted(
+            os.path.join(root, name) for name in os.listdir(root)
+            if os.path.isfile(os.path.join(root, name, META_FILE))) \
+            if os.path.isdir(root) else []
+
+    def meta(self, segment):
+        """
+        Return the description of a segment.
+
+        segment: Directory of the segment (string)
+        """
+        with open(os.path.join(segment, META_FILE)) as file:
+            return json.load(file)
+
+    def column(self, segment, name):
+        """
+        Return the written rows of a column of a segment, memory-mapped.
+
+        segment: Directory of the segment (string)
+        name: Column name (string)
+        """
+        rows = self.meta(segment)["rows"]
+        return np.load(os.path.join(segment, f"{name}.npy"),
+                       mmap_mode="r")[:rows]
+
+    def __len__(self):
+        return sum(self.meta(segment)["rows"] for segment in self.segments)
+
+    def range(self, start=-np.inf, end=np.inf, names=None):
+        """
+        Return the samples with start <= time < end as a dictionary of
+        column arrays. Segments outside the range are not opened.
+
+        start: First time included, seconds since the epoch (float)
+        end: First time excluded, seconds since the epoch (float)
+        names: Columns to return, all by default (list of string)
+        """
+        parts = {}
+        for segment in self.segments:
+            meta = self.meta(segment)
+            if not meta["rows"] or meta["start"] >= end or \
+                    meta["end"] < start:
+                continue
+            times = self.column(segment, "time")
+            first, last = np.searchsorted(times, (start, end), side="left")
+            if first == last:
+                continue
+            for name in names or [name for name, dtype, shape
+                                  in columns(len(meta["zones"]))]:
+                parts.setdefault(name, []).append(
+                    self.column(segment, name)[first:last])
+
+        zone_count = len(self.meta(self.segments[0])["zones"]) \
+            if self.segments else len(HOUSE_ZONES)
+        result = {}
+        for name, dtype, shape in columns(zone_count):
+            if names is None or name in names:
+                result[name] = np.concatenate(parts[name]) if name in parts \
+                    else np.zeros((0,) + shape, dtype=dtype)
+        return result
@@ -11,6 +11,45 @@ import unittest
 from unittest.mock import MagicMock, patch
 from controller import ThermostatController
 from model import Model, ThermostatModel, FanModel, FurnaceModel, AirConditionerModel
+from weather import TemperatureIndex, to_epoch_hour, load_weather
+from weather import WeatherDataset, WeatherData, shared_dataset
+from weather import MinuteSeries, to_epoch_minute
+from simulation import simulate, simulate_batch, Playback, HEATING
+from simulation import simulate_year, MODE_NAMES
+from sweep import parameter_grid, run_sweep
+from weather_stream import RingBuffer, CsvTail, LocalFeed, SocketSource
+from weather_stream import WeatherStream
+from weather_store import WeatherStore
+from events import Event
+from zones import ZoneState, HOUSE_ZONES, HOUSE_FLOORS
+from fleet import Fleet
+import hvac
+from async_runtime import AsyncControl, QtEventLoop, run_zones, ingest_socket
+from startup import StartupProfiler
+from symbols import scaled_pixmap
+import logger
+import metrics
+from telemetry import TelemetryRecorder, TelemetryHistory
+from replay import SessionRecorder, SessionLog, replay
+from clock import RealTimeClock, ScaledClock, DiscreteClock, clock_for
+from control import StagedControl, FeedbackControl, PIDControl, MPCControl
+from control import compare
+from predictor import predict
+from thermal_network import house_network, grid_network
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+import asyncio
+import threading
+import time
+import numpy as np
+import os
+import tempfile
+import io
+import json
+import logging
+import subprocess
+import sys
+import urllib.request
 
 """*********************Classes****************************************"""
 class TestThermostatController(unittest.TestCase):
@@ -77,6 +116,7 @@ class TestThermostatController(unittest.TestCase):
         self.controller.damp_sup_pos = 50
         self.controller.damp_ret_pos = 50
         self.controller.damp_out_pos = 50
+        self.controller.publish()  # The overview reads the published state
 
         expected_overview = [
             21, 22, 23, 24, 25, 20, 19, 18, 17, 15, "2024-01-01", "0:00", "Heating",
@@ -100,7 +140,7 @@ class TestThermostatController(unittest.TestCase):
 
         self.controller.furnace.heating.assert_called_once_with(20, 25)
         self.controller.set_current_temperature_furnace.assert_called_once()
-        self.assertEqual(self.controller.furnace_status, 1)
+        self.assertEqual(self.controller.furnace_status, "On")
 
     def test_control_temperature_cooling(self):
         """
@@ -117,7 +157,7 @@ class TestThermostatController(unittest.TestCase):
 
         self.controller.aircon.Cooling.assert_called_once_with(25, 20)
         self.controller.set_current_temperature_aircon.assert_called_once()
-        self.assertEqual(self.controller.aircon_status, 1)
+        self.assertEqual(self.controller.aircon_status, "On")
 
     def test_start_operation_heating_cooling(self):
         """
@@ -151,6 +191,9 @@ class TestHVACSystem(unittest.TestCase):
         self.fan = FanModel()
         self.furnace = FurnaceModel()
         self.aircon = AirConditionerModel()
+        # Simulated time, the runs take minutes of wall time otherwise
+        self.furnace.clock = DiscreteClock()
+        self.aircon.clock = DiscreteClock()
 
     def test_initialization(self):
         # Test default values
@@ -225,6 +268,1355 @@ class TestHVACSystem(unittest.TestCase):
         self.assertTrue(self.aircon.stop_polling)
         self.assertLessEqual(self.aircon.current_values["current_temp"], 22)
 
+class TestTemperatureIndex(unittest.TestCase):
+    def setUp(self):
+        rows = [["2024-01-01 0:00", 4.4, 100],
+                ["2024-01-01 1:00", 4.7, 100],
+                ["2024-01-01 3:00", 4.9, 95]]
+        self.index = TemperatureIndex.from_rows(rows)
+        self.thermostat = ThermostatModel(rows)
+
+    def test_lookup(self):
+        # Hits return floats, gaps and out of range hours return None
+        self.assertEqual(self.index.lookup("2024-01-01", 1), 4.7)
+        self.assertIsInstance(self.index.lookup("2024-01-01", 0), float)
+        self.assertIsNone(self.index.lookup("2024-01-01", 2))
+        self.assertIsNone(self.index.lookup("2023-12-31", 23))
+
+    def test_lookup_many(self):
+        hours = [to_epoch_hour("2024-01-01", h) for h in (3, 0, 2, 99)]
+        result = self.index.lookup_many(hours)
+        np.testing.assert_array_equal(result[:2], [4.9, 4.4])
+        self.assertTrue(np.isnan(result[2:]).all())
+
+    def test_get_outdoor_temperature(self):
+        self.thermostat.set_date_time("2024-01-01", "3:00")
+        self.assertEqual(self.thermostat.get_outdoor_temperature(), 4.9)
+        self.assertEqual(self.thermostat.current_values["outdoor_temp"], 4.9)
+        self.thermostat.set_date_time("2024-01-01", "2:00")
+        self.assertIsNone(self.thermostat.get_outdoor_temperature())
+
+    def test_get_outdoor_temperatures(self):
+        result = self.thermostat.get_outdoor_temperatures(
+            ["2024-01-01 1:00", "2024-01-01 3:00"])
+        np.testing.assert_array_equal(result, [4.7, 4.9])
+
+class TestWeatherCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.csv_path = os.path.join(self.folder.name, "weather.csv")
+        self.write_csv(4.4)
+
+    def write_csv(self, first_temp):
+        with open(self.csv_path, "w") as file:
+            file.write("DateTime,Temp,Hum\n")
+            file.write(f"2024-01-01 0:00,{first_temp},100\n")
+            file.write("2024-01-01 1:00,4.7,90\n")
+
+    def test_memory_mapped_columns(self):
+        data = load_weather(self.csv_path)
+        self.assertIsInstance(data.temperature, np.memmap)
+        self.assertEqual(data.hours.dtype, np.int64)
+        self.assertEqual(data.temperature.dtype, np.float32)
+        self.assertEqual(data.hours[1] - data.hours[0], 1)
+        self.assertAlmostEqual(data.index.lookup("2024-01-01", 1), 4.7,
+                               places=5)
+
+    def test_cache_reused_until_csv_changes(self):
+        import pandas as pd
+        read_csv = MagicMock(side_effect=pd.read_csv)
+        with patch('pandas.read_csv', read_csv):
+            # First load compiles, second load only memory-maps
+            load_weather(self.csv_path)
+            load_weather(self.csv_path)
+            self.assertEqual(read_csv.call_count, 1)
+
+            # Changed content is picked up on the next load
+            self.write_csv(-3.5)
+            data = load_weather(self.csv_path)
+            self.assertEqual(read_csv.call_count, 2)
+            self.assertEqual(data.temperature[0], np.float32(-3.5))
+
+class TestSharedDataset(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.csv_path = os.path.join(self.folder.name, "weather.csv")
+        self.write_csv("4.4")
+
+    def write_csv(self, first_temp):
+        with open(self.csv_path, "w") as file:
+            file.write("DateTime,Temp,Hum\n")
+            file.write(f"2024-01-01 0:00,{first_temp},100\n")
+
+    def test_models_share_one_dataset(self):
+        self.assertIs(shared_dataset(self.csv_path),
+                      shared_dataset(self.csv_path))
+        thermostat = ThermostatModel()
+        thermostat.load_data_from_csv(self.csv_path)
+        furnace = FurnaceModel()
+        furnace.load_data_from_csv(self.csv_path)
+        self.assertIs(thermostat.temperature_data, furnace.temperature_data)
+        self.assertIs(thermostat.temperature_index,
+                      furnace.temperature_index)
+
+    def test_reload_on_change(self):
+        dataset = WeatherDataset(self.csv_path, check_interval=0)
+        first = dataset.get()
+        self.assertIs(dataset.get(), first)
+        self.write_csv("-12.25")
+        second = dataset.get()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.temperature[0], np.float32(-12.25))
+
+    def test_missing_file_keeps_data(self):
+        dataset = WeatherDataset(self.csv_path, check_interval=0)
+        first = dataset.get()
+        os.remove(self.csv_path)
+        self.assertIs(dataset.get(), first)
+        with self.assertRaises(FileNotFoundError):
+            WeatherDataset(self.csv_path).get()
+
+class TestSimulation(unittest.TestCase):
+    def reference_heating(self, current_temperature, set_temp):
+        # Step by step loop of the original FurnaceModel.heating
+        temperatures = []
+        while set_temp > current_temperature:
+            q_furnace = FurnaceModel().calculate_q_furnace(
+                set_temp - current_temperature)
+            current_temperature += (q_furnace - 10.0 * (
+                set_temp - current_temperature)) / 500.0
+            temperatures.append(current_temperature)
+        return temperatures
+
+    def test_matches_step_by_step_heating(self):
+        for outdoor_temp in (15, -20, 4.4, 21.9):
+            trajectory = simulate(outdoor_temp, 22)
+            self.assertTrue(trajectory.reached)
+            self.assertEqual(trajectory.temperatures[1:].tolist(),
+                             self.reference_heating(outdoor_temp, 22))
+
+    def test_batch_matches_single_runs(self):
+        starts = np.array([15.0, 30.0, 22.0, -10.0])
+        batch = simulate_batch(starts, 22)
+        self.assertIsNone(batch.temperatures)  # Only recorded on request
+        for i, start in enumerate(starts):
+            trajectory = simulate(start, 22)
+            self.assertEqual(batch.steps[i], len(trajectory))
+            self.assertEqual(batch.energy[i], trajectory.energy)
+            self.assertEqual(batch.final_temps[i],
+                             trajectory.temperatures[-1])
+
+    def test_unreachable_setpoint_stops(self):
+        # Losses outweigh the largest stage, the run can never finish
+        trajectory = simulate(-30, 22, HEATING)
+        self.assertFalse(trajectory.reached)
+        self.assertEqual(len(trajectory), 0)
+
+    def test_playback_at_max_speed(self):
+        trajectory = simulate(15, 25)
+        samples = list(Playback(trajectory, "max"))
+        self.assertEqual(len(samples), len(trajectory))
+        self.assertEqual(samples[-1][0], trajectory.duration)
+        self.assertGreaterEqual(samples[-1][1], 25)
+
+    def test_playback_cancel_interrupts_wait(self):
+        trajectory = simulate(15, 25)
+        cancel = threading.Event()
+        playback = Playback(trajectory, 1.0, cancel)
+        threading.Timer(0.1, cancel.set).start()
+        started = time.monotonic()
+        samples = list(playback)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(samples), 1)
+        self.assertTrue(playback.cancelled)
+
+    def test_furnace_heating_at_max_speed(self):
+        furnace = FurnaceModel()
+        furnace.speedup = None
+        furnace.heating(15, 25)
+        self.assertTrue(furnace.stop_polling)
+        self.assertGreaterEqual(furnace.current_values["current_temp"], 25)
+
+class TestAnnualSimulation(unittest.TestCase):
+    def setUp(self):
+        # Two days of readings, with one missing value
+        start = to_epoch_hour("2024-01-31", 0)
+        hours = np.arange(start, start + 48, dtype=np.int64)
+        temperature = np.linspace(-15, 30, 48).astype(np.float32)
+        temperature[5] = np.nan
+        self.weather = WeatherData(hours, temperature,
+                                   np.zeros(48, dtype=np.float32))
+        self.result = simulate_year(22, self.weather)
+
+    def test_matches_interactive_path(self):
+        thermostat = ThermostatModel()
+        furnace = FurnaceModel()
+        aircon = AirConditionerModel()
+        for i in (0, 20, 47):
+            outdoor_temp = float(self.weather.temperature[i])
+            thermostat.current_values["outdoor_temp"] = outdoor_temp
+            thermostat.current_values["Set_temp"] = 22
+            self.assertEqual(MODE_NAMES[self.result.modes[i]],
+                             thermostat.set_mode())
+            if outdoor_temp < 22:
+                trajectory = furnace.simulate_heating(outdoor_temp, 22)
+            else:
+                trajectory = aircon.simulate_cooling(outdoor_temp, 22)
+            self.assertEqual(self.result.energy[i], trajectory.energy)
+            self.assertEqual(self.result.steps[i], len(trajectory))
+
+    def test_missing_hour_is_idle(self):
+        self.assertEqual(MODE_NAMES[self.result.modes[5]], "Normal mode")
+        self.assertEqual(self.result.energy[5], 0)
+
+    def test_rollups(self):
+        daily = self.result.daily()
+        monthly = self.result.monthly()
+        self.assertEqual(len(daily.periods), 2)
+        self.assertEqual(len(monthly.periods), 2)
+        self.assertAlmostEqual(daily.energy.sum(), self.result.total_energy)
+        self.assertEqual(self.result.cumulative_energy[-1],
+                         self.result.energy.sum())
+        self.assertEqual(daily.heating_hours.sum() +
+                         daily.cooling_hours.sum(), 47)
+
+class TestParameterSweep(unittest.TestCase):
+    def test_sweep_matches_annual_simulation(self):
+        start = to_epoch_hour("2024-07-01", 0)
+        weather = WeatherData(np.arange(start, start + 24, dtype=np.int64),
+                              np.linspace(10, 32, 24).astype(np.float32),
+                              np.zeros(24, dtype=np.float32))
+        grid = parameter_grid([21, 22], [8.0, 10.0], [500.0],
+                              [((10, 5, 0), (500, 300, 100)),
+                               ((12, 6, 0), (400, 250, 80))])
+        sweep = run_sweep(grid, weather, processes=2)
+        self.assertEqual(len(sweep.table), 8)
+        self.assertGreater(sweep.runs_per_second, 0)
+        for row, (setpoint, U, C, thresholds, capacities) in zip(
+                sweep.table, grid):
+            expected = simulate_year(setpoint, weather, U=U, C=C,
+                                     thresholds=thresholds,
+                                     capacities=capacities)
+            self.assertEqual(row["setpoint"], setpoint)
+            self.assertEqual(row["energy"], expected.total_energy)
+
+class TestMinuteSeries(unittest.TestCase):
+    def setUp(self):
+        rows = [["2024-01-01 0:00", 0.0, 100],
+                ["2024-01-01 1:00", 6.0, 100],
+                ["2024-01-01 2:00", 6.0, 100],
+                ["2024-01-01 3:00", 0.0, 100]]
+        self.index = TemperatureIndex.from_rows(rows)
+        self.thermostat = ThermostatModel(rows)
+
+    def test_linear(self):
+        series = MinuteSeries(self.index)
+        self.assertEqual(series.temperatures.dtype, np.float32)
+        self.assertEqual(len(series), 3 * 60 + 1)
+        self.assertAlmostEqual(series.lookup("2024-01-01", 0, 30), 3.0)
+        self.assertAlmostEqual(series.lookup("2024-01-01", 3, 0), 0.0)
+        self.assertIsNone(series.lookup("2024-01-01", 3, 1))
+
+    def test_monotone_does_not_overshoot(self):
+        series = MinuteSeries(self.index, "monotone")
+        self.assertLessEqual(series.temperatures.max(), 6.0)
+        self.assertGreaterEqual(series.temperatures.min(), 0.0)
+        self.assertAlmostEqual(series.lookup("2024-01-01", 1, 0), 6.0)
+        minutes = [to_epoch_minute("2024-01-01", 1, m) for m in (0, 30)]
+        np.testing.assert_allclose(series.lookup_many(minutes), [6.0, 6.0])
+
+    def test_thermostat_minutes(self):
+        self.thermostat.set_date_time("2024-01-01", "0:45")
+        self.assertAlmostEqual(self.thermostat.get_outdoor_temperature(),
+                               4.5, places=5)
+        self.thermostat.set_date_time("2024-01-01", "1:15 am")
+        self.assertAlmostEqual(self.thermostat.get_outdoor_temperature(),
+                               6.0, places=5)
+
+class TestWeatherStream(unittest.TestCase):
+    def wait_for(self, stream, count):
+        deadline = time.monotonic() + 5
+        while stream.records_read < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(stream.records_read, count)
+
+    def test_ring_buffer_keeps_recent_hours(self):
+        buffer = RingBuffer(capacity=24)
+        start = to_epoch_hour("2024-01-01", 0)
+        for hour in range(100):
+            buffer.push(start + hour, float(hour))
+        self.assertEqual(buffer.hours.size, 24)
+        self.assertIsNone(buffer.get(start + 75))
+        self.assertEqual(buffer.get(start + 76), 76.0)
+        self.assertEqual(buffer.latest(), (start + 99, 99.0))
+        self.assertAlmostEqual(buffer.lookup("2024-01-04", 4, 30), 76.5)
+        self.assertIsNone(buffer.lookup("2024-01-04", 3, 30))
+
+    def test_tail_growing_csv(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "feed.csv")
+        with open(path, "w") as file:
+            file.write("DateTime,Temp,Hum\n2024-01-01 0:00,4.4,100\n")
+        stream = WeatherStream(CsvTail(path, poll_interval=0.01)).start()
+        self.addCleanup(stream.stop)
+        self.wait_for(stream, 1)
+        with open(path, "a") as file:
+            file.write("2024-01-01 1:00,4.7,100\n")
+        self.wait_for(stream, 2)
+
+        thermostat = ThermostatModel()
+        thermostat.load_data_from_stream(stream)
+        thermostat.set_date_time("2024-01-01", "1:00")
+        self.assertAlmostEqual(thermostat.get_outdoor_temperature(), 4.7,
+                               places=5)
+
+    def test_socket_feed(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "feed.csv")
+        with open(path, "w") as file:
+            for hour in range(30):
+                file.write(f"2024-01-02 {hour % 24}:00,{hour},50\n")
+        feed = LocalFeed(path)
+        stream = WeatherStream(SocketSource(port=feed.port), 8).start()
+        self.addCleanup(stream.stop)
+        self.wait_for(stream, 30)
+        self.assertEqual(stream.lookup("2024-01-02", 5), 29.0)
+
+class TestWeatherStore(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.store = WeatherStore(os.path.join(folder.name, "store"),
+                                  max_chunks=2)
+        for site, offset in (("ottawa", 0), ("vancouver", 10)):
+            path = os.path.join(folder.name, f"{site}.csv")
+            with open(path, "w") as file:
+                file.write("DateTime,Temp,Hum\n")
+                for year in (2022, 2023, 2024):
+                    for hour in range(3):
+                        file.write(f"{year}-06-01 {hour}:00,"
+                                   f"{year - 2000 + offset + hour},50\n")
+            self.store.import_csv(site, path)
+
+    def test_layout(self):
+        self.assertEqual(self.store.sites(), ["ottawa", "vancouver"])
+        self.assertEqual(self.store.years("ottawa"), [2022, 2023, 2024])
+        self.assertEqual(self.store.resident_chunks(), [])
+
+    def test_lazy_lru_chunks(self):
+        self.assertEqual(self.store.lookup("ottawa", "2023-06-01", 1), 24.0)
+        self.assertEqual(self.store.lookup("vancouver", "2024-06-01", 2),
+                         36.0)
+        self.assertEqual(self.store.lookup("ottawa", "2023-06-01", 2), 25.0)
+        self.assertEqual(self.store.loads, 2)
+        # A third chunk evicts the least recently used one
+        self.assertEqual(self.store.lookup("ottawa", "2022-06-01", 0), 22.0)
+        self.assertEqual(self.store.resident_chunks(),
+                         [("ottawa", 2023), ("ottawa", 2022)])
+        self.assertIsNone(self.store.lookup("ottawa", "2021-06-01", 0))
+
+    def test_lookup_many_across_years(self):
+        hours = [to_epoch_hour("2022-06-01", 0), to_epoch_hour("2024-06-01",
+                                                               1)]
+        np.testing.assert_array_equal(
+            self.store.lookup_many("vancouver", hours), [32.0, 35.0])
+
+    def test_thermostat_site(self):
+        thermostat = ThermostatModel()
+        thermostat.load_data_from_store(self.store, "vancouver")
+        thermostat.set_date_time("2023-06-01", "0:30")
+        self.assertAlmostEqual(thermostat.get_outdoor_temperature(), 33.5)
+
+    def test_reimport_keeps_open_chunks(self):
+        data = self.store.chunk("ottawa", 2023)
+        path = os.path.join(os.path.dirname(self.store.root), "new.csv")
+        with open(path, "w") as file:
+            file.write("DateTime,Temp,Hum\n")
+            for hour in range(3):
+                file.write(f"2023-06-01 {hour}:00,{40 + hour},50\n")
+        self.store.import_csv("ottawa", path)
+        # The open chunk still reads its old content, the store the new one
+        np.testing.assert_array_equal(data.temperature, [23.0, 24.0, 25.0])
+        self.assertEqual(self.store.lookup("ottawa", "2023-06-01", 1), 41.0)
+
+    def test_minutes_across_new_year(self):
+        path = os.path.join(os.path.dirname(self.store.root), "winter.csv")
+        with open(path, "w") as file:
+            file.write("DateTime,Temp,Hum\n"
+                       "2023-12-31 22:00,1,50\n2023-12-31 23:00,2,50\n"
+                       "2024-01-01 0:00,4,50\n2024-01-01 1:00,5,50\n")
+        self.store.import_csv("winter", path)
+        single = load_weather(path).minutes()
+        for date, hour, minute in (("2023-12-31", 22, 30),
+                                   ("2023-12-31", 23, 30),
+                                   ("2023-12-31", 23, 45),
+                                   ("2024-01-01", 0, 30)):
+            self.assertEqual(self.store.lookup("winter", date, hour, minute),
+                             single.lookup(date, hour, minute))
+        self.assertEqual(self.store.lookup("winter", "2023-12-31", 23, 30),
+                         3.0)
+
+class TestEvents(unittest.TestCase):
+    def test_subscribers_called_in_order(self):
+        event = Event()
+        calls = []
+        event.subscribe(lambda value: calls.append(("first", value)))
+        second = event.subscribe(lambda value: calls.append(("second", value)))
+        event.emit(1)
+        event.unsubscribe(second)
+        event.emit(2)
+        self.assertEqual(calls, [("first", 1), ("second", 1), ("first", 2)])
+
+    def test_failing_subscriber_does_not_stop_others(self):
+        event = Event()
+        calls = []
+        event.subscribe(lambda: 1 / 0)
+        event.subscribe(lambda: calls.append("called"))
+        event.emit()
+        self.assertEqual(calls, ["called"])
+
+    def test_controller_follows_furnace_events(self):
+        controller = ThermostatController()
+        controller.furnace = FurnaceModel()
+        controller.aircon = AirConditionerModel()
+        controller.furnace.speedup = None
+        controller.furnace.stepped.subscribe(
+            controller.set_current_temperature_furnace)
+        controller.furnace.finished.subscribe(controller.furnace_finished)
+        changes = []
+        controller.state_changed.subscribe(
+            lambda state: changes.append(state.current_temp))
+        done = threading.Event()
+        controller.furnace.finished.subscribe(lambda reached: done.set())
+
+        controller.current_temp = 15
+        controller.setpoint = 22
+        controller.control_temperature()
+        self.assertTrue(done.wait(5))
+
+        trajectory = simulate(15, 22)
+        # One change when heating starts, one per step and one at the end
+        self.assertEqual(len(changes), len(trajectory) + 2)
+        self.assertEqual(controller.current_temp, trajectory.temperatures[-1])
+        self.assertEqual(controller.rec_rm_temp, controller.current_temp)
+        self.assertEqual(controller.furnace_status, "Off")
+
+
+class TestControlWorker(unittest.TestCase):
+    def setUp(self):
+        self.controller = ThermostatController()
+        self.addCleanup(self.controller.shutdown, 5)
+        self.runs = []
+        run = self.controller.control_temperature
+        def counted_run(cancel=None):
+            self.runs.append(self.controller.setpoint)
+            return run(cancel)
+        self.controller.control_temperature = counted_run
+
+    def wait_for_step(self, setpoint, timeout=5):
+        # Wait for a heating step towards the given setpoint
+        stepped = threading.Event()
+        def on_step(current_temp, q_furnace):
+            if self.controller.setpoint == setpoint:
+                stepped.set()
+        self.controller.furnace.stepped.subscribe(on_step)
+        try:
+            return stepped.wait(timeout)
+        finally:
+            self.controller.furnace.stepped.unsubscribe(on_step)
+
+    def test_burst_of_setpoints_is_coalesced(self):
+        threads = threading.active_count()
+        # Outdoor temperature 4.4, heating at 1x (one step every 2 s)
+        self.controller.start_operation_heating_cooling(
+            22, "2024-01-01", "0:00")
+        for setpoint in np.arange(22, 25.5, 0.5):
+            self.controller.set_setpoint(float(setpoint))
+        self.assertTrue(self.wait_for_step(25.0))
+        self.assertLessEqual(len(self.runs), 3)
+        self.assertEqual(self.runs[-1], 25.0)
+        self.assertLessEqual(threading.active_count(), threads + 1)
+
+    def test_failed_command_keeps_the_worker(self):
+        # Before `initialize` there is no thermostat to pass the setpoint to
+        self.assertFalse(self.controller.apply_command("setpoint", 23))
+        stopped = threading.Event()
+        self.controller.state_changed.subscribe(lambda state: stopped.set())
+        self.controller.set_setpoint(23)
+        worker = self.controller._worker
+        self.controller.stop()
+        self.assertTrue(stopped.wait(5))
+        self.assertIs(self.controller._worker, worker)
+        self.assertTrue(worker.is_alive())
+
+    def test_setpoint_change_within_one_step(self):
+        self.controller.start_operation_heating_cooling(
+            22, "2024-01-01", "0:00")
+        self.assertTrue(self.wait_for_step(22))
+        started = time.monotonic()
+        self.controller.set_setpoint(24)
+        self.assertTrue(self.wait_for_step(24))
+        self.assertLess(time.monotonic() - started,
+                        self.controller.furnace.dt)
+
+    def test_stop_and_shutdown(self):
+        self.controller.start_operation_heating_cooling(
+            22, "2024-01-01", "0:00")
+        self.assertTrue(self.wait_for_step(22))
+        self.controller.stop()
+        worker = self.controller._worker
+        self.controller.shutdown(1)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(self.controller.furnace_status, "Off")
+        self.assertLess(self.controller.current_temp, 22)
+
+
+class TestAsyncRuntime(unittest.TestCase):
+    def test_hundreds_of_zones_as_tasks(self):
+        starts = np.linspace(10, 30, 300)
+        threads = threading.active_count()
+        finals = asyncio.run(run_zones(starts, 22, speedup=None))
+        self.assertEqual(threading.active_count(), threads)
+        for start, final in zip(starts[::50], finals[::50]):
+            self.assertEqual(final, simulate(start, 22).temperatures[-1])
+
+    def test_ingest_socket(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "feed.csv")
+            with open(path, "w") as file:
+                file.write("Date,Temperature,Humidity\n"
+                           "2024-01-04 3:00,75,40\n2024-01-04 4:00,78,40\n")
+            feed = LocalFeed(path)
+            buffer = RingBuffer(24)
+            count = asyncio.run(ingest_socket(buffer, port=feed.port))
+        self.assertEqual(count, 2)
+        self.assertAlmostEqual(buffer.lookup("2024-01-04", 3, 30), 76.5)
+
+    def test_control_commands_cancel_task(self):
+        async def scenario():
+            controller = ThermostatController()
+            control = AsyncControl(controller)
+            loop_task = asyncio.ensure_future(control.run())
+            # Outdoor temperature 4.4, heating at 1x (one step every 2 s)
+            controller.start_operation_heating_cooling(
+                22, "2024-01-01", "0:00")
+            stepped = asyncio.Event()
+            controller.furnace.stepped.subscribe(
+                lambda temp, q: controller.setpoint == 24 and stepped.set())
+            await asyncio.sleep(0.1)
+            started = asyncio.get_running_loop().time()
+            for setpoint in (23, 23.5, 24):
+                controller.set_setpoint(setpoint)
+            await asyncio.wait_for(stepped.wait(), 5)
+            elapsed = asyncio.get_running_loop().time() - started
+            control.submit(None)
+            await loop_task
+            return controller, elapsed
+
+        threads = threading.active_count()
+        controller, elapsed = asyncio.run(scenario())
+        self.assertLess(elapsed, controller.furnace.dt)
+        self.assertIsNone(controller.runtime)
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_model_clock_drives_async_runs(self):
+        async def scenario():
+            controller = ThermostatController()
+            controller.clock = DiscreteClock()
+            control = AsyncControl(controller)
+            loop_task = asyncio.ensure_future(control.run())
+            finished = asyncio.Event()
+            # At 1x on the wall clock this run would take minutes
+            controller.initialize(22, "2024-01-01", "0:00")
+            controller.furnace.finished.subscribe(lambda reached:
+                                                  finished.set())
+            controller.submit("setpoint", 22)
+            await asyncio.wait_for(finished.wait(), 5)
+            control.submit(None)
+            await loop_task
+            return controller
+
+        controller = asyncio.run(scenario())
+        trajectory = simulate(controller.temp_out, 22)
+        self.assertEqual(controller.current_temp,
+                         trajectory.temperatures[-1])
+        self.assertEqual(controller.clock.now(), trajectory.duration)
+
+    def test_restart_cancels_the_run(self):
+        async def scenario():
+            controller = ThermostatController()
+            control = AsyncControl(controller)
+            loop_task = asyncio.ensure_future(control.run())
+            controller.start_operation_heating_cooling(
+                22, "2024-01-01", "0:00")
+            await asyncio.sleep(0.1)
+            first, furnace = control.task, controller.furnace
+            steps = []
+            furnace.stepped.subscribe(lambda temp, q: steps.append(temp))
+            # The run is cancelled before its models are replaced
+            initialize = controller.initialize
+            def checked_initialize(*args):
+                self.assertTrue(first.cancelling())
+                initialize(*args)
+            controller.initialize = checked_initialize
+            controller.start_operation_heating_cooling(
+                24, "2024-01-01", "0:00")
+            controller.initialize = initialize
+            await asyncio.sleep(0.1)
+            running = control.task
+            control.submit(None)
+            await loop_task
+            return first, furnace, controller, steps, running
+
+        first, furnace, controller, steps, running = asyncio.run(scenario())
+        self.assertTrue(first.cancelled())
+        self.assertIsNot(running, first)
+        self.assertIsNot(controller.furnace, furnace)
+        self.assertEqual(steps, [])  # The old run stopped driving its model
+
+    def test_qt_bridge_runs_tasks(self):
+        app = QApplication.instance() or QApplication([])
+        bridge = QtEventLoop(app)
+        task = bridge.create_task(run_zones([15, 30], 22, speedup=1000))
+        task.add_done_callback(lambda task: bridge.stop())
+        QTimer.singleShot(5000, bridge.stop)
+        bridge.run()
+        bridge.close()
+        self.assertTrue(task.done())
+        self.assertGreaterEqual(task.result()[0], 22)
+
+    def test_qt_bridge_reads_sockets(self):
+        app = QApplication.instance() or QApplication([])
+        bridge = QtEventLoop(app)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "feed.csv")
+            with open(path, "w") as file:
+                file.write("Date,Temperature,Humidity\n"
+                           "2024-01-04 3:00,75,40\n2024-01-04 4:00,78,40\n")
+            feed = LocalFeed(path)
+            buffer = RingBuffer(24)
+            tasks = []
+
+            def start():
+                # From a Qt slot, between two passes of the asyncio loop
+                task = bridge.create_task(ingest_socket(buffer,
+                                                        port=feed.port))
+                task.add_done_callback(lambda task: bridge.stop())
+                tasks.append(task)
+
+            QTimer.singleShot(0, start)
+            QTimer.singleShot(5000, bridge.stop)
+            bridge.run()
+            bridge.close()
+        self.assertEqual(tasks[0].result(), 2)
+        self.assertAlmostEqual(buffer.lookup("2024-01-04", 3, 30), 76.5)
+
+
+class TestZones(unittest.TestCase):
+    def test_controller_rooms_are_zone_slices(self):
+        controller = ThermostatController()
+        controller.kitchen_temp = 19
+        controller.rec_rm_damper = 40
+        controller.publish()
+        self.assertEqual(controller.zones.temperature[
+            controller.zones.index["kitchen"]], 19)
+        self.assertEqual(controller.ground_floor()[8:10], [19, 100])
+        self.assertEqual(controller.basement()[6:8], [22, 40])
+        controller.update_room_temperatures(18.5)
+        self.assertEqual(controller.system_overview()[:9], [18.5] * 9)
+        self.assertEqual(controller.kitchen_temp, 18.5)
+
+    def test_step_matches_simulation(self):
+        zones = ZoneState([f"zone_{i}" for i in range(500)])
+        zones.set_temperatures(np.linspace(10, 35, 500))
+        zones.setpoint[::2] = 24
+        starts = zones.temperature.copy()
+        q = zones.step()
+        for i in (0, 1, 137, 250, 499):
+            trajectory = simulate(starts[i], zones.setpoint[i])
+            if len(trajectory):
+                self.assertEqual(zones.temperature[i],
+                                 trajectory.temperatures[1])
+                self.assertEqual(q[i], trajectory.capacities[0])
+            else:
+                self.assertEqual(zones.temperature[i], starts[i])
+                self.assertEqual(q[i], 0)
+
+    def test_floors(self):
+        zones = ZoneState(HOUSE_ZONES, HOUSE_FLOORS)
+        zones.set_temperatures(20, zones.floors["basement"])
+        self.assertEqual(zones.floor("ground", ("temperature",)).tolist(),
+                         [22] * 5)
+        self.assertEqual(zones.temperature[zones.ids(["bdrm_3", "living"])]
+                         .tolist(), [20, 22])
+
+
+class TestStateSnapshot(unittest.TestCase):
+    def test_published_as_a_whole(self):
+        controller = ThermostatController()
+        snapshot = controller.snapshot
+        controller.temp_out = 5
+        controller.setpoint = 24
+        self.assertIs(controller.snapshot, snapshot)
+        self.assertEqual(snapshot.ground_floor()[-2:], (22, 27))
+        controller.publish()
+        self.assertEqual(controller.snapshot.version, snapshot.version + 1)
+        self.assertEqual(controller.ground_floor()[-2:], [24, 5])
+        with self.assertRaises(AttributeError):
+            controller.snapshot.version = 0
+
+    def test_appliance_status_strings(self):
+        controller = ThermostatController()
+        controller.clock = DiscreteClock()
+        controller.initialize(22, "2024-01-01", "0:00")
+        controller.furnace.speedup = None
+        statuses = set()
+        controller.state_changed.subscribe(lambda state: statuses.add(
+            (state.snapshot.mechanical_room()[0],
+             state.snapshot.mechanical_room()[2])))
+        controller.control_temperature()
+        controller.setpoint = 15
+        controller.control_temperature()
+        self.assertEqual(statuses, {("On", "Off"), ("Off", "Off"),
+                                    ("Off", "On")})
+
+    def test_idle_refresh_skips_work(self):
+        import gui
+        app = QApplication.instance() or QApplication([])
+        controller = ThermostatController()
+        window = gui.MainWindow(controller)
+        window.overview_tab.update_tab = MagicMock()
+        window.update_tab()
+        window.update_tab()
+        self.assertEqual(window.overview_tab.update_tab.call_count, 1)
+        controller.update_room_temperatures(20)
+        app.processEvents()
+        self.assertEqual(window.overview_tab.update_tab.call_count, 2)
+        window.overview_tab.update_tab.assert_called_with(controller.snapshot)
+
+
+class TestFleet(unittest.TestCase):
+    def test_homes_match_single_runs(self):
+        setpoints = np.array([22, 25, 2, 60])
+        fleet = Fleet(len(setpoints), setpoints)
+        fleet.start("2024-01-01", 0)  # Outdoor temperature 4.4
+        start = fleet.outdoor
+        self.assertAlmostEqual(start, 4.4, places=5)
+        fleet.run(200)
+        for i, setpoint in enumerate(setpoints):
+            trajectory = simulate(start, setpoint)
+            self.assertEqual(fleet.steps[i], len(trajectory))
+            self.assertEqual(fleet.energy[i], trajectory.energy)
+            self.assertEqual(fleet.temperature[i],
+                             trajectory.temperatures[-1])
+        self.assertEqual(fleet.reached.tolist(), [True, True, True, False])
+        self.assertTrue(fleet.stalled[3])
+
+    def test_throughput(self):
+        fleet = Fleet(10000, np.linspace(19, 25, 10000))
+        fleet.start("2024-07-01", 12)
+        self.assertGreater(fleet.run(100), 0)
+        self.assertEqual(fleet.ticks, 100)
+
+
+class TestHeadless(unittest.TestCase):
+    def test_controller_does_not_import_qt(self):
+        result = subprocess.run(
+            [sys.executable, "-c",
+             "import sys, controller; print('PyQt5' in sys.modules)"],
+            capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_run_writes_state_lines(self):
+        output = io.StringIO()
+        controller = hvac.run(22, "2024-01-01", "0:00", output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(records), len(simulate(records[0]["temp_out"],
+                                                    22)) + 3)
+        self.assertEqual(records[-1]["version"], controller.snapshot.version)
+        self.assertEqual(records[-1]["current_temp"], controller.current_temp)
+        self.assertEqual(records[-1]["furnace_status"], "Off")
+
+    def test_date_outside_the_weather_data(self):
+        result = subprocess.run(
+            [sys.executable, "-m", "hvac", "run", "--date", "2030-01-01"],
+            capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("Unable to retrieve outdoor temperature", result.stderr)
+        self.assertNotIn("Traceback", result.stderr)
+
+
+class TestStartup(unittest.TestCase):
+    def test_profiler_times_phases_and_imports(self):
+        profiler = StartupProfiler()
+        profiler.install()
+        try:
+            with profiler.phase("import"):
+                import wave  # Not loaded by the other tests
+        finally:
+            profiler.uninstall()
+        profiler.mark("first paint")
+        self.assertEqual([phase[0] for phase in profiler.phases], ["import"])
+        self.assertIn("wave", [module[0] for module in profiler.imports])
+        self.assertGreaterEqual(profiler.marks["first paint"],
+                                profiler.phases[0][2])
+        output = io.StringIO()
+        profiler.report(output)
+        self.assertIn("first paint", output.getvalue())
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = StartupProfiler(enabled=False)
+        profiler.install()
+        with profiler.phase("import"):
+            pass
+        profiler.mark("first paint")
+        self.assertEqual((profiler.phases, profiler.marks), ([], {}))
+
+    def test_scaled_pixmap_is_cached(self):
+        app = QApplication.instance() or QApplication([])
+        first = scaled_pixmap("Symbols/numeric.png", 40, 40)
+        self.assertIs(scaled_pixmap("Symbols/numeric.png", 40, 40), first)
+        self.assertLessEqual(first.width(), 40)
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.output = io.StringIO()
+        self.addCleanup(logger.setup)  # Back to stderr
+        self.log = logger.get_logger("test")
+
+    def test_fields_and_sampling(self):
+        logger.setup(self.output)
+        for i in range(20):
+            self.log.info("Step.", zone="house", temp=i, every=10)
+        logger.flush()
+        lines = self.output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith("hvac.test: Step. zone=house temp=0"))
+        self.assertTrue(lines[1].endswith("temp=10 suppressed=9"))
+
+    def test_rate_limit_per_call_site(self):
+        logger.setup(self.output, json_lines=True)
+        for i in range(50):
+            self.log.info("Hot loop.", temp=i, per_second=3)
+            self.log.info("Other site.", temp=i, per_second=1)
+        logger.flush()
+        records = [json.loads(line)
+                   for line in self.output.getvalue().splitlines()]
+        self.assertEqual([record["temp"] for record in records
+                          if record["message"] == "Hot loop."], [0, 1, 2])
+        self.assertEqual(sum(record["message"] == "Other site."
+                             for record in records), 1)
+        self.assertEqual(records[0]["level"], "INFO")
+
+    def test_slow_output_does_not_block(self):
+        release = threading.Event()
+
+        class SlowStream(io.StringIO):
+            def write(self, text):
+                release.wait(5)
+                return super().write(text)
+
+        writer = logger.QueueWriter(logging.StreamHandler(SlowStream()),
+                                    size=5)
+        started = time.perf_counter()
+        for i in range(100):
+            writer.handle(logging.makeLogRecord({"msg": "Step %d",
+                                                 "args": (i,)}))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertGreaterEqual(writer.dropped, 90)
+        release.set()
+        writer.close()
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.latency = self.registry.get(metrics.Histogram, "test_seconds",
+                                         "Test latency", {"tab": "ground"},
+                                         (0.1, 1))
+
+    def test_render_prometheus_text(self):
+        for value in (0.05, 0.5, 0.5, 3):
+            self.latency.observe(value)
+        self.registry.get(metrics.Counter, "test_total", "Tests").inc(2)
+        text = self.registry.render()
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{tab="ground",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{tab="ground",le="1.0"} 3', text)
+        self.assertIn('test_seconds_bucket{tab="ground",le="+Inf"} 4', text)
+        self.assertIn('test_seconds_sum{tab="ground"} 4.05', text)
+        self.assertIn("test_total 2", text)
+        with self.assertRaises(ValueError):
+            self.registry.get(metrics.Gauge, "test_total", "Tests")
+
+    def test_counts_from_many_threads(self):
+        count = self.registry.get(metrics.Counter, "test_total", "Tests")
+        threads = [threading.Thread(target=lambda: [
+            (count.inc(), self.latency.observe(0.01)) for _ in range(10000)])
+            for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(count.value, 40000)
+        self.assertEqual(self.latency.count, 40000)
+
+    def test_observe_under_a_microsecond(self):
+        observe = self.latency.observe
+        best = float("inf")
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(10000):
+                observe(0.0003)
+            best = min(best, (time.perf_counter() - started) / 10000)
+        self.assertLess(best, 1e-6)
+
+    def test_endpoint_and_file_dump(self):
+        self.latency.observe(0.2)
+        server = metrics.serve(0, registry=self.registry)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            self.assertIn("text/plain", response.headers["Content-Type"])
+            self.assertIn('test_seconds_count{tab="ground"} 1',
+                          response.read().decode())
+
+        path = os.path.join(tempfile.mkdtemp(), "metrics.prom")
+        dump = metrics.FileDump(path, interval=60, registry=self.registry)
+        dump.start()
+        dump.shutdown()  # Writes once on the way out
+        with open(path) as file:
+            self.assertEqual(file.read(), self.registry.render())
+
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def test_segments_roll_over_and_range_query(self):
+        recorder = TelemetryRecorder(self.root, batch_rows=64,
+                                     segment_bytes=20000)
+        temperatures = np.arange(len(HOUSE_ZONES), dtype=np.float32)
+        for i in range(1000):
+            recorder.append(100.0 + i, version=i, temperature=temperatures,
+                            mode=1)
+        recorder.close()
+
+        history = TelemetryHistory(self.root)
+        self.assertGreater(len(history.segments), 1)
+        self.assertEqual(len(history), 1000)
+        rows = history.meta(history.segments[0])["rows"]
+        # Closed segments are plain .npy files of the rows written
+        times = np.load(os.path.join(history.segments[0], "time.npy"))
+        np.testing.assert_array_equal(times, 100.0 + np.arange(rows))
+
+        selected = history.range(100.0 + rows - 5, 100.0 + rows + 5)
+        np.testing.assert_array_equal(selected["version"],
+                                      np.arange(rows - 5, rows + 5))
+        self.assertEqual(selected["temperature"].shape,
+                         (10, len(HOUSE_ZONES)))
+        self.assertEqual(len(history.range(5000, 6000)["time"]), 0)
+        recorder = TelemetryRecorder(self.root)
+        recorder.append(10.0)
+        with self.assertRaises(ValueError):
+            recorder.append(5.0)  # Out of time order
+
+    def test_records_controller_state_changes(self):
+        output = io.StringIO()
+        controller = hvac.run(22, "2024-01-01", "0:00", output,
+                              telemetry=self.root)
+        history = TelemetryHistory(self.root).range()
+        self.assertEqual(len(history["time"]),
+                         len(output.getvalue().splitlines()))
+        self.assertTrue(np.all(np.diff(history["time"]) >= 0))
+        self.assertAlmostEqual(float(history["current_temp"][-1]),
+                               controller.current_temp, places=4)
+        self.assertEqual(history["furnace_status"][1], 1)
+        self.assertEqual(history["mode"][-1], HEATING)
+
+    def test_many_appends_read_back(self):
+        recorder = TelemetryRecorder(self.root)
+        temperatures = np.full(len(HOUSE_ZONES), 21.5, dtype=np.float32)
+        for i in range(50000):
+            recorder.append(i * 1e-5, version=i, temperature=temperatures,
+                            damper=100, furnace_status=1, mode=1)
+        recorder.close()
+        self.assertEqual(recorder.samples, 50000)
+        history = TelemetryHistory(self.root).range()
+        np.testing.assert_array_equal(history["version"], np.arange(50000))
+        self.assertTrue((history["temperature"] == 21.5).all())
+        self.assertTrue((history["furnace_status"] == 1).all())
+
+
+class TestReplay(unittest.TestCase):
+    def record_session(self, path):
+        # Commands land in the middle of runs at 500x (one step every 4 ms)
+        controller = ThermostatController()
+        controller.speedup = 500
+        recorder = SessionRecorder(path, controller.speedup)
+        recorder.attach(controller)
+        states = self.follow(controller)
+        controller.start_operation_heating_cooling(22.0, "2024-01-01", "0:00")
+        time.sleep(0.05)
+        controller.set_setpoint(24.0)
+        time.sleep(0.03)
+        controller.set_date_time("2024-07-01", "14:30")
+        controller.set_setpoint(21.5)
+        time.sleep(0.05)
+        controller.stop()
+        controller.set_setpoint(23.0)
+        time.sleep(0.3)
+        controller.shutdown(5)
+        recorder.close()
+        return states
+
+    def follow(self, controller):
+        states = []
+        controller.state_changed.subscribe(
+            lambda state: states.append(hvac.state_record(state)))
+        return states
+
+    def test_replay_is_identical_to_recording(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "session.rec")
+            recorded = self.record_session(path)
+            session = SessionLog(path)
+            self.assertEqual([entry.kind for entry in session.inputs],
+                             ["start", "setpoint", "setpoint", "datetime",
+                              "setpoint", "stop", "setpoint"])
+            self.assertLess(os.path.getsize(path), 300)
+            for _ in range(2):
+                controller = ThermostatController()
+                states = self.follow(controller)
+                started = time.perf_counter()
+                replay(path, controller=controller)
+                self.assertLess(time.perf_counter() - started, 0.5)
+                self.assertEqual(states, recorded)
+
+    def test_replay_at_multiplier(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "session.rec")
+            recorded = self.record_session(path)
+            last = SessionLog(path).inputs[-1].offset
+            controller = ThermostatController()
+            states = self.follow(controller)
+            started = time.monotonic()
+            replay(path, 4, controller)
+            self.assertGreaterEqual(time.monotonic() - started, last / 4)
+            self.assertEqual(controller.speedup, 2000)
+            self.assertEqual(states, recorded)
+
+    def test_partial_record_is_left_out(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "session.rec")
+            self.record_session(path)
+            inputs = SessionLog(path).inputs
+            with open(path, "r+b") as file:
+                file.truncate(os.path.getsize(path) - 3)
+            self.assertEqual(SessionLog(path).inputs, inputs[:-1])
+
+
+class TestClock(unittest.TestCase):
+    def test_discrete_clock_runs_timers_in_order(self):
+        clock = DiscreteClock()
+        calls = []
+        clock.call_at(5, lambda: calls.append(("b", clock.now())))
+        clock.call_later(2, lambda: calls.append(("a", clock.now())))
+        clock.call_at(5, lambda: calls.append(("c", clock.now())))
+        clock.sleep(4)
+        self.assertEqual(calls, [("a", 2)])
+        self.assertEqual(clock.now(), 4)
+        clock.sleep(10)
+        self.assertEqual(calls, [("a", 2), ("b", 5), ("c", 5)])
+        self.assertEqual(clock.now(), 14)
+
+    def test_timer_cancels_playback_at_exact_step(self):
+        clock = DiscreteClock()
+        cancel = threading.Event()
+        clock.call_at(7, cancel.set)  # During the fourth step (6 s to 8 s)
+        trajectory = simulate(15, 22)
+        playback = Playback(trajectory, 1.0, cancel, clock)
+        samples = list(playback)
+        self.assertTrue(playback.cancelled)
+        self.assertEqual([sample[0] for sample in samples], [2, 4, 6, 8])
+        self.assertEqual(clock.now(), 7)
+
+    def test_scaled_clock(self):
+        clock = ScaledClock(100)
+        started = time.monotonic()
+        clock.sleep(2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.02)
+        self.assertGreaterEqual(clock.now(), 2)
+        cancel = threading.Event()
+        cancel.set()
+        self.assertTrue(clock.wait_until(clock.now() + 60, cancel))
+        self.assertIsInstance(clock_for(1.0), RealTimeClock)
+        self.assertIsInstance(clock_for(None), DiscreteClock)
+        with self.assertRaises(ValueError):
+            ScaledClock(0)
+
+    def test_controller_on_discrete_clock(self):
+        controller = ThermostatController()
+        controller.clock = DiscreteClock()
+        controller.initialize(22, "2024-01-01", "0:00")
+        started = time.monotonic()
+        self.assertTrue(controller.control_temperature())
+        self.assertLess(time.monotonic() - started, 1)
+        trajectory = simulate(controller.temp_out, 22)
+        self.assertEqual(controller.clock.now(),
+                         len(trajectory) * trajectory.dt)
+        self.assertEqual(controller.current_temp, trajectory.temperatures[-1])
+
+
+class TestControl(unittest.TestCase):
+    def setUp(self):
+        # Two days of readings from -15°C to 30°C
+        start = to_epoch_hour("2024-01-31", 0)
+        self.weather = WeatherData(
+            np.arange(start, start + 48, dtype=np.int64),
+            np.linspace(-15, 30, 48).astype(np.float32),
+            np.zeros(48, dtype=np.float32))
+
+    def test_staged_matches_simulation(self):
+        staged = StagedControl().run(4.4, 22)
+        trajectory = simulate(4.4, 22)
+        np.testing.assert_array_equal(staged.temperatures,
+                                      trajectory.temperatures)
+        result = simulate_year(22, self.weather, control=StagedControl())
+        np.testing.assert_array_equal(result.energy,
+                                      simulate_year(22, self.weather).energy)
+
+    def test_modulated_runs_reach_setpoint(self):
+        for control in (PIDControl(), MPCControl()):
+            for start, set_temp in ((4.4, 22), (30, 22)):
+                run = control.run(start, set_temp)
+                self.assertTrue(run.reached)
+                self.assertLessEqual(abs(run.temperatures[-1] - set_temp),
+                                     control.tolerance)
+                self.assertLessEqual(run.capacities.max(), 500)
+                self.assertGreaterEqual(run.capacities.min(), 0)
+        # Near the setpoint the MPC backs off instead of overshooting
+        run = MPCControl().run(4.4, 22)
+        self.assertLessEqual(run.temperatures.max(), 22)
+        self.assertLess(run.capacities[-1], 100)
+
+    def test_mpc_gains_follow_the_model(self):
+        mpc = MPCControl()
+        self.assertEqual(mpc.gains.shape, (mpc.horizon,))
+        self.assertGreater(mpc.gain, 10)  # Above U, the loop is stable
+        np.testing.assert_allclose(mpc.decide(np.array([1.0, 3.0]), None),
+                                   [mpc.gain, 3 * mpc.gain])
+
+        # A home with other U/C gets the gains of its own model, once
+        default = mpc.gain
+        run = mpc.run(4.4, 22, U=20, C=800)
+        own = MPCControl(U=20, C=800)
+        self.assertNotEqual(mpc.gain, default)
+        self.assertEqual(mpc.gain, own.gain)
+        np.testing.assert_array_equal(
+            run.temperatures, own.run(4.4, 22, U=20, C=800).temperatures)
+        self.assertIs(mpc.model_gains(20, 800), mpc.model_gains(20, 800))
+
+    def test_feedback_control_is_abstract(self):
+        with self.assertRaises(TypeError):
+            FeedbackControl()
+
+    def test_annual_comparison(self):
+        results = compare(22, self.weather)
+        self.assertEqual([name for name, _, _ in results],
+                         ["staged", "pid", "mpc"])
+        staged = results[0][1]
+        for name, result, elapsed in results:
+            self.assertEqual(len(result), 48)
+            self.assertTrue(result.reached[result.modes != 0].all())
+            self.assertGreater(elapsed, 0)
+        for name, result, elapsed in results[1:]:
+            self.assertLess(result.total_energy, staged.total_energy)
+
+    def test_controller_control_mode(self):
+        controller = ThermostatController()
+        controller.clock = DiscreteClock()
+        controller.control = MPCControl()
+        controller.initialize(22, "2024-01-01", "0:00")
+        self.assertTrue(controller.control_temperature())
+        self.assertAlmostEqual(controller.current_temp, 22, delta=0.1)
+        self.assertNotIn(controller.furnace_energy, (100, 300, 500))
+
+
+class TestPredictor(unittest.TestCase):
+    def test_matches_stepped_runs(self):
+        # Heating, cooling, idle and stalled runs (losses above 500 BTU)
+        rng = np.random.default_rng(1)
+        starts = rng.uniform(-40, 45, 20000)
+        setpoints = rng.uniform(16, 28, 20000)
+        stepped = simulate_batch(starts, setpoints, record=False)
+        predicted = predict(starts, setpoints)
+        np.testing.assert_array_equal(predicted.steps, stepped.steps)
+        np.testing.assert_array_equal(predicted.energy, stepped.energy)
+        np.testing.assert_array_equal(predicted.reached, stepped.reached)
+        np.testing.assert_allclose(predicted.final_temps, stepped.final_temps,
+                                   atol=1e-8)
+        self.assertFalse(predicted.reached.all())
+
+    def test_max_steps_across_stages(self):
+        rng = np.random.default_rng(4)
+        starts = rng.uniform(-40, 45, 20000)
+        setpoints = rng.uniform(16, 28, 20000)
+        for max_steps in (1, 50, 120):
+            stepped = simulate_batch(starts, setpoints, max_steps=max_steps)
+            predicted = predict(starts, setpoints, max_steps=max_steps)
+            self.assertEqual(predicted.steps.max(), max_steps)
+            np.testing.assert_array_equal(predicted.steps, stepped.steps)
+            np.testing.assert_array_equal(predicted.energy, stepped.energy)
+            np.testing.assert_array_equal(predicted.reached, stepped.reached)
+            np.testing.assert_allclose(predicted.final_temps,
+                                       stepped.final_temps, atol=1e-8)
+
+    def test_stage_schedule(self):
+        trajectory = simulate(4.4, 22)
+        prediction = predict(4.4, 22)
+        schedule = [int(np.sum(trajectory.capacities == capacity))
+                    for capacity in (500, 300, 100)]
+        self.assertEqual(prediction.schedule.tolist(), schedule)
+        self.assertEqual(prediction.seconds, trajectory.duration)
+        self.assertEqual(prediction.stage_starts.tolist(),
+                         [0, schedule[0] * 2, (schedule[0] + schedule[1]) * 2])
+        # Outdoor temperature above the setpoint: cooling mode, no heating
+        self.assertEqual(predict(4.4, 22, outdoor_temps=25).steps, 0)
+
+    def test_arrays_of_homes(self):
+        U = np.array([8.0, 10.0, 12.0])
+        C = np.array([400.0, 500.0, 700.0])
+        prediction = predict(0.0, 21, U=U, C=C)
+        for i in range(3):
+            run = simulate(0.0, 21, U=U[i], C=C[i])
+            self.assertEqual(prediction.steps[i], len(run))
+            self.assertEqual(prediction.energy[i], run.energy)
+
+    def test_controller_and_fleet(self):
+        controller = ThermostatController()
+        controller.clock = DiscreteClock()
+        controller.initialize(22, "2024-01-01", "0:00")
+        prediction = controller.predict_run()
+        trajectory = simulate(controller.current_temp, 22)
+        self.assertEqual(prediction.seconds, trajectory.duration)
+        self.assertEqual(prediction.energy, trajectory.energy)
+
+        fleet = Fleet(4, [22, 25, 2, 60])
+        fleet.start("2024-01-01", 0)
+        fleet.run(10)
+        steps, energy = fleet.steps.copy(), fleet.energy.copy()
+        remaining = fleet.predict()
+        fleet.run(200)
+        reached = fleet.reached
+        np.testing.assert_array_equal((fleet.steps - steps)[reached],
+                                      remaining.steps[reached])
+        np.testing.assert_array_equal((fleet.energy - energy)[reached],
+                                      remaining.energy[reached])
+
+
+class TestThermalNetwork(unittest.TestCase):
+    def test_house_conductances(self):
+        network = house_network(ZoneState(HOUSE_ZONES, HOUSE_FLOORS))
+        G = network.conductance.toarray()
+        np.testing.assert_array_equal(G, G.T)
+        np.testing.assert_array_equal(np.diag(G), 0)
+        self.assertEqual(network.names, HOUSE_ZONES)
+        # Every room is coupled to the rest of the house
+        self.assertTrue((G.sum(axis=1) > 0).all())
+        np.testing.assert_allclose(network.laplacian.sum(axis=1), 0)
+
+    def test_uniform_zones_follow_the_model(self):
+        # Identical open zones at one temperature stay together and step
+        # exactly like the single-zone runs of the furnace and air conditioner
+        network = grid_network(3, 4, 2)
+        for start, set_temp, sign in ((4.4, 22, 1), (30.0, 22, -1)):
+            trajectory = simulate(start, set_temp)
+            temperature = np.full(len(network), start)
+            for step, capacity in enumerate(trajectory.capacities, start=1):
+                network.step(temperature, set_temp, sign * capacity)
+                np.testing.assert_allclose(
+                    temperature, trajectory.temperatures[step], atol=1e-9)
+
+    def test_stable_at_large_steps(self):
+        from scipy.linalg import expm
+        # Coupling alone: a day per step settles on the mean, no overshoot
+        network = grid_network(10, 10, 10, U=0)
+        rng = np.random.default_rng(2)
+        start = rng.uniform(10, 30, len(network))
+        temperature = start.copy()
+        for _ in range(5):
+            network.step(temperature, 22, dt=86400)
+        np.testing.assert_allclose(temperature, start.mean(), atol=1e-6)
+
+        # Small steps agree with the exact solution of the whole network
+        network = house_network(ZoneState(HOUSE_ZONES, HOUSE_FLOORS))
+        start = np.linspace(10, 30, len(network))
+        damper = np.linspace(0, 100, len(network))
+        temperature = start.copy()
+        for _ in range(100):
+            network.step(temperature, 22, 100, damper, dt=0.02)
+        # dT/dt = A T + b per time step, solved with an augmented exponential
+        A = (np.diag(network.U) - network.laplacian.toarray()) \
+            / network.C[:, None]
+        b = (network.split(100, damper) - network.U * 22) / network.C
+        augmented = np.zeros((len(network) + 1, len(network) + 1))
+        augmented[:-1, :-1], augmented[:-1, -1] = A, b
+        exact = (expm(augmented) @ np.append(start, 1))[:-1]
+        np.testing.assert_allclose(temperature, exact, atol=1e-3)
+
+    def test_losses_limit_the_step(self):
+        network = grid_network(10, 10, 10)
+        self.assertEqual(network.max_dt, 100)  # h U/C = 1 at 50 time steps
+        for dt in (600, 86400):
+            with self.assertRaises(ValueError):
+                network.step(np.full(len(network), 20.0), 22, dt=dt)
+
+        # At the longest step the coupling never adds to the losses: the
+        # deviation from the setpoint grows at most by 1 + h U/C per step
+        rng = np.random.default_rng(3)
+        start = rng.uniform(10, 30, len(network))
+        temperature = start.copy()
+        for step in range(1, 6):
+            network.step(temperature, 22, dt=network.max_dt)
+            self.assertLessEqual(np.abs(temperature - 22).max(),
+                                 np.abs(start - 22).max() * 2 ** step + 1e-9)
+        self.assertTrue(np.isfinite(temperature).all())
+
+    def test_cached_factorization(self):
+        network = grid_network(10, 10, 10)
+        self.assertIs(network.factor(), network.factor())
+        self.assertIsNot(network.factor(dt=60), network.factor())
+        factor = network.factor()
+        network.set_conductance(0, 1, 0)
+        self.assertIsNot(network.factor(), factor)
+        self.assertEqual(network.conductance[0, 1], 0)
+
+    def test_controller_rooms(self):
+        controller = ThermostatController()
+        controller.clock = DiscreteClock()
+        controller.network = house_network(controller.zones)
+        controller.zones.damper[controller.zones.ids(["bdrm_3"])] = 0
+        controller.initialize(22, "2024-01-01", "0:00")
+        np.testing.assert_array_equal(controller.zones.temperature,
+                                      controller.temp_out)
+        controller.furnace.speedup = None
+        controller.control_temperature()
+
+        # The run stops on the mean of the rooms, reaching the setpoint
+        self.assertGreaterEqual(controller.current_temp, 22)
+        self.assertAlmostEqual(controller.zones.temperature.mean(),
+                               controller.current_temp, places=9)
+        # The closed room lags behind the heated rooms around it
+        self.assertLess(controller.bdrm_3_temp, controller.bdrm_2_temp)
+        self.assertLess(controller.bdrm_3_temp, controller.current_temp)
+
+
 """*********************Main Routine***************************************"""
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
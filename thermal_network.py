@@ -0,0 +1,236 @@
+"""***************************************************************************
+Title:          Thermal Network
+File:           thermal_network.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the multi-zone RC thermal network of the
+                Autonomous_HVAC_System. Every zone is a thermal capacity C
+                with the losses U of the U/C model of `simulation`, coupled
+                to the zones next to it and above/below it by conductances
+                kept in a sparse matrix, and heated or cooled by its share
+                of the supply air by damper position:
+
+                    C dT/dt = q - U (T_set - T) - L T
+
+                with L the Laplacian of the conductances and T_set the
+                setpoint the losses of the U/C model are measured against.
+                The losses are the same as in `simulate`, so identical zones
+                with open dampers step exactly like it, and with the same U
+                and C everywhere and a damper open the mean zone temperature
+                is the indoor temperature of the control loop. The coupling
+                is implicit (backward Euler) and stable at any time step.
+                The losses are explicit like in `simulate`, which limits a
+                step to h U/C <= 1 (h the step in simulation time steps,
+                100 s with the default U and C); longer steps are rejected.
+                The sparse factorization of the coupling is computed once
+                per time step length and reused, so stepping a 1,000-zone
+                building is one sparse triangular solve. Rates are per
+                simulation time step (TIME_STEP), the units of U and C in
+                `simulation`.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import numpy as np
+import scipy.sparse as sparse
+from scipy.sparse.linalg import splu
+from simulation import HEAT_LOSS_COEFFICIENT, THERMAL_CAPACITY, TIME_STEP
+
+
+"""*********************Global*********************************************"""
+WALL_CONDUCTANCE = 5.0  # Between rooms next to each other, units of U
+FLOOR_CONDUCTANCE = 2.0  # Between a basement room and the room above it
+
+# Rooms sharing a wall, as laid out on the floor plans of the GroundWindow
+# and BasementWindow tabs
+HOUSE_WALLS = (
+    ("bdrm_2", "bath_1"), ("bath_1", "kitchen"), ("bdrm_2", "living"),
+    ("bath_1", "living"), ("living", "kitchen"), ("living", "bdrm_1"),
+    ("kitchen", "bdrm_1"),
+    ("bdrm_3", "bath_2"), ("bath_2", "mech_rm"), ("bdrm_3", "rec_rm"),
+    ("bath_2", "rec_rm"), ("mech_rm", "rec_rm"),
+)
+
+# Basement rooms and the ground floor rooms above them
+HOUSE_STACK = (
+    ("bdrm_3", "bdrm_2"), ("bath_2", "bath_1"), ("mech_rm", "kitchen"),
+    ("rec_rm", "living"), ("rec_rm", "bdrm_1"),
+)
+
+
+"""*********************Functions******************************************"""
+def house_network(zones, walls=HOUSE_WALLS, stack=HOUSE_STACK,
+                  wall=WALL_CONDUCTANCE, floor=FLOOR_CONDUCTANCE):
+    """
+    Return the network of the rooms of a controller.
+
+    zones: Rooms with their U and C, e.g. ThermostatController.zones
+           (ZoneState)
+    walls: Pairs of room names sharing a wall (tuple)
+    stack: Pairs of room names sharing a floor/ceiling (tuple)
+    wall: Conductance of a wall (float)
+    floor: Conductance of a floor (float)
+    """
+    pairs = [(zones.index[a], zones.index[b], wall) for a, b in walls] + \
+        [(zones.index[a], zones.index[b], floor) for a, b in stack]
+    first, second, conductance = zip(*pairs)
+    return ThermalNetwork(zones.U, zones.C, first, second, conductance,
+                          names=zones.names)
+
+
+def grid_network(rows, columns, floors=1, U=HEAT_LOSS_COEFFICIENT,
+                 C=THERMAL_CAPACITY, wall=WALL_CONDUCTANCE,
+                 floor=FLOOR_CONDUCTANCE):
+    """
+    Return the network of a building of floors of rows x columns zones,
+    each coupled to its neighbours on the floor and above/below it. Zone
+    IDs run along the rows, then the floors.
+
+    rows: Zones along one side of a floor (int)
+    columns: Zones along the other side of a floor (int)
+    floors: Number of floors (int)
+    U: Heat loss coefficient of the zones (float or array)
+    C: Thermal capacity of the zones (float or array)
+    wall: Conductance between neighbours on a floor (float)
+    floor: Conductance between floors (float)
+    """
+    ids = np.arange(rows * columns * floors).reshape(floors, rows, columns)
+    first = np.concatenate([ids[:, :, :-1].ravel(), ids[:, :-1, :].ravel(),
+                            ids[:-1].ravel()])
+    second = np.concatenate([ids[:, :, 1:].ravel(), ids[:, 1:, :].ravel(),
+                             ids[1:].ravel()])
+    conductance = np.concatenate([
+        np.full(ids[:, :, 1:].size + ids[:, 1:, :].size, wall),
+        np.full(ids[1:].size, floor)])
+    count = ids.size
+    return ThermalNetwork(np.broadcast_to(U, count),
+                          np.broadcast_to(C, count), first, second,
+                          conductance)
+
+
+"""*********************Classes********************************************"""
+class ThermalNetwork:
+    """
+    RC network of zones: capacities C, losses U of the U/C model and
+    symmetric conductances G between zones in a sparse matrix. `step`
+    advances the temperatures with a backward Euler step of the coupling
+    whose factorization is cached per step length until the conductances
+    change.
+    """
+    def __init__(self, U, C, first, second, conductance, names=None):
+        """
+        Create the network.
+
+        U: Heat loss coefficient of every zone (array)
+        C: Thermal capacity of every zone (array)
+        first: Zone IDs of one side of every coupling (array of int)
+        second: Zone IDs of the other side (array of int)
+        conductance: Conductance of every coupling (array)
+        names: Zone names, in zone ID order (list of string)
+        """
+        self.U = np.array(U, dtype=np.float64)
+        self.C = np.array(C, dtype=np.float64)
+        self.names = tuple(names) if names is not None else None
+        count = len(self.U)
+        first = np.asarray(first, dtype=np.intp)
+        second = np.asarray(second, dtype=np.intp)
+        conductance = np.broadcast_to(
+            np.asarray(conductance, dtype=np.float64), first.shape)
+        # Both directions of every coupling; duplicates add up
+        self.conductance = sparse.csr_matrix(
+            (np.concatenate([conductance, conductance]),
+             (np.concatenate([first, second]),
+              np.concatenate([second, first]))), shape=(count, count))
+        self._factors = {}  # Steps per time step -> factorization
+
+    def __len__(self):
+        return len(self.U)
+
+    @property
+    def max_dt(self):
+        """
+        Return the longest time step in seconds the explicit losses allow,
+        h U/C <= 1 in every zone (float, inf without losses).
+        """
+        losses = self.U / self.C
+        if not losses.size or losses.max() <= 0:
+            return np.inf
+        return TIME_STEP / losses.max()
+
+    @property
+    def laplacian(self):
+        """
+        Return L = diag(row sums of G) - G, the heat flow matrix between
+        the zones (sparse).
+        """
+        G = self.conductance
+        return sparse.diags(np.asarray(G.sum(axis=1)).ravel()) - G
+
+    def set_conductance(self, first, second, conductance):
+        """
+        Change the conductance between two zones, e.g. for an open door.
+
+        first: Zone ID of one side (int)
+        second: Zone ID of the other side (int)
+        conductance: New conductance, 0 to decouple them (float)
+        """
+        G = self.conductance.tolil()
+        G[first, second] = G[second, first] = conductance
+        self.conductance = G.tocsr()
+        self._factors.clear()
+
+    def factor(self, dt=TIME_STEP):
+        """
+        Return the cached LU factorization of diag(C) + h L with h the time
+        step in simulation steps. Raises ValueError for steps longer than
+        `max_dt`, where the explicit losses would blow up.
+
+        dt: Time step in seconds (float)
+        """
+        h = dt / TIME_STEP
+        factor = self._factors.get(h)
+        if factor is None:
+            if dt > self.max_dt:
+                raise ValueError(f"Time step should be at most "
+                                 f"{self.max_dt:g} s for the losses of the "
+                                 f"zones.")
+            matrix = sparse.diags(self.C) + h * self.laplacian
+            factor = self._factors[h] = splu(sparse.csc_matrix(matrix))
+        return factor
+
+    def split(self, supply, damper=None):
+        """
+        Return the output of every zone, the supply of all the zones shared
+        by damper position. Closed dampers get none; all closed gives no
+        output.
+
+        supply: Output per zone of the furnace (+) or air conditioner (-)
+                (BTU)
+        damper: Damper position of every zone in %, all open by default
+        """
+        if damper is None:
+            return np.full(len(self), float(supply))
+        damper = np.asarray(damper, dtype=np.float64)
+        total = damper.sum()
+        if total <= 0:
+            return np.zeros(len(self))
+        return supply * len(self) * damper / total
+
+    def step(self, temperature, set_temp, supply=0.0, damper=None,
+             dt=TIME_STEP):
+        """
+        Advance the zone temperatures by one step, in place: the losses and
+        the supply as in `simulate`, the coupling implicit. Returns the
+        temperatures.
+
+        temperature: Temperature of every zone (float array)
+        set_temp: Setpoint the losses are measured against (float)
+        supply: Output per zone of the furnace (+) or air conditioner (-)
+                (BTU)
+        damper: Damper position of every zone in %, all open by default
+        dt: Time step in seconds, at most `max_dt` (float)
+        """
+        h = dt / TIME_STEP
+        losses = self.U * (set_temp - temperature)
+        rhs = self.C * temperature + h * (self.split(supply, damper) - losses)
+        temperature[:] = self.factor(dt).solve(rhs)
+        return temperature
@@ -0,0 +1,460 @@
+"""***************************************************************************
+Title:          Weather
+File:           weather.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the loading, caching and indexing of the
+                hourly outdoor weather data used by the models of the
+                Autonomous_HVAC_System
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+
+"""*********************Global*********************************************"""
+WEATHER_CSV = "Temperature_Humidity_Data.csv"
+CACHE_DIR = ".weather_cache"
+CACHE_COLUMNS = {
+    "hours": np.int64,  # Epoch hour of every reading
+    "temperature": np.float32,  # Outdoor temperature (°C)
+    "humidity": np.float32,  # Relative humidity (%)
+}
+RELOAD_CHECK_INTERVAL = 1.0  # Seconds between checks for a changed file
+MINUTES_PER_HOUR = 60
+INTERPOLATIONS = ("linear", "monotone")  # Sub-hourly interpolation methods
+
+_shared_datasets = {}  # One WeatherDataset per CSV file in this process
+_shared_datasets_lock = threading.Lock()
+
+
+"""*********************Functions******************************************"""
+def to_epoch_hour(date, hour=0):
+    """
+    Convert a date and hour to the number of whole hours since 1970-01-01.
+
+    date: Date as yyyy-mm-dd (string) or numpy datetime64
+    hour: Hour of the day 0-23 (int)
+    """
+    return int(np.datetime64(date, "D").astype(np.int64)) * 24 + int(hour)
+
+
+def parse_hour_stamps(stamps):
+    """
+    Convert "yyyy-mm-dd h:mm" strings, as found in the CSV file, to an int64
+    array of epoch hours.
+
+    stamps: Iterable of date & time strings
+    """
+    stamps = [str(stamp).strip() for stamp in stamps]
+    days = np.array([stamp[:10] for stamp in stamps], dtype="datetime64[D]")
+    hours = np.array([int(stamp[11:].split(":")[0]) for stamp in stamps],
+                     dtype=np.int64)
+    return days.astype(np.int64) * 24 + hours
+
+
+def to_epoch_minute(date, hour=0, minute=0):
+    """
+    Convert a date, hour and minute to the number of minutes since
+    1970-01-01.
+
+    date: Date as yyyy-mm-dd (string) or numpy datetime64
+    hour: Hour of the day 0-23 (int)
+    minute: Minute of the hour 0-59 (int)
+    """
+    return to_epoch_hour(date, hour) * MINUTES_PER_HOUR + int(minute)
+
+
+def weather_cache_dir(csv_path=WEATHER_CSV):
+    """
+    Return the directory holding the compiled cache of a weather CSV file.
+
+    csv_path: Path to the weather CSV file (string)
+    """
+    folder, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(folder, CACHE_DIR, os.path.splitext(name)[0])
+
+
+def file_digest(path):
+    """
+    Return the SHA-256 hex digest of a file.
+
+    path: Path to the file (string)
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_weather_cache(csv_path=WEATHER_CSV, cache_dir=None):
+    """
+    Parse the weather CSV file once and write it as typed columns (one .npy
+    file per column) that can be memory-mapped by every later run.
+
+    csv_path: Path to the weather CSV file (string)
+    cache_dir: Directory for the compiled columns (string)
+    """
+    import pandas as pd  # Only needed when the cache is (re)built
+
+    cache_dir = cache_dir or weather_cache_dir(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(csv_path)
+
+    df = pd.read_csv(csv_path)
+    rows = df.to_numpy()
+    columns = {
+        "hours": parse_hour_stamps(rows[:, 0]),
+        "temperature": rows[:, 1].astype(np.float32),
+        "humidity": rows[:, 2].astype(np.float32),
+    }
+
+    # Write to temporary names and swap in so readers never see half files
+    for name, values in columns.items():
+        path = os.path.join(cache_dir, f"{name}.npy")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            np.save(file, values.astype(CACHE_COLUMNS[name]))
+        os.replace(temp_path, path)
+    _write_cache_meta(cache_dir, {"mtime_ns": stat.st_mtime_ns,
+                                  "size": stat.st_size,
+                                  "sha256": file_digest(csv_path)})
+    return cache_dir
+
+
+def load_weather(csv_path=WEATHER_CSV, cache_dir=None):
+    """
+    Return the weather data for a CSV file, memory-mapped from its compiled
+    cache. The cache is rebuilt when the CSV file content has changed.
+
+    csv_path: Path to the weather CSV file (string)
+    cache_dir: Directory for the compiled columns (string)
+    """
+    cache_dir = cache_dir or weather_cache_dir(csv_path)
+    stat = os.stat(csv_path)
+    meta = _read_cache_meta(cache_dir)
+
+    if meta is None or not all(os.path.exists(os.path.join(
+            cache_dir, f"{name}.npy")) for name in CACHE_COLUMNS):
+        compile_weather_cache(csv_path, cache_dir)
+    elif (meta["mtime_ns"], meta["size"]) != (stat.st_mtime_ns,
+                                              stat.st_size):
+        # The file was touched, only rebuild if the content really changed
+        if meta["size"] != stat.st_size or \
+                meta["sha256"] != file_digest(csv_path):
+            compile_weather_cache(csv_path, cache_dir)
+        else:
+            meta["mtime_ns"] = stat.st_mtime_ns
+            _write_cache_meta(cache_dir, meta)
+    return WeatherData.open(cache_dir)
+
+
+def shared_dataset(csv_path=WEATHER_CSV):
+    """
+    Return the process-wide dataset of a weather CSV file. Every caller gets
+    the same instance, so the file is only loaded once per process.
+
+    csv_path: Path to the weather CSV file (string)
+    """
+    key = os.path.abspath(csv_path)
+    with _shared_datasets_lock:
+        dataset = _shared_datasets.get(key)
+        if dataset is None:
+            dataset = _shared_datasets[key] = WeatherDataset(csv_path)
+        return dataset
+
+
+def _read_cache_meta(cache_dir):
+    """
+    Return the source file details recorded with a cache, or None.
+    """
+    try:
+        with open(os.path.join(cache_dir, "source.json")) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache_meta(cache_dir, meta):
+    """
+    Record the source file details alongside the cached columns.
+    """
+    path = os.path.join(cache_dir, "source.json")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(meta, file)
+    os.replace(temp_path, path)
+
+
+"""*********************Classes********************************************"""
+class TemperatureIndex:
+    """
+    Dense hour-offset index over the hourly outdoor temperatures. Row i of
+    the index holds the reading for epoch hour `start + i`, so any lookup is
+    a single subtraction and array access. Hours missing from the data are
+    stored as NaN.
+    """
+    def __init__(self, hours, temperatures):
+        """
+        Build the index from matching arrays of epoch hours and readings.
+
+        hours: Epoch hour of every reading (int array)
+        temperatures: Outdoor temperature of every reading (float array)
+        """
+        hours = np.asarray(hours, dtype=np.int64)
+        temperatures = np.asarray(temperatures)
+        if hours.size == 0:
+            raise ValueError("Cannot index an empty temperature data set.")
+
+        self.start = int(hours.min())
+        offsets = hours - self.start
+        if offsets[0] == 0 and np.all(np.diff(offsets) == 1):
+            # Already one reading per hour in order, use it without a copy
+            self.temperatures = temperatures
+        else:
+            self.temperatures = np.full(int(offsets.max()) + 1, np.nan)
+            self.temperatures[offsets] = temperatures
+
+    @classmethod
+    def from_rows(cls, temperature_data):
+        """
+        Build the index from the rows loaded out of the CSV file, or reuse
+        the index of already columnar weather data.
+
+        temperature_data: Rows of [date & time string, temperature, ...]
+                          or WeatherData
+        """
+        if isinstance(temperature_data, WeatherData):
+            return temperature_data.index
+        rows = np.asarray(temperature_data, dtype=object)
+        return cls(parse_hour_stamps(rows[:, 0]), rows[:, 1].astype(float))
+
+    def __len__(self):
+        return len(self.temperatures)
+
+    def lookup(self, date, hour):
+        """
+        Return the outdoor temperature for a date and hour, or None when the
+        data does not cover it.
+
+        date: Date as yyyy-mm-dd (string)
+        hour: Hour of the day 0-23 (int)
+        """
+        offset = to_epoch_hour(date, hour) - self.start
+        if not 0 <= offset < len(self.temperatures):
+            return None
+        temperature = self.temperatures[offset]
+        if np.isnan(temperature):
+            return None
+        return float(temperature)
+
+    def lookup_many(self, hours):
+        """
+        Return the outdoor temperatures for an array of epoch hours. Hours
+        that are not covered by the data come back as NaN.
+
+        hours: Epoch hours to look up (int array)
+        """
+        offsets = np.asarray(hours, dtype=np.int64) - self.start
+        inside = (offsets >= 0) & (offsets < len(self.temperatures))
+        result = np.full(offsets.shape, np.nan)
+        result[inside] = self.temperatures[offsets[inside]]
+        return result
+
+
+class MinuteSeries:
+    """
+    Outdoor temperature at every minute, interpolated once from the hourly
+    index into a compact float32 array. Row i holds the temperature of
+    epoch minute `start + i`; minutes next to a missing hour are NaN.
+    """
+    def __init__(self, index, method="linear"):
+        """
+        Interpolate the hourly temperatures of an index to minutes.
+
+        index: Hourly outdoor temperatures (TemperatureIndex)
+        method: "linear", or "monotone" for a monotone cubic (string)
+        """
+        if method not in INTERPOLATIONS:
+            raise ValueError(f"Interpolation should be one of "
+                             f"{', '.join(INTERPOLATIONS)}.")
+        hourly = np.asarray(index.temperatures, dtype=np.float64)
+        self.method = method
+        self.start = index.start * MINUTES_PER_HOUR
+
+        # Position of every minute within its hour, as a fraction
+        fraction = np.arange(MINUTES_PER_HOUR) / MINUTES_PER_HOUR
+        start, end = hourly[:-1, None], hourly[1:, None]
+        if len(hourly) < 2 or method == "linear":
+            minutes = start + (end - start) * fraction
+        else:
+            minutes = self._monotone_cubic(hourly, start, end, fraction)
+        self.temperatures = np.append(minutes.ravel(),
+                                      hourly[-1:]).astype(np.float32)
+
+    @staticmethod
+    def _monotone_cubic(hourly, start, end, fraction):
+        """
+        Fritsch-Carlson monotone cubic Hermite interpolation of the hourly
+        temperatures: no overshoot between two readings.
+        """
+        slopes = np.diff(hourly)  # Change per hour of every interval
+        tangents = np.empty_like(hourly)
+        tangents[0], tangents[-1] = slopes[0], slopes[-1]
+        before, after = slopes[:-1], slopes[1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            harmonic = 2.0 / (1.0 / before + 1.0 / after)
+        tangents[1:-1] = np.where(before * after > 0, harmonic, 0.0)
+
+        t = fraction
+        h00 = 2 * t**3 - 3 * t**2 + 1
+        h10 = t**3 - 2 * t**2 + t
+        h01 = -2 * t**3 + 3 * t**2
+        h11 = t**3 - t**2
+        return h00 * start + h10 * tangents[:-1, None] + h01 * end + \
+            h11 * tangents[1:, None]
+
+    def __len__(self):
+        return len(self.temperatures)
+
+    def lookup(self, date, hour, minute=0):
+        """
+        Return the outdoor temperature of a date, hour and minute, or None
+        when the data does not cover it.
+
+        date: Date as yyyy-mm-dd (string)
+        hour: Hour of the day 0-23 (int)
+        minute: Minute of the hour 0-59 (int)
+        """
+        offset = to_epoch_minute(date, hour, minute) - self.start
+        if not 0 <= offset < len(self.temperatures):
+            return None
+        temperature = self.temperatures[offset]
+        if np.isnan(temperature):
+            return None
+        return float(temperature)
+
+    def lookup_many(self, minutes):
+        """
+        Return the outdoor temperatures for an array of epoch minutes.
+        Minutes that are not covered by the data come back as NaN.
+
+        minutes: Epoch minutes to look up (int array)
+        """
+        offsets = np.asarray(minutes, dtype=np.int64) - self.start
+        inside = (offsets >= 0) & (offsets < len(self.temperatures))
+        result = np.full(offsets.shape, np.nan, dtype=np.float32)
+        result[inside] = self.temperatures[offsets[inside]]
+        return result
+
+
+class WeatherData:
+    """
+    Columnar hourly weather data: epoch hours, outdoor temperature and
+    humidity. When opened from the compiled cache the columns are read-only
+    memory maps, so processes reading the same file share its pages.
+    """
+    def __init__(self, hours, temperature, humidity):
+        """
+        Store the weather columns.
+
+        hours: Epoch hour of every reading (int64 array)
+        temperature: Outdoor temperature of every reading (float32 array)
+        humidity: Relative humidity of every reading (float32 array)
+        """
+        self.hours = hours
+        self.temperature = temperature
+        self.humidity = humidity
+        self._index = None
+        self._minutes = {}  # MinuteSeries by interpolation method
+
+    @classmethod
+    def open(cls, cache_dir):
+        """
+        Memory-map the columns of a compiled weather cache.
+
+        cache_dir: Directory of the compiled columns (string)
+        """
+        columns = {name: np.load(os.path.join(cache_dir, f"{name}.npy"),
+                                 mmap_mode="r") for name in CACHE_COLUMNS}
+        return cls(**columns)
+
+    def __len__(self):
+        return len(self.hours)
+
+    @property
+    def index(self):
+        """
+        Getter for the hour index of the outdoor temperatures.
+        """
+        if self._index is None:
+            self._index = TemperatureIndex(self.hours, self.temperature)
+        return self._index
+
+    def minutes(self, method="linear"):
+        """
+        Return the minute-resolution outdoor temperatures, interpolated on
+        first use of each method and reused afterwards.
+
+        method: "linear" or "monotone" (string)
+        """
+        series = self._minutes.get(method)
+        if series is None:
+            series = self._minutes[method] = MinuteSeries(self.index, method)
+        return series
+
+
+class WeatherDataset:
+    """
+    Read-only weather data shared by every model of the process. The data
+    is loaded on first use and swapped for a fresh copy when the CSV file
+    changes; readers always get a complete WeatherData and never lock.
+    """
+    def __init__(self, csv_path=WEATHER_CSV,
+                 check_interval=RELOAD_CHECK_INTERVAL):
+        """
+        Create the dataset without loading it yet.
+
+        csv_path: Path to the weather CSV file (string)
+        check_interval: Seconds between checks for a changed file (float)
+        """
+        self.csv_path = csv_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._data = None
+        self._stamp = None
+        self._checked = 0.0
+
+    def get(self):
+        """
+        Return the current weather data, reloading it if the file changed.
+        Once loaded, the data is still served when the file goes missing.
+        """
+        data = self._data
+        if data is not None and \
+                time.monotonic() - self._checked < self.check_interval:
+            return data
+
+        with self._lock:
+            try:
+                stat = os.stat(self.csv_path)
+            except OSError:
+                if self._data is None:
+                    raise
+                # The file was moved or deleted, keep serving the loaded data
+                self._checked = time.monotonic()
+                return self._data
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self._data is None or stamp != self._stamp:
+                data = load_weather(self.csv_path)
+                data.minutes()  # Interpolate before any reader sees it
+                self._data = data
+                self._stamp = stamp
+            self._checked = time.monotonic()
+            return self._data
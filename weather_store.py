@@ -0,0 +1,233 @@
+"""***************************************************************************
+Title:          Weather Store
+File:           weather_store.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the multi-site, multi-year outdoor weather
+                store of the Autonomous_HVAC_System. Every site-year is kept
+                as its own chunk of memory-mapped columns and loaded on
+                demand through a small LRU cache.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from weather import CACHE_COLUMNS, MINUTES_PER_HOUR, WeatherData, \
+    load_weather, to_epoch_hour
+
+
+"""*********************Global*********************************************"""
+MAX_CHUNKS = 4  # Site-year chunks kept open at the same time
+
+
+"""*********************Functions******************************************"""
+def hour_year(hour):
+    """
+    Return the calendar year of an epoch hour.
+
+    hour: Epoch hour (int)
+    """
+    return int(np.datetime64(int(hour), "h").astype("datetime64[Y]")
+               .astype(np.int64)) + 1970
+
+
+"""*********************Classes********************************************"""
+class WeatherStore:
+    """
+    Weather readings keyed by (site, timestamp), stored on disk as one
+    directory of typed columns per site and year:
+
+        <root>/<site>/<year>/hours.npy, temperature.npy, humidity.npy
+
+    Only the chunks that are used get opened, and at most `max_chunks` stay
+    open; the least recently used one is closed first.
+    """
+    def __init__(self, root, max_chunks=MAX_CHUNKS):
+        """
+        Open a store without loading any chunk.
+
+        root: Directory of the store (string)
+        max_chunks: Site-year chunks kept open at the same time (int)
+        """
+        self.root = root
+        self.max_chunks = max_chunks
+        self._chunks = OrderedDict()  # (site, year) -> WeatherData
+        self._lock = threading.Lock()
+        self.loads = 0  # Number of chunks opened, for monitoring
+
+    def import_csv(self, site, csv_path):
+        """
+        Add the readings of a weather CSV file to a site, split per year.
+
+        site: Name of the site (string)
+        csv_path: Path to the weather CSV file (string)
+        """
+        data = load_weather(csv_path)
+        years = data.hours.astype("datetime64[h]").astype("datetime64[Y]")
+        for year in np.unique(years):
+            keep = years == year
+            folder = self._chunk_dir(site, int(str(year)))
+            os.makedirs(folder, exist_ok=True)
+            # Swap in whole files: an open chunk keeps its old mapping
+            # instead of seeing the file truncated under it
+            for name, dtype in CACHE_COLUMNS.items():
+                path = os.path.join(folder, f"{name}.npy")
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as file:
+                    np.save(file, np.asarray(getattr(data, name)[keep],
+                                             dtype=dtype))
+                os.replace(temp_path, path)
+            self._forget(site, int(str(year)))
+
+    def sites(self):
+        """
+        Return the names of the sites in the store.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def years(self, site):
+        """
+        Return the years stored for a site.
+
+        site: Name of the site (string)
+        """
+        folder = os.path.join(self.root, site)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(int(name) for name in os.listdir(folder)
+                      if name.isdigit())
+
+    def chunk(self, site, year):
+        """
+        Return the weather data of a site-year, opening it if needed, or
+        None when the store does not hold it.
+
+        site: Name of the site (string)
+        year: Calendar year (int)
+        """
+        key = (site, year)
+        with self._lock:
+            data = self._chunks.get(key)
+            if data is not None:
+                self._chunks.move_to_end(key)
+                return data
+
+            folder = self._chunk_dir(site, year)
+            if not os.path.isdir(folder):
+                return None
+            data = WeatherData.open(folder)
+            self._chunks[key] = data
+            self.loads += 1
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)  # Drop the least recent
+            return data
+
+    def resident_chunks(self):
+        """
+        Return the (site, year) keys of the open chunks, oldest first.
+        """
+        with self._lock:
+            return list(self._chunks)
+
+    def get(self, site, hour):
+        """
+        Return the outdoor temperature of a site at an epoch hour, or None.
+
+        site: Name of the site (string)
+        hour: Epoch hour (int)
+        """
+        data = self.chunk(site, hour_year(hour))
+        if data is None:
+            return None
+        offset = hour - data.index.start
+        if not 0 <= offset < len(data.index):
+            return None
+        temperature = data.index.temperatures[offset]
+        return None if np.isnan(temperature) else float(temperature)
+
+    def lookup(self, site, date, hour, minute=0):
+        """
+        Return the outdoor temperature of a site at a date and time, using
+        the minute series of the chunk for sub-hourly times. In the last
+        hour of a year they run up to the first hour of the next year's
+        chunk.
+
+        site: Name of the site (string)
+        date: Date as yyyy-mm-dd (string)
+        hour: Hour of the day 0-23 (int)
+        minute: Minute of the hour 0-59 (int)
+        """
+        epoch_hour = to_epoch_hour(date, hour)
+        if not minute:
+            return self.get(site, epoch_hour)
+        if hour_year(epoch_hour + 1) != hour_year(epoch_hour):
+            start = self.get(site, epoch_hour)
+            end = self.get(site, epoch_hour + 1)
+            if start is None or end is None:
+                return None
+            # Same rounding as the float32 minute series
+            return float(np.float32(
+                start + (end - start) * minute / MINUTES_PER_HOUR))
+        data = self.chunk(site, hour_year(epoch_hour))
+        if data is None:
+            return None
+        return data.minutes().lookup(date, hour, minute)
+
+    def lookup_many(self, site, hours):
+        """
+        Return the outdoor temperatures of a site for an array of epoch
+        hours, which may span several years. Missing hours are NaN.
+
+        site: Name of the site (string)
+        hours: Epoch hours to look up (int array)
+        """
+        hours = np.asarray(hours, dtype=np.int64)
+        result = np.full(hours.shape, np.nan)
+        years = hours.astype("datetime64[h]").astype("datetime64[Y]")
+        for year in np.unique(years):
+            data = self.chunk(site, int(str(year)))
+            if data is not None:
+                selected = years == year
+                result[selected] = data.index.lookup_many(hours[selected])
+        return result
+
+    def site(self, site):
+        """
+        Return a view of one site that can be attached to a model.
+
+        site: Name of the site (string)
+        """
+        return SiteWeather(self, site)
+
+    def _chunk_dir(self, site, year):
+        """
+        Return the directory of a site-year chunk.
+        """
+        return os.path.join(self.root, site, str(year))
+
+    def _forget(self, site, year):
+        """
+        Close a chunk so it is reopened with its new content.
+        """
+        with self._lock:
+            self._chunks.pop((site, year), None)
+
+
+class SiteWeather:
+    """
+    The weather of one site of a store, looked up by date and time.
+    """
+    def __init__(self, store, site):
+        self.store = store
+        self.name = site
+
+    def lookup(self, date, hour, minute=0):
+        """
+        Return the outdoor temperature at a date and time, or None.
+        """
+        return self.store.lookup(self.name, date, hour, minute)
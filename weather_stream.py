@@ -0,0 +1,284 @@
+"""***************************************************************************
+Title:          Weather Stream
+File:           weather_stream.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the streaming outdoor weather ingest of the
+                Autonomous_HVAC_System. Readings from a growing CSV file or a
+                local socket feed are kept for the most recent hours in a
+                fixed-size ring buffer.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import os
+import socket
+import threading
+import time
+import numpy as np
+from weather import MINUTES_PER_HOUR, parse_hour_stamps, to_epoch_hour
+from logger import get_logger
+
+
+"""*********************Global*********************************************"""
+log = get_logger(__name__)
+STREAM_HOURS = 168  # Hours kept in the ring buffer (one week)
+POLL_INTERVAL = 1.0  # Seconds between checks of a tailed file
+EMPTY_HOUR = -1  # Hour stored in a slot that holds no reading
+
+
+"""*********************Functions******************************************"""
+def parse_record(line):
+    """
+    Parse one "yyyy-mm-dd h:mm,temperature,humidity" record into
+    (epoch hour, temperature, humidity), or None for a header/bad line.
+
+    line: Record text (string)
+    """
+    fields = line.strip().split(",")
+    if len(fields) < 2:
+        return None
+    try:
+        hour = int(parse_hour_stamps([fields[0]])[0])
+        temperature = float(fields[1])
+        humidity = float(fields[2]) if len(fields) > 2 and fields[2] \
+            else float("nan")
+    except ValueError:
+        return None
+    return hour, temperature, humidity
+
+
+"""*********************Classes********************************************"""
+class RingBuffer:
+    """
+    Fixed-size store of the most recent hourly readings. The slot of a
+    reading is its epoch hour modulo the capacity, so lookups are a single
+    array access. There is one writer; readers never lock and detect a slot
+    being rewritten by checking its hour before and after reading it.
+    """
+    def __init__(self, capacity=STREAM_HOURS):
+        """
+        Allocate the buffer once; its memory never grows.
+
+        capacity: Number of hours kept (int)
+        """
+        self.capacity = capacity
+        self.hours = np.full(capacity, EMPTY_HOUR, dtype=np.int64)
+        self.temperature = np.full(capacity, np.nan, dtype=np.float32)
+        self.humidity = np.full(capacity, np.nan, dtype=np.float32)
+        self.latest_hour = EMPTY_HOUR
+
+    def push(self, hour, temperature, humidity=float("nan")):
+        """
+        Store the reading of an hour, replacing the reading that was
+        `capacity` hours older. Only called from the writer thread.
+
+        hour: Epoch hour of the reading (int)
+        temperature: Outdoor temperature (float)
+        humidity: Relative humidity (float)
+        """
+        slot = hour % self.capacity
+        self.hours[slot] = EMPTY_HOUR  # Readers skip the slot meanwhile
+        self.temperature[slot] = temperature
+        self.humidity[slot] = humidity
+        self.hours[slot] = hour
+        if hour > self.latest_hour:
+            self.latest_hour = hour
+
+    def get(self, hour):
+        """
+        Return the outdoor temperature of an epoch hour, or None when it is
+        not (or no longer) in the buffer.
+
+        hour: Epoch hour (int)
+        """
+        slot = hour % self.capacity
+        if self.hours[slot] != hour:
+            return None
+        temperature = self.temperature[slot]
+        if self.hours[slot] != hour or np.isnan(temperature):
+            return None  # Rewritten while reading, or a missing reading
+        return float(temperature)
+
+    def lookup(self, date, hour, minute=0):
+        """
+        Return the outdoor temperature of a date and time, interpolated
+        between the two surrounding hours for sub-hourly times.
+
+        date: Date as yyyy-mm-dd (string)
+        hour: Hour of the day 0-23 (int)
+        minute: Minute of the hour 0-59 (int)
+        """
+        epoch_hour = to_epoch_hour(date, hour)
+        temperature = self.get(epoch_hour)
+        if not minute or temperature is None:
+            return temperature
+        following = self.get(epoch_hour + 1)
+        if following is None:
+            return None
+        return temperature + (following - temperature) * \
+            minute / MINUTES_PER_HOUR
+
+    def latest(self):
+        """
+        Return (epoch hour, temperature) of the most recent reading, or None.
+        """
+        hour = self.latest_hour
+        if hour == EMPTY_HOUR:
+            return None
+        return hour, self.get(hour)
+
+
+class CsvTail:
+    """
+    Source of records appended to a growing CSV file. Only the unread part
+    of the file is read at every poll.
+    """
+    def __init__(self, path, poll_interval=POLL_INTERVAL, from_start=True):
+        """
+        path: Path to the CSV file (string)
+        poll_interval: Seconds between checks for new lines (float)
+        from_start: Read the existing lines first instead of skipping them
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.from_start = from_start
+
+    def records(self, stop):
+        """
+        Yield the record lines of the file until `stop` is set.
+
+        stop: Event that ends the tail (threading.Event)
+        """
+        with open(self.path, "r") as file:
+            if not self.from_start:
+                file.seek(0, os.SEEK_END)
+            pending = ""
+            while not stop.is_set():
+                chunk = file.readline()
+                if not chunk:
+                    stop.wait(self.poll_interval)
+                    continue
+                pending += chunk
+                if pending.endswith("\n"):  # Wait for a complete line
+                    yield pending
+                    pending = ""
+
+
+class SocketSource:
+    """
+    Source of newline-delimited records read from a local TCP socket.
+    """
+    def __init__(self, host="127.0.0.1", port=0, timeout=POLL_INTERVAL):
+        """
+        host: Address of the feed (string)
+        port: Port of the feed (int)
+        timeout: Seconds between checks of the stop event (float)
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def records(self, stop):
+        """
+        Yield the record lines of the feed until `stop` is set or the feed
+        closes.
+
+        stop: Event that ends the feed (threading.Event)
+        """
+        with socket.create_connection((self.host, self.port)) as connection:
+            connection.settimeout(self.timeout)
+            pending = b""
+            while not stop.is_set():
+                try:
+                    data = connection.recv(4096)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    yield line.decode("utf-8", "replace")
+
+
+class LocalFeed:
+    """
+    Local stand-in for the production weather feed: serves the lines of a
+    CSV file to one client over a localhost socket, one line per interval.
+    """
+    def __init__(self, path, interval=0.0):
+        """
+        path: Path to the CSV file to serve (string)
+        interval: Seconds between two lines (float)
+        """
+        self.path = path
+        self.interval = interval
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        """
+        Send every line of the file to the first client, then close.
+        """
+        with self._server:
+            connection, _ = self._server.accept()
+            with connection, open(self.path, "rb") as file:
+                for line in file:
+                    connection.sendall(line)
+                    if self.interval:
+                        time.sleep(self.interval)
+
+
+class WeatherStream:
+    """
+    Background ingest of a record source into a ring buffer. The thermostat
+    reads the buffer directly, without locking.
+    """
+    def __init__(self, source, capacity=STREAM_HOURS):
+        """
+        source: Record source, such as CsvTail or SocketSource
+        capacity: Number of hours kept (int)
+        """
+        self.source = source
+        self.buffer = RingBuffer(capacity)
+        self.records_read = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start reading the source on a daemon thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop reading the source and wait for the reader thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        """
+        Push every valid record of the source into the ring buffer.
+        """
+        try:
+            for line in self.source.records(self._stop):
+                record = parse_record(line)
+                if record is not None:
+                    self.buffer.push(*record)
+                    self.records_read += 1
+        except OSError as e:
+            log.error(f"Error reading weather stream: {e}")
+
+    def lookup(self, date, hour, minute=0):
+        """
+        Return the streamed outdoor temperature of a date and time, or None.
+        """
+        return self.buffer.lookup(date, hour, minute)
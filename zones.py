@@ -0,0 +1,131 @@
+"""***************************************************************************
+Title:          Zones
+File:           zones.py
+Release Notes:  N/A
+Author:         Zhaolin Wei
+Description:    This file contains the per-room zone state of the
+                Autonomous_HVAC_System. Every property of the zones is one
+                NumPy array indexed by zone ID, so all zones are updated with
+                single array operations whether there are 9 rooms or a
+                500-zone commercial floor.
+***************************************************************************"""
+
+"""*********************Libraries******************************************"""
+import numpy as np
+from simulation import HEAT_LOSS_COEFFICIENT, THERMAL_CAPACITY
+from simulation import STAGE_THRESHOLDS, STAGE_CAPACITIES
+from simulation import select_mode, stage_capacity
+
+
+"""*********************Global*********************************************"""
+# Zones of the house, each floor contiguous so it is a slice of the arrays
+GROUND_FLOOR = ("bdrm_1", "bdrm_2", "bath_1", "living", "kitchen")
+BASEMENT = ("bdrm_3", "bath_2", "mech_rm", "rec_rm")
+HOUSE_ZONES = GROUND_FLOOR + BASEMENT
+HOUSE_FLOORS = {
+    "ground": slice(0, len(GROUND_FLOOR)),
+    "basement": slice(len(GROUND_FLOOR), len(HOUSE_ZONES)),
+}
+
+FIELDS = ("temperature", "damper", "setpoint", "U", "C")
+
+
+"""*********************Functions******************************************"""
+def zone_property(index, field):
+    """
+    Return a property reading and writing one zone of a `zones` attribute,
+    used to keep the per-room attribute names of the controller.
+
+    index: Zone ID (int)
+    field: Zone array to access, one of FIELDS (string)
+    """
+    def get(self):
+        return getattr(self.zones, field)[index].item()
+
+    def set(self, value):
+        getattr(self.zones, field)[index] = value
+
+    return property(get, set)
+
+
+"""*********************Classes********************************************"""
+class ZoneState:
+    """
+    State of a set of zones as one array per property: temperature (°C),
+    damper position (%), setpoint (°C), heat loss coefficient U and thermal
+    capacity C. `index` maps zone names to zone IDs and `floors` maps floor
+    names to slices of the arrays.
+    """
+    def __init__(self, names, floors=None, temperature=22, damper=100,
+                 setpoint=22, U=HEAT_LOSS_COEFFICIENT, C=THERMAL_CAPACITY):
+        """
+        Create the zones with the same starting values.
+
+        names: Zone names, in zone ID order (list of string)
+        floors: Floor names to slices of zone IDs (dict)
+        temperature: Starting temperature of the zones (float)
+        damper: Starting damper position of the zones (float)
+        setpoint: Starting setpoint of the zones (float)
+        U: Heat loss coefficient of the zones (float)
+        C: Thermal capacity of the zones (float)
+        """
+        self.names = tuple(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.floors = dict(floors or {})
+        count = len(self.names)
+        self.temperature = np.full(count, temperature, dtype=np.float64)
+        self.damper = np.full(count, damper, dtype=np.float64)
+        self.setpoint = np.full(count, setpoint, dtype=np.float64)
+        self.U = np.full(count, U, dtype=np.float64)
+        self.C = np.full(count, C, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def ids(self, names):
+        """
+        Return the zone IDs of zone names as an index array.
+
+        names: Zone names (list of string)
+        """
+        return np.array([self.index[name] for name in names], dtype=np.intp)
+
+    def floor(self, name, fields=("temperature", "damper")):
+        """
+        Return the given fields of the zones of a floor, interleaved per
+        zone: [zone 1 field 1, zone 1 field 2, zone 2 field 1, ...].
+
+        name: Floor name (string)
+        fields: Zone arrays to include, from FIELDS (list of string)
+        """
+        zones = self.floors[name]
+        return np.column_stack([getattr(self, field)[zones]
+                                for field in fields]).ravel()
+
+    def set_temperatures(self, temperature, zones=slice(None)):
+        """
+        Set the temperature of many zones at once.
+
+        temperature: New temperature, one or one per zone (float or array)
+        zones: Zones to set, all by default (slice or index array)
+        """
+        self.temperature[zones] = temperature
+
+    def step(self, thresholds=STAGE_THRESHOLDS, capacities=STAGE_CAPACITIES):
+        """
+        Advance every zone by one heating/cooling step towards its setpoint,
+        using the same explicit Euler step as `simulate`. Zones at their
+        setpoint, or whose losses outweigh the output, do not move. Returns
+        the output of every zone during the step (BTU).
+
+        thresholds: Lower temperature difference bound of each stage (tuple)
+        capacities: Output of each stage (tuple)
+        """
+        directions = select_mode(self.setpoint, self.temperature)
+        difference = directions * (self.setpoint - self.temperature)
+        q = stage_capacity(difference, thresholds, capacities)
+        dT = (q - self.U * difference) / self.C
+        moving = (difference > 0) & (dT > 0)
+        q = np.where(moving, q, 0)
+        self.temperature += np.where(moving, directions * dT, 0)
+        return q